@@ -0,0 +1,138 @@
+"""
+Customer directory: search, sorting and segments over CustomerMetrics.
+
+The metrics are lifetime aggregates rebuilt in user-id batches by
+rebuild_customer_metrics, so the list itself only reads one row per
+customer. Customers who signed up since the last rebuild have no row yet
+and sort last.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from orders.rollup_utils import SOLD_ITEM_STATUSES
+from users.models import CustomUser
+from wallet.models import Wallet
+
+from .models import CustomerMetrics
+
+ZERO = Decimal('0')
+
+# Orders that never completed payment are not part of a customer's history
+UNPLACED_ORDER_STATUSES = ['Pending', 'Payment Failed']
+
+CUSTOMER_SORTS = {
+    'name': ('Name', [F('name').asc()]),
+    'spend': ('Lifetime spend', [F('metrics__lifetime_spend').desc(nulls_last=True), F('name').asc()]),
+    'orders': ('Orders', [F('metrics__order_count').desc(nulls_last=True), F('name').asc()]),
+    'recent': ('Last order', [F('metrics__last_order_at').desc(nulls_last=True), F('name').asc()]),
+    'returns': ('Return rate', [F('metrics__return_rate').desc(nulls_last=True), F('name').asc()]),
+    'wallet': ('Wallet balance', [F('metrics__wallet_balance').desc(nulls_last=True), F('name').asc()]),
+}
+
+LAPSED_AFTER_DAYS = 90
+HIGH_RETURN_RATE = Decimal('30')
+
+CUSTOMER_SEGMENTS = {
+    'no_orders': 'No orders',
+    'repeat': 'Repeat buyers',
+    'lapsed': f'No order in {LAPSED_AFTER_DAYS} days',
+    'high_returns': f'Return rate {HIGH_RETURN_RATE}%+',
+    'wallet': 'Wallet balance',
+}
+
+
+def _segment_filter(segment):
+    if segment == 'no_orders':
+        return Q(metrics__order_count=0) | Q(metrics__isnull=True)
+    if segment == 'repeat':
+        return Q(metrics__order_count__gte=2)
+    if segment == 'lapsed':
+        return Q(metrics__last_order_at__lt=timezone.now() - timedelta(days=LAPSED_AFTER_DAYS))
+    if segment == 'high_returns':
+        return Q(metrics__return_rate__gte=HIGH_RETURN_RATE)
+    if segment == 'wallet':
+        return Q(metrics__wallet_balance__gt=0)
+    return Q()
+
+
+def customer_directory(search='', status='', segment='', sort='name', min_spend=None):
+    """Customers for the admin list, filtered and ordered on their stored metrics"""
+    users = CustomUser.objects.filter(is_superuser=False).select_related('metrics')
+    if search:
+        # Each prefix test can use the index on its own column
+        users = users.filter(
+            Q(name__istartswith=search) |
+            Q(email__istartswith=search) |
+            Q(mobile_no__istartswith=search)
+        )
+    if status:
+        users = users.filter(status=status)
+    users = users.filter(_segment_filter(segment))
+    if min_spend is not None:
+        users = users.filter(metrics__lifetime_spend__gte=min_spend)
+    return users.order_by(*CUSTOMER_SORTS.get(sort, CUSTOMER_SORTS['name'])[1])
+
+
+def _metrics_for(user_ids):
+    orders = (
+        Order.objects.filter(user_id__in=user_ids)
+        .exclude(overall_status__in=UNPLACED_ORDER_STATUSES)
+        .values('user_id')
+        .annotate(order_count=Count('id'), last_order_at=Max('created_at'))
+        .order_by()
+    )
+    items = (
+        OrderItem.objects.filter(order__user_id__in=user_ids)
+        .values(user_id=F('order__user_id'))
+        .annotate(
+            lifetime_spend=Sum(F('price') * F('quantity'), filter=Q(status__in=SOLD_ITEM_STATUSES)),
+            items_bought=Sum('quantity', filter=Q(status__in=SOLD_ITEM_STATUSES + ['Returned'])),
+            items_returned=Sum('quantity', filter=Q(status='Returned')),
+        )
+        .order_by()
+    )
+    wallets = (
+        Wallet.objects.filter(user_id__in=user_ids)
+        .values('user_id')
+        .annotate(wallet_balance=Sum('balance'))
+        .order_by()
+    )
+
+    metrics = {user_id: CustomerMetrics(user_id=user_id) for user_id in user_ids}
+    for row in orders:
+        metrics[row['user_id']].order_count = row['order_count']
+        metrics[row['user_id']].last_order_at = row['last_order_at']
+    for row in items:
+        entry = metrics[row['user_id']]
+        entry.lifetime_spend = row['lifetime_spend'] or ZERO
+        entry.items_bought = row['items_bought'] or 0
+        entry.items_returned = row['items_returned'] or 0
+        if entry.items_bought:
+            entry.return_rate = round(Decimal(entry.items_returned * 100) / entry.items_bought, 2)
+    for row in wallets:
+        metrics[row['user_id']].wallet_balance = row['wallet_balance'] or ZERO
+    return metrics.values()
+
+
+def rebuild_customer_metrics(batch_size=500):
+    """Recompute CustomerMetrics for every customer in user-id batches; returns the count"""
+    count = 0
+    last_id = 0
+    while True:
+        user_ids = list(
+            CustomUser.objects.filter(is_superuser=False, id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not user_ids:
+            return count
+        rows = _metrics_for(user_ids)
+        with transaction.atomic():
+            CustomerMetrics.objects.filter(user_id__in=user_ids).delete()
+            CustomerMetrics.objects.bulk_create(rows)
+        count += len(user_ids)
+        last_id = user_ids[-1]
@@ -0,0 +1,149 @@
+import time, calendar, logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from orders.rollup_utils import (
+    get_daily_sales, get_sales_summary, get_top_products, get_top_categories, get_top_brands,
+)
+from product.models import Product
+from users.models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+# Orders carrying any of these item statuses are left out of revenue
+REVENUE_EXCLUDED_ITEM_STATUSES = ['Cancelled', 'Payment_Failed']
+
+
+def revenue_orders(start_dt, end_dt):
+    """Orders counted as revenue between start_dt and end_dt (same rule as the KPI card)"""
+    return Order.objects.filter(
+        created_at__range=(start_dt, end_dt)
+    ).exclude(items__status__in=REVENUE_EXCLUDED_ITEM_STATUSES)
+
+
+def _local_bounds(first_day, last_day):
+    start_dt = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+    end_dt = timezone.make_aware(datetime.combine(last_day, datetime.max.time()))
+    return start_dt, end_dt
+
+
+def get_revenue_series(period, today):
+    """
+    Revenue chart for the dashboard as (labels, values).
+
+    Daily is bucketed by hour with one grouped TruncHour query in the current
+    time zone (Asia/Kolkata). Weekly, monthly and yearly read the DailySales
+    rollup (at most 366 rows), summed by day or month. Buckets without
+    orders are zero-filled here.
+    """
+    if period == 'daily':
+        tzinfo = timezone.get_current_timezone()
+        start_dt, end_dt = _local_bounds(today, today)
+        rows = (
+            revenue_orders(start_dt, end_dt)
+            .annotate(bucket=TruncHour('created_at', tzinfo=tzinfo))
+            .values('bucket')
+            .annotate(s=Sum('total_amount'))
+            .order_by('bucket')
+        )
+        totals = {timezone.localtime(row['bucket'], tzinfo).hour: row['s'] for row in rows}
+        keys = list(range(24))
+        labels = [f"{h:02d}:00" for h in keys]
+        return labels, [float(totals.get(key) or 0) for key in keys]
+
+    if period == 'weekly':
+        first, last = today - timedelta(days=6), today
+        keys = [first + timedelta(days=i) for i in range(7)]
+        labels = [day.strftime('%a %d') for day in keys]
+        key_of = lambda day: day
+    elif period == 'yearly':
+        first, last = today.replace(month=1, day=1), today.replace(month=12, day=31)
+        keys = list(range(1, 13))
+        labels = [calendar.month_abbr[m] for m in keys]
+        key_of = lambda day: day.month
+    else:  # monthly – daily breakdown of the whole month
+        days_in_month = calendar.monthrange(today.year, today.month)[1]
+        first, last = today.replace(day=1), today.replace(day=days_in_month)
+        keys = [first + timedelta(days=i) for i in range(days_in_month)]
+        labels = [str(day.day) for day in keys]
+        key_of = lambda day: day
+
+    totals = defaultdict(Decimal)
+    for day, revenue in get_daily_sales(first, last).values_list('date', 'revenue'):
+        totals[key_of(day)] += revenue
+    return labels, [float(totals.get(key) or 0) for key in keys]
+
+
+def compute_dashboard_stats(start, today):
+    """KPI cards and top-10 lists for the period start..today (uncached)"""
+    start_dt, end_dt = _local_bounds(start, today)
+
+    # Revenue, order count and the top-10 lists come from the daily sales rollup
+    sales = get_sales_summary(start, today)
+
+    return {
+        'total_revenue': sales['revenue'] or Decimal('0'),
+        'total_orders': sales['order_count'],
+        'total_users': CustomUser.objects.filter(is_superuser=False).count(),
+        'new_users': CustomUser.objects.filter(
+            is_superuser=False, date_joined__range=(start_dt, end_dt)
+        ).count(),
+        'pending_orders': OrderItem.objects.filter(status='Pending').count(),
+        'total_products': Product.objects.filter(is_deleted=False).count(),
+        'top_products': get_top_products(start, today),
+        'top_categories': get_top_categories(start, today),
+        'top_brands': get_top_brands(start, today),
+        'computed_at': timezone.now(),
+    }
+
+
+def get_dashboard_stats(period, start, today, refresh=False):
+    """
+    Cached compute_dashboard_stats for one period.
+
+    Entries are fresh for DASHBOARD_CACHE_SECONDS. Recomputation is
+    single-flight: the request that wins the cache lock recomputes while
+    concurrent requests keep serving the stale copy, or wait for the winner
+    when there is none. `refresh` skips the fresh copy (the Refresh button).
+    """
+    key = f"dashboard:stats:{period}:{start.isoformat()}:{today.isoformat()}"
+    lock_key = f"{key}:lock"
+    ttl = settings.DASHBOARD_CACHE_SECONDS
+    lock_timeout = settings.DASHBOARD_CACHE_LOCK_SECONDS
+
+    cached = cache.get(key)
+    if cached and not refresh and cached['fresh_until'] > time.time():
+        return cached
+
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            started = time.monotonic()
+            stats = compute_dashboard_stats(start, today)
+            stats['fresh_until'] = time.time() + ttl
+            # kept well past its freshness so it can be served while recomputing
+            cache.set(key, stats, ttl * 10)
+            logger.info(f"Dashboard stats {period} recomputed in {(time.monotonic() - started) * 1000:.0f}ms")
+            return stats
+        finally:
+            cache.delete(lock_key)
+
+    if cached and not refresh:
+        return cached
+
+    # Another request is computing; wait for its result rather than repeat it
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline and cache.get(lock_key) is not None:
+        time.sleep(0.05)
+    stats = cache.get(key)
+    if stats and stats is not cached and (not cached or stats['computed_at'] > cached['computed_at']):
+        return stats
+    logger.warning(f"Dashboard stats {period}: no result from the lock holder, computing directly")
+    return compute_dashboard_stats(start, today)
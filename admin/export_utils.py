@@ -0,0 +1,144 @@
+"""
+CSV and NDJSON exports for accounting's spreadsheet and BI imports.
+
+Rows come from batched values_list queries and are encoded as they arrive,
+so a StreamingHttpResponse starts sending at once and an export of
+millions of rows runs in the memory of one batch.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .report_utils import (
+    PAYMENT_METHOD_LABELS, LEDGER_ORDER_FIELDS, LEDGER_WALLET_FIELDS,
+    iter_sales_rows, iter_values_batched, ledger_orders, ledger_wallet_transactions,
+)
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+ROWS_PER_CHUNK = 500  # rows joined into one chunk of the response
+
+SALES_EXPORT_COLUMNS = [
+    'order_number', 'date', 'customer', 'product', 'size', 'color', 'quantity', 'mrp', 'unit_price',
+    'item_discount', 'coupon_discount', 'order_total', 'payment_method', 'status',
+]
+
+LEDGER_ORDER_COLUMNS = [
+    'date', 'order_number', 'customer', 'payment_method', 'subtotal', 'discount', 'shipping', 'total', 'status',
+]
+
+LEDGER_WALLET_COLUMNS = ['date', 'transaction_id', 'user', 'type', 'amount', 'status', 'description']
+
+WALLET_EXPORT_FIELDS = (
+    'created_at', 'transaction_id', 'wallet__user__name', 'wallet__user__email', 'transaction_type',
+    'amount', 'status', 'description', 'order__order_number',
+)
+
+WALLET_EXPORT_COLUMNS = [
+    'date', 'transaction_id', 'user', 'email', 'type', 'amount', 'status', 'description', 'order_number',
+]
+
+
+def _local(dt):
+    return timezone.localtime(dt).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def sales_export_rows(start_dt, end_dt):
+    for item in iter_sales_rows(start_dt, end_dt):
+        yield (
+            item['order__order_number'],
+            item['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
+            item['order__user__name'],
+            item['product_variant__product__name'],
+            item['product_variant__size'],
+            item['product_variant__color'],
+            item['quantity'],
+            item['original_price'],
+            item['price'],
+            (item['original_price'] - item['price']) * item['quantity'],
+            item['order__discount'],
+            item['order__total_amount'],
+            item['payment_method'],
+            item['status'],
+        )
+
+
+def ledger_order_rows(start_dt, end_dt, status_filter=''):
+    rows = iter_values_batched(ledger_orders(start_dt, end_dt, status_filter), LEDGER_ORDER_FIELDS)
+    for created_at, number, name, method, subtotal, discount, shipping, total, status in rows:
+        yield (
+            _local(created_at), number, name, PAYMENT_METHOD_LABELS.get(method, method),
+            subtotal, discount, shipping, total, status,
+        )
+
+
+def ledger_wallet_rows(start_dt, end_dt):
+    rows = iter_values_batched(ledger_wallet_transactions(start_dt, end_dt), LEDGER_WALLET_FIELDS)
+    for created_at, txn_id, name, txn_type, amount, status, description in rows:
+        yield (
+            _local(created_at), txn_id, name, 'Credit' if txn_type == 'Cr' else 'Debit',
+            amount, status, description,
+        )
+
+
+def wallet_transaction_rows(transactions):
+    """Rows of an already filtered WalletTransaction queryset, newest first"""
+    rows = iter_values_batched(transactions, WALLET_EXPORT_FIELDS, newest_first=True)
+    for created_at, txn_id, name, email, txn_type, amount, status, description, order_number in rows:
+        yield (
+            _local(created_at), txn_id, name, email, 'Credit' if txn_type == 'Cr' else 'Debit',
+            amount, status, description, order_number,
+        )
+
+
+class _Echo:
+    """Write target for csv.writer that hands the formatted line back"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    # Spreadsheets run text starting with these as a formula
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+
+def iter_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow([_csv_cell(value) for value in row]))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def iter_ndjson(columns, rows):
+    """One JSON object per line; decimals are written as strings so no paisa is lost"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(columns, row))) + '\n')
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def export_response(fmt, filename, columns, rows):
+    """StreamingHttpResponse of `rows` as CSV or NDJSON; `fmt` must be a key of EXPORT_CONTENT_TYPES"""
+    stream = iter_ndjson(columns, rows) if fmt == 'ndjson' else iter_csv(columns, rows)
+    response = StreamingHttpResponse(stream, content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
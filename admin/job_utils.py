@@ -0,0 +1,146 @@
+"""
+Background rendering of large PDF reports and invoice ZIPs.
+
+Views enqueue a ReportJob with the report spec and return immediately; the
+process_report_jobs worker claims jobs one at a time (locked rows are
+skipped, so several workers can run), renders the file to a temp file,
+saves it to the private report storage and marks the job Completed.
+Progress is written back as a percentage for the sales report page to poll.
+"""
+import time, tempfile, logging
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from orders.invoice_utils import get_export_items, get_invoice_storage, iter_invoice_zip
+from .models import ReportJob
+from .report_utils import render_sales_pdf, render_ledger_pdf
+
+logger = logging.getLogger(__name__)
+
+
+def get_report_storage():
+    """Reports share the private (non-public) storage used for invoices"""
+    return get_invoice_storage()
+
+
+def enqueue_report(user, kind, params, filename):
+    """
+    Queue a report, reusing an identical one this user is already waiting
+    for so a double click does not render it twice. Returns the job.
+    """
+    existing = ReportJob.objects.filter(
+        requested_by=user, kind=kind, params=params, status__in=['Pending', 'Running']
+    ).first()
+    if existing:
+        return existing
+    job = ReportJob.objects.create(requested_by=user, kind=kind, params=params, filename=filename)
+    logger.info(f"Report job {job.id} queued: {kind} {params}")
+    return job
+
+
+def recent_report_jobs(user, limit=5):
+    return list(ReportJob.objects.filter(requested_by=user).order_by('-created_at')[:limit])
+
+
+def _claim_next_job(max_attempts, skip_ids):
+    # Pending jobs, plus Running ones whose worker died mid-render
+    stale_before = timezone.now() - timedelta(minutes=settings.REPORT_JOB_TIMEOUT_MINUTES)
+    qs = (
+        ReportJob.objects.filter(attempts__lt=max_attempts)
+        .filter(Q(status='Pending') | Q(status='Running', started_at__lt=stale_before))
+        .exclude(id__in=skip_ids)
+        .order_by('created_at')
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        qs = qs.select_for_update(skip_locked=True)
+    elif connection.features.has_select_for_update:
+        qs = qs.select_for_update()
+    return qs.first()
+
+
+class _ProgressWriter:
+    """Writes the job's percentage only when it moves, at most every half second"""
+
+    def __init__(self, job):
+        self.job = job
+        self.last_written = 0.0
+
+    def __call__(self, done, total):
+        percent = min(int(done * 90 / total), 90) if total else 0  # the last 10% is doc.build
+        now = time.monotonic()
+        if percent > self.job.progress and now - self.last_written >= 0.5:
+            self.job.progress = percent
+            ReportJob.objects.filter(pk=self.job.pk).update(progress=percent)
+            self.last_written = now
+
+
+def render_report(job, out, progress=None):
+    """Render `job` into the binary file object `out`"""
+    params = job.params
+    start = date.fromisoformat(params['start'])
+    end = date.fromisoformat(params['end'])
+    if job.kind == 'sales_pdf':
+        render_sales_pdf(out, start, end, progress=progress)
+    elif job.kind == 'ledger_pdf':
+        render_ledger_pdf(
+            out, start, end, params.get('period_label', ''),
+            status_filter=params.get('status', ''), progress=progress,
+        )
+    elif job.kind == 'invoice_zip':
+        start_dt = timezone.make_aware(datetime.combine(start, datetime.min.time()))
+        end_dt = timezone.make_aware(datetime.combine(end, datetime.max.time()))
+        item_ids = list(get_export_items(start_dt, end_dt).values_list('id', flat=True))
+        for chunk in iter_invoice_zip(item_ids, progress=progress):
+            out.write(chunk)
+    else:
+        raise ValueError(f"Unknown report kind {job.kind}")
+
+
+def run_report_job(job):
+    """Render one claimed job and store the file; failures are recorded on the job"""
+    started = time.monotonic()
+    try:
+        with tempfile.TemporaryFile() as out:
+            render_report(job, out, progress=_ProgressWriter(job))
+            ReportJob.objects.filter(pk=job.pk).update(progress=95)
+            out.seek(0)
+            path = get_report_storage().save(f"reports/{job.id}/{job.filename}", File(out))
+    except Exception as e:
+        logger.error(f"Report job {job.id} failed (attempt {job.attempts}): {e}")
+        status = 'Failed' if job.attempts >= settings.REPORT_JOB_MAX_ATTEMPTS else 'Pending'
+        ReportJob.objects.filter(pk=job.pk).update(status=status, last_error=str(e), finished_at=timezone.now())
+        return False
+
+    ReportJob.objects.filter(pk=job.pk).update(
+        status='Completed', progress=100, file_path=path, last_error=None, finished_at=timezone.now()
+    )
+    logger.info(f"Report job {job.id} rendered in {time.monotonic() - started:.1f}s")
+    return True
+
+
+def process_report_jobs(limit=10):
+    """
+    Render up to `limit` queued jobs. The claim is a short transaction that
+    flips the job to Running; rendering happens outside it.
+    """
+    processed = 0
+    attempted = []  # a job that just failed waits for the next run
+    while processed < limit:
+        with transaction.atomic():
+            job = _claim_next_job(settings.REPORT_JOB_MAX_ATTEMPTS, attempted)
+            if job is None:
+                break
+            attempted.append(job.id)
+            job.status = 'Running'
+            job.attempts += 1
+            job.progress = 0
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'attempts', 'progress', 'started_at'])
+        run_report_job(job)
+        processed += 1
+    return processed
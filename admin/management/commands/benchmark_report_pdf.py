@@ -0,0 +1,136 @@
+import time, tempfile, tracemalloc, uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+
+from admin.report_utils import render_ledger_pdf, _bounds
+from orders.models import Order
+from users.models import CustomUser
+from wallet.models import Wallet, WalletTransaction
+
+
+def paragraph_ledger(out, start, end):
+    """
+    The ledger's order and wallet sections as they were laid out before
+    streaming: a Paragraph and style lookup per cell, every row of a
+    section in one Table, and the whole document built in one call.
+    Kept only as the baseline for this benchmark.
+    """
+    start_dt, end_dt = _bounds(start, end)
+    styles = getSampleStyleSheet()
+    hdr_style = ParagraphStyle('H', parent=styles['Normal'], fontSize=8, fontName='Helvetica-Bold',
+                               alignment=TA_CENTER, textColor=colors.white)
+    cell_style = ParagraphStyle('C', parent=styles['Normal'], fontSize=7, alignment=TA_CENTER)
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+        ('GRID', (0, 0), (-1, -1), 0.4, colors.HexColor('#dee2e6')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+
+    table_data = [[Paragraph(h, hdr_style) for h in
+                   ['Date', 'Order #', 'Customer', 'Payment', 'Subtotal', 'Discount', 'Shipping', 'Total', 'Status']]]
+    for o in Order.objects.filter(created_at__range=(start_dt, end_dt)).select_related('user').order_by('created_at'):
+        table_data.append([
+            Paragraph(o.created_at.strftime('%d/%m/%y'), cell_style),
+            Paragraph(str(o.order_number), cell_style),
+            Paragraph(o.user.name[:20], cell_style),
+            Paragraph(o.get_payment_method_display(), cell_style),
+            Paragraph(f"Rs.{o.subtotal:,.2f}", cell_style),
+            Paragraph(f"Rs.{o.discount:,.2f}", cell_style),
+            Paragraph(f"Rs.{o.shipping_cost:,.2f}", cell_style),
+            Paragraph(f"Rs.{o.total_amount:,.2f}", cell_style),
+            Paragraph(o.overall_status, cell_style),
+        ])
+    orders_table = Table(table_data, colWidths=[55, 70, 90, 65, 70, 65, 65, 70, 65], repeatRows=1)
+    orders_table.setStyle(style)
+
+    table_data = [[Paragraph(h, hdr_style) for h in
+                   ['Date', 'Transaction ID', 'User', 'Type', 'Amount', 'Status', 'Description']]]
+    txns = WalletTransaction.objects.filter(created_at__range=(start_dt, end_dt)).select_related('wallet__user')
+    for txn in txns.order_by('created_at'):
+        table_data.append([
+            Paragraph(txn.created_at.strftime('%d/%m/%y'), cell_style),
+            Paragraph(str(txn.transaction_id or '—'), cell_style),
+            Paragraph(txn.wallet.user.name[:20], cell_style),
+            Paragraph('Credit' if txn.transaction_type == 'Cr' else 'Debit', cell_style),
+            Paragraph(f"Rs.{txn.amount:,.2f}", cell_style),
+            Paragraph(txn.status, cell_style),
+            Paragraph((txn.description or '—')[:40], cell_style),
+        ])
+    wallet_table = Table(table_data, colWidths=[50, 90, 90, 50, 100, 65, 120], repeatRows=1)
+    wallet_table.setStyle(style)
+
+    doc = SimpleDocTemplate(out, pagesize=landscape(letter), rightMargin=25, leftMargin=25,
+                            topMargin=25, bottomMargin=25)
+    doc.build([orders_table, wallet_table])
+
+
+class Command(BaseCommand):
+    help = (
+        "Time and peak memory of rendering the ledger PDF over synthetic data, "
+        "old Paragraph-per-cell layout against the streaming renderer. The "
+        "synthetic orders are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50000, help="Synthetic orders to render")
+        parser.add_argument('--wallet-txns', type=int, default=5000, help="Synthetic wallet transactions to render")
+        parser.add_argument('--skip-baseline', action='store_true', help="Only measure the streaming renderer")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._create_data(options['orders'], options['wallet_txns'])
+            today = timezone.localdate()
+            self.stdout.write(f"Ledger for {options['orders']} orders and {options['wallet_txns']} wallet transactions")
+            if not options['skip_baseline']:
+                self._measure("baseline (Paragraph cells)", lambda out: paragraph_ledger(out, today, today))
+            self._measure("streaming (plain cells)", lambda out: render_ledger_pdf(out, today, today, 'Benchmark'))
+            transaction.set_rollback(True)
+
+    def _create_data(self, order_count, txn_count):
+        tag = uuid.uuid4().hex[:8]
+        user = CustomUser.objects.create_user(
+            username=f'bench-{tag}', email=f'bench-{tag}@example.com', password=None, name='Benchmark Customer'
+        )
+        wallet = Wallet.objects.create(user=user)
+        methods = ['COD', 'RP', 'WP']
+        for offset in range(0, order_count, 5000):
+            Order.objects.bulk_create([
+                Order(
+                    user=user, order_number=f'B{tag}{n:08d}', subtotal=Decimal('1000.00'),
+                    discount=Decimal('50.00') if n % 2 else Decimal('0.00'), total_amount=Decimal('950.00'),
+                    payment_method=methods[n % 3], overall_status='Delivered',
+                )
+                for n in range(offset, min(offset + 5000, order_count))
+            ])
+        WalletTransaction.objects.bulk_create([
+            WalletTransaction(
+                wallet=wallet, transaction_type='Cr' if n % 3 else 'Dr', amount=Decimal('120.00'),
+                status='Completed', transaction_id=f'TXN-B{n:08d}', description=f'Refund for order B{tag}{n:08d}',
+            )
+            for n in range(txn_count)
+        ], batch_size=5000)
+
+    def _measure(self, label, render):
+        # timed without tracing, then rendered again under tracemalloc for the peak
+        with tempfile.TemporaryFile() as out:
+            started = time.perf_counter()
+            render(out)
+            elapsed = time.perf_counter() - started
+            size = out.tell()
+        with tempfile.TemporaryFile() as out:
+            tracemalloc.start()
+            try:
+                render(out)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        self.stdout.write(f"  {label:<28} {elapsed:8.1f}s  peak {peak / 2**20:8.1f} MiB  pdf {size / 2**20:6.1f} MiB")
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from admin.job_utils import process_report_jobs
+
+
+class Command(BaseCommand):
+    help = "Render queued admin report jobs (sales report and ledger PDFs)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10, help="Jobs to render per pass")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting after one pass")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait between passes when idle")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_report_jobs(limit=options['limit'])
+            if processed:
+                self.stdout.write(f"Rendered {processed} report job(s)")
+            if not options['loop']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from admin.customer_utils import rebuild_customer_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the lifetime order, return and wallet metrics shown in the "
+        "admin customer list. Run nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Customers recomputed per transaction")
+
+    def handle(self, *args, **options):
+        count = rebuild_customer_metrics(batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt metrics for {count} customer(s)"))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-19 16:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sales_pdf', 'Sales Report PDF'), ('ledger_pdf', 'Ledger Book PDF')], max_length=20)),
+                ('params', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Running', 'Running'), ('Completed', 'Completed'), ('Failed', 'Failed')], default='Pending', max_length=10)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('filename', models.CharField(max_length=100)),
+                ('file_path', models.CharField(blank=True, max_length=255, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='report_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='report_job_queue_idx'), models.Index(fields=['requested_by', 'created_at'], name='report_job_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-19 19:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_admin', '0001_initial'),
+        ('users', '0026_alter_otpverification_expiry_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerMetrics',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metrics', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+                ('items_bought', models.PositiveIntegerField(default=0)),
+                ('items_returned', models.PositiveIntegerField(default=0)),
+                ('return_rate', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('wallet_balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['order_count'], name='customer_order_count_idx'), models.Index(fields=['lifetime_spend'], name='customer_spend_idx'), models.Index(fields=['last_order_at'], name='customer_last_order_idx'), models.Index(fields=['return_rate'], name='customer_return_rate_idx'), models.Index(fields=['wallet_balance'], name='customer_wallet_idx')],
+            },
+        ),
+    ]
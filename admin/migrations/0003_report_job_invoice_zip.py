@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_admin', '0002_customer_metrics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportjob',
+            name='kind',
+            field=models.CharField(choices=[('sales_pdf', 'Sales Report PDF'), ('ledger_pdf', 'Ledger Book PDF'), ('invoice_zip', 'Invoices ZIP')], max_length=20),
+        ),
+    ]
@@ -1,3 +1,75 @@
 from django.db import models
 
-# Create your models here.
+from users.models import CustomUser
+
+
+class ReportJob(models.Model):
+    """A PDF report or invoice ZIP requested from the admin panel and rendered by process_report_jobs"""
+    KIND_CHOICES = [
+        ('sales_pdf', 'Sales Report PDF'),
+        ('ledger_pdf', 'Ledger Book PDF'),
+        ('invoice_zip', 'Invoices ZIP'),
+    ]
+
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+
+    kind = models.CharField(choices=KIND_CHOICES, max_length=20)
+    # Report spec, e.g. {'start': '2026-10-01', 'end': '2026-10-19', ...}
+    params = models.JSONField(default=dict)
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='report_jobs')
+    status = models.CharField(choices=STATUS_CHOICES, max_length=10, default='Pending')
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    attempts = models.PositiveSmallIntegerField(default=0)
+    filename = models.CharField(max_length=100)
+    file_path = models.CharField(max_length=255, blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='report_job_queue_idx'),
+            models.Index(fields=['requested_by', 'created_at'], name='report_job_user_idx'),
+        ]
+
+    @property
+    def is_done(self):
+        return self.status in ('Completed', 'Failed')
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.status})"
+
+
+class CustomerMetrics(models.Model):
+    """
+    Lifetime order and wallet figures per customer, rebuilt nightly by
+    rebuild_customer_metrics so the customer list can sort and filter on
+    them without aggregating orders per request.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='metrics')
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(blank=True, null=True)
+    items_bought = models.PositiveIntegerField(default=0)
+    items_returned = models.PositiveIntegerField(default=0)
+    return_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # percent of items bought
+    wallet_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_count'], name='customer_order_count_idx'),
+            models.Index(fields=['lifetime_spend'], name='customer_spend_idx'),
+            models.Index(fields=['last_order_at'], name='customer_last_order_idx'),
+            models.Index(fields=['return_rate'], name='customer_return_rate_idx'),
+            models.Index(fields=['wallet_balance'], name='customer_wallet_idx'),
+        ]
+
+    def __str__(self):
+        return f"Metrics for {self.user.email}"
@@ -0,0 +1,504 @@
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import (
+    BaseDocTemplate, Flowable, Frame, PageBreak, PageTemplate, Paragraph, Spacer, Table, TableStyle,
+)
+
+from orders.models import Order, OrderItem
+from orders.rollup_utils import get_sales_summary, get_daily_sales, get_category_brand_sales
+from wallet.models import WalletTransaction
+
+PAYMENT_METHOD_LABELS = dict(Order.PAYMENT_METHOD_CHOICES)
+
+SALES_ROW_FIELDS = (
+    'order_id', 'order__order_number', 'order__created_at', 'order__user__name',
+    'product_variant__product__name', 'product_variant__size', 'product_variant__color',
+    'quantity', 'price', 'original_price', 'order__discount', 'order__total_amount',
+    'order__payment_method', 'status',
+)
+
+
+def _bounds(start_date, end_date):
+    start_dt = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+    end_dt = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
+    return start_dt, end_dt
+
+
+def iter_values_batched(queryset, fields, batch_size=2000, newest_first=False):
+    """
+    Yield values_list tuples of `fields` in primary key order, reading one
+    keyset batch (`pk > last`, or `pk < last` newest first) at a time.
+
+    MySQL's client buffers a query's whole result set, so one .iterator()
+    over millions of rows would not keep memory flat; a run of short
+    index-seek queries does.
+    """
+    ordering = '-pk' if newest_first else 'pk'
+    last_pk = None
+    while True:
+        batch = queryset.order_by(ordering)
+        if last_pk is not None:
+            batch = batch.filter(pk__lt=last_pk) if newest_first else batch.filter(pk__gt=last_pk)
+        count = 0
+        for row in batch.values_list('pk', *fields)[:batch_size].iterator():
+            last_pk = row[0]
+            count += 1
+            yield row[1:]
+        if count < batch_size:
+            return
+
+
+def iter_sales_rows(start_dt, end_dt, chunk_size=500):
+    """
+    Yield one dict per sales report item, newest order first.
+
+    Orders are read in keyset batches of `chunk_size` ids, then their items
+    through one values-only query per batch, so memory stays flat however
+    long the range. Rows of an order arrive together; each is given the
+    order's total offer discount (items_discount), worked out from the small
+    per-order buffer instead of a second query.
+    """
+    cancelled = OrderItem.objects.filter(order=OuterRef('pk'), status='Cancelled')
+    orders = Order.objects.filter(created_at__range=(start_dt, end_dt)).filter(~Exists(cancelled))
+    order_ids = iter_values_batched(orders, ('id',), batch_size=chunk_size, newest_first=True)
+    while True:
+        ids = [row[0] for row in islice(order_ids, chunk_size)]
+        if not ids:
+            return
+        rows = (
+            OrderItem.objects.filter(order_id__in=ids)
+            .order_by('-order_id', 'id')
+            .values(*SALES_ROW_FIELDS)
+            .iterator()
+        )
+        batch = []
+        for row in rows:
+            if batch and row['order_id'] != batch[0]['order_id']:
+                yield from _finish_order(batch)
+                batch = []
+            batch.append(row)
+        if batch:
+            yield from _finish_order(batch)
+
+
+LEDGER_ORDER_FIELDS = (
+    'created_at', 'order_number', 'user__name', 'payment_method',
+    'subtotal', 'discount', 'shipping_cost', 'total_amount', 'overall_status',
+)
+
+LEDGER_WALLET_FIELDS = (
+    'created_at', 'transaction_id', 'wallet__user__name', 'transaction_type', 'amount', 'status', 'description',
+)
+
+
+def ledger_orders(start_dt, end_dt, status_filter=''):
+    orders = Order.objects.filter(created_at__range=(start_dt, end_dt))
+    if status_filter:
+        orders = orders.filter(overall_status=status_filter)
+    return orders
+
+
+def ledger_wallet_transactions(start_dt, end_dt):
+    return WalletTransaction.objects.filter(created_at__range=(start_dt, end_dt))
+
+
+def _finish_order(batch):
+    items_discount = sum((row['original_price'] - row['price']) * row['quantity'] for row in batch)
+    for row in batch:
+        row['items_discount'] = items_discount
+        row['created_at'] = timezone.localtime(row['order__created_at'])
+        row['payment_method'] = PAYMENT_METHOD_LABELS.get(row['order__payment_method'], row['order__payment_method'])
+        yield row
+
+
+
+# ── PDF rendering ───────────────────────────────────────────────────────────
+# Cells are plain strings styled by the shared TableStyles below, so a row
+# costs a list of str instead of a Paragraph per cell. Long tables are cut
+# into page-sized Tables and handed to the document as they are built, so
+# each finished page is written out before the next rows are read.
+
+ROW_HEIGHT = 14
+MIN_TABLE_ROWS = 4  # start a new page rather than squeeze fewer rows in
+
+_styles = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle('ReportTitle', parent=_styles['Heading1'], fontSize=18, alignment=TA_CENTER,
+                             spaceAfter=6, textColor=colors.HexColor('#2c3e50'))
+SUBTITLE_STYLE = ParagraphStyle('ReportSubtitle', parent=_styles['Normal'], fontSize=10, alignment=TA_CENTER,
+                                spaceAfter=2, textColor=colors.HexColor('#7f8c8d'))
+PERIOD_STYLE = ParagraphStyle('ReportPeriod', parent=_styles['Heading2'], fontSize=12, alignment=TA_CENTER,
+                              spaceAfter=15)
+SECTION_STYLE = ParagraphStyle('ReportSection', parent=_styles['Heading2'], fontSize=12, spaceAfter=8,
+                               spaceBefore=16, textColor=colors.HexColor('#2c3e50'))
+
+HEADER_BG = colors.HexColor('#2c3e50')
+GRID_COLOR = colors.HexColor('#dee2e6')
+
+DATA_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), HEADER_BG),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 8),
+    ('FONTSIZE', (0, 1), (-1, -1), 7),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 0.4, GRID_COLOR),
+    ('LEFTPADDING', (0, 0), (-1, -1), 3),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+])
+
+# Sales table: discount column in green, coupon column in blue
+SALES_TABLE_STYLE = TableStyle([
+    ('TEXTCOLOR', (7, 1), (7, -1), colors.green),
+    ('TEXTCOLOR', (8, 1), (8, -1), colors.blue),
+], parent=DATA_TABLE_STYLE)
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+
+ORDER_TOTAL_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#eafaf1')),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('TEXTCOLOR', (7, 0), (7, 0), colors.HexColor('#27ae60')),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 0.4, GRID_COLOR),
+])
+
+WALLET_TOTAL_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#fdf0f0')),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('SPAN', (4, 0), (6, 0)),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('GRID', (0, 0), (-1, -1), 0.4, GRID_COLOR),
+])
+
+
+class _SpaceProbe(Flowable):
+    """Zero-size flowable that records the height left in the current frame"""
+
+    def __init__(self):
+        super().__init__()
+        self.available = 0
+
+    def wrap(self, availWidth, availHeight):
+        self.available = availHeight
+        return 0, 0
+
+    def draw(self):
+        pass
+
+
+class ChunkedDocTemplate(BaseDocTemplate):
+    """
+    A single-frame document fed flowables a few at a time instead of as one
+    list: open(), add() as often as needed, close(). It runs the same loop
+    as build(), so pages are laid out as flowables arrive and only the
+    finished page streams are held until close() writes the file.
+    """
+
+    def open(self):
+        self._calc()
+        frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='normal')
+        self.addPageTemplates([PageTemplate(id='Page', frames=frame, pagesize=self.pagesize)])
+        self._startBuild()
+        self.canv._doctemplate = self
+
+    def add(self, *flowables):
+        flowables = list(flowables)
+        while flowables:
+            self.clean_hanging()
+            self.handle_flowable(flowables)
+
+    def available_height(self):
+        probe = _SpaceProbe()
+        self.add(probe)
+        return probe.available
+
+    def ensure_space(self, height):
+        """Break to a new page unless `height` points are left on this one"""
+        if self.available_height() < height:
+            self.add(PageBreak())
+
+    def close(self):
+        del self.canv._doctemplate
+        self._endBuild()
+
+
+def _stream_table(doc, header, rows, col_widths, style=DATA_TABLE_STYLE):
+    """
+    Lay `rows` (lists of strings, any iterable) out under `header`, one
+    Table per page: each chunk takes as many rows as fit in the space left,
+    so no Table is ever split and the header tops every page.
+    """
+    rows = iter(rows)
+    pending = next(rows, None)
+    while True:
+        doc.ensure_space(ROW_HEIGHT * (MIN_TABLE_ROWS + 1))
+        fit = int((doc.available_height() - 1) // ROW_HEIGHT) - 1
+        chunk = [header]
+        if pending is not None:
+            chunk.append(pending)
+            chunk.extend(islice(rows, fit - 1))
+            pending = next(rows, None)
+        doc.add(Table(chunk, colWidths=col_widths, rowHeights=[ROW_HEIGHT] * len(chunk), style=style))
+        if pending is None:
+            return
+
+
+def _single_row(doc, row, col_widths, style):
+    doc.ensure_space(ROW_HEIGHT + 1)
+    doc.add(Table([row], colWidths=col_widths, rowHeights=[ROW_HEIGHT], style=style))
+
+
+def _section(doc, title):
+    # keep the heading on the page its table starts on
+    doc.ensure_space(40 + ROW_HEIGHT * (MIN_TABLE_ROWS + 1))
+    doc.add(Paragraph(title, SECTION_STYLE))
+
+
+def _new_doc(out, margin):
+    doc = ChunkedDocTemplate(out, pagesize=landscape(letter), rightMargin=margin, leftMargin=margin,
+                             topMargin=margin, bottomMargin=margin)
+    doc.open()
+    return doc
+
+
+def render_sales_pdf(out, start_date, end_date, progress=None):
+    """
+    Write the sales report PDF for start_date..end_date to the file object
+    `out`. `progress(done, total)` is called as each order is reached.
+    """
+    start_datetime, end_datetime = _bounds(start_date, end_date)
+
+    # Use Landscape for more width
+    doc = _new_doc(out, 30)
+    doc.add(
+        Paragraph("WALKORIA", TITLE_STYLE),
+        Paragraph("123 Fashion Street, Kerala, India - 670001", SUBTITLE_STYLE),
+        Paragraph("Email: support@walkoria.com | Phone: +91 9876543210", SUBTITLE_STYLE),
+        Spacer(1, 20),
+        Paragraph(f"Sales Report: {start_date.strftime('%d %b %Y')} to {end_date.strftime('%d %b %Y')}", PERIOD_STYLE),
+    )
+
+    # Calculate overall totals for the PDF from the daily sales rollup
+    sales = get_sales_summary(start_date, end_date)
+    total_discount_amount = sales['coupon_discount'] + sales['offer_discount']
+    summary_data = [
+        ['Total Revenue', f"Rs. {sales['sales_amount']:,.2f}"],
+        ['Total Discount Given', f"Rs. {total_discount_amount:,.2f}"],
+        ['Total Orders', str(sales['sales_order_count'])],
+    ]
+    doc.add(Table(summary_data, colWidths=[150, 150], style=SUMMARY_TABLE_STYLE), Spacer(1, 20))
+
+    def table_rows():
+        total_orders = sales['sales_order_count']
+        done = 0
+        order_id = None
+        for row in iter_sales_rows(start_datetime, end_datetime):
+            # Order total and coupon go on the order's first row only
+            first = row['order_id'] != order_id
+            if first:
+                order_id = row['order_id']
+                done += 1
+                if progress:
+                    progress(done, total_orders)
+
+            product = row['product_variant__product__name']
+            if product is None:
+                product = "N/A"
+            else:
+                product = f"{product} ({row['product_variant__size']}-{row['product_variant__color']})"
+            if len(product) > 30:
+                product = product[:27] + "..."
+
+            item_discount = (row['original_price'] - row['price']) * row['quantity']
+            coupon = row['order__discount']
+            yield [
+                row['created_at'].strftime('%Y-%m-%d'),
+                row['order__order_number'],
+                row['order__user__name'],
+                product,
+                f"Rs.{row['original_price']:,.2f}",
+                f"Rs.{row['price']:,.2f}",
+                str(row['quantity']),
+                f"Rs.{item_discount:,.2f}" if item_discount > 0 else "-",
+                (f"Rs.{coupon:,.2f}" if coupon > 0 else "-") if first else "",
+                f"Rs.{row['order__total_amount']:,.2f}" if first else "",
+                row['status'],
+            ]
+
+    # Columns: Date | Order ID | Customer | Product | MRP | Sold At | Qty | Disc. | Coupon | Order Total | Status
+    headers = ['Date', 'Order #', 'Customer', 'Product', 'MRP', 'Sold At', 'Qty', 'Disc.', 'Coupon', 'Order Total', 'Status']
+    col_widths = [55, 65, 80, 140, 45, 45, 25, 45, 45, 55, 60]
+    _stream_table(doc, headers, table_rows(), col_widths, SALES_TABLE_STYLE)
+    doc.close()
+
+
+def render_ledger_pdf(out, start, end, period_label, status_filter='', progress=None):
+    """
+    Write the ledger book PDF for start..end to the file object `out`.
+    `progress(done, total)` is called after every order and wallet row.
+    """
+    start_dt, end_dt = _bounds(start, end)
+    local_now = timezone.localtime(timezone.now())
+
+    orders = ledger_orders(start_dt, end_dt, status_filter)
+    status_summary = (
+        orders.order_by().values('overall_status')
+        .annotate(count=Count('id'), amount=Sum('total_amount'))
+        .order_by('overall_status')
+    )
+    wallet_txns = ledger_wallet_transactions(start_dt, end_dt)
+
+    total_rows = orders.count() + wallet_txns.count()
+    done = 0
+    totals = {'orders': Decimal('0'), 'Cr': Decimal('0'), 'Dr': Decimal('0')}
+
+    def tick():
+        nonlocal done
+        done += 1
+        if progress:
+            progress(done, total_rows)
+
+    doc = _new_doc(out, 25)
+    doc.add(
+        Paragraph("WALKORIA — Ledger Book", TITLE_STYLE),
+        Paragraph(period_label, SUBTITLE_STYLE),
+        Paragraph(f"Generated: {local_now.strftime('%d %b %Y, %I:%M %p')}", SUBTITLE_STYLE),
+        Spacer(1, 14),
+    )
+
+    # ── Section 1: Orders ───────────────────────────────────────────────────
+    def order_rows():
+        rows = iter_values_batched(orders, LEDGER_ORDER_FIELDS)
+        for created_at, number, name, method, subtotal, discount, shipping, total, status in rows:
+            totals['orders'] += total
+            tick()
+            yield [
+                timezone.localtime(created_at).strftime('%d/%m/%y'),
+                number,
+                name[:20],
+                PAYMENT_METHOD_LABELS.get(method, method),
+                f"Rs.{subtotal:,.2f}",
+                f"Rs.{discount:,.2f}",
+                f"Rs.{shipping:,.2f}",
+                f"Rs.{total:,.2f}",
+                status,
+            ]
+
+    _section(doc, "SECTION 1 — Order Transactions")
+    col_w = [55, 70, 90, 65, 70, 65, 65, 70, 65]
+    _stream_table(doc, ['Date', 'Order #', 'Customer', 'Payment', 'Subtotal', 'Discount', 'Shipping', 'Total', 'Status'],
+                  order_rows(), col_w)
+    _single_row(doc, ['', '', '', 'TOTAL', '', '', '', f"Rs.{totals['orders']:,.2f}", ''], col_w, ORDER_TOTAL_STYLE)
+    doc.add(Spacer(1, 12))
+
+    summary_rows = (
+        [row['overall_status'], str(row['count']), f"Rs.{row['amount'] or 0:,.2f}"] for row in status_summary
+    )
+    _stream_table(doc, ['Order Status', 'Orders', 'Amount'], summary_rows, [120, 60, 100])
+    doc.add(Spacer(1, 20))
+
+    # ── Section 2: Wallet Ledger ─────────────────────────────────────────────
+    def wallet_rows():
+        rows = iter_values_batched(wallet_txns, LEDGER_WALLET_FIELDS)
+        for created_at, txn_id, name, txn_type, amount, status, description in rows:
+            totals[txn_type] += amount
+            tick()
+            yield [
+                timezone.localtime(created_at).strftime('%d/%m/%y'),
+                txn_id or '—',
+                name[:20],
+                'Credit' if txn_type == 'Cr' else 'Debit',
+                f"Rs.{amount:,.2f}",
+                status,
+                (description or '—')[:40],
+            ]
+
+    _section(doc, "SECTION 2 — Wallet Transactions")
+    col_w2 = [50, 90, 90, 50, 100, 65, 200]
+    _stream_table(doc, ['Date', 'Transaction ID', 'User', 'Type', 'Amount', 'Status', 'Description'],
+                  wallet_rows(), col_w2)
+    _single_row(doc, ['', '', '', 'TOTAL', f"Cr: Rs.{totals['Cr']:,.2f} | Dr: Rs.{totals['Dr']:,.2f}", '', ''],
+                col_w2, WALLET_TOTAL_STYLE)
+
+    # ── Section 3: Daily Summary (daily sales rollup) ───────────────────────
+    daily_rows = (
+        [
+            day.date.strftime('%d/%m/%y'), str(day.order_count), f"Rs.{day.revenue:,.2f}",
+            f"Rs.{day.coupon_discount:,.2f}", f"Rs.{day.offer_discount:,.2f}", str(day.items_sold),
+            str(day.cancellations), str(day.returns), f"Rs.{day.refunds:,.2f}",
+        ]
+        for day in get_daily_sales(start, end)
+    )
+    _section(doc, "SECTION 3 — Daily Summary")
+    _stream_table(doc, ['Date', 'Orders', 'Revenue', 'Coupon Disc.', 'Offer Disc.', 'Items Sold', 'Cancelled', 'Returned', 'Refunds'],
+                  daily_rows, [60, 50, 80, 75, 75, 60, 60, 60, 75])
+
+    # ── Section 4: Category & Brand Summary ─────────────────────────────────
+    group_rows = (
+        [
+            (group['cat_name'] or '—')[:24], (group['brand_name'] or '—')[:24], str(group['items_sold']),
+            f"Rs.{group['revenue']:,.2f}", f"Rs.{group['offer_discount']:,.2f}", str(group['cancellations']),
+            str(group['returns']), f"Rs.{group['refunds']:,.2f}",
+        ]
+        for group in get_category_brand_sales(start, end)
+    )
+    _section(doc, "SECTION 4 — Category & Brand Summary")
+    _stream_table(doc, ['Category', 'Brand', 'Items Sold', 'Revenue', 'Offer Disc.', 'Cancelled', 'Returned', 'Refunds'],
+                  group_rows, [100, 100, 60, 80, 75, 60, 60, 75])
+
+    doc.close()
+
+
+def render_wallet_statement_pdf(out, user, statement, rows):
+    """
+    Write a customer's wallet statement to the file object `out`.
+    `statement` is from wallet.statement_utils.wallet_statement and `rows`
+    from statement_rows.
+    """
+    period = f"{statement['start'].strftime('%d %b %Y')} to {statement['end'].strftime('%d %b %Y')}"
+    doc = _new_doc(out, 30)
+    doc.add(
+        Paragraph("WALKORIA — Wallet Statement", TITLE_STYLE),
+        Paragraph(f"{user.name} ({user.email})", SUBTITLE_STYLE),
+        Paragraph(f"Generated: {timezone.localtime(timezone.now()).strftime('%d %b %Y, %I:%M %p')}", SUBTITLE_STYLE),
+        Spacer(1, 14),
+        Paragraph(f"Statement Period: {period}", PERIOD_STYLE),
+        Table([
+            ['Opening Balance', f"Rs.{statement['opening']:,.2f}"],
+            ['Total Credits', f"Rs.{statement['credits']:,.2f}"],
+            ['Total Debits', f"Rs.{statement['debits']:,.2f}"],
+            ['Closing Balance', f"Rs.{statement['closing']:,.2f}"],
+            ['Transactions', str(statement['count'])],
+        ], colWidths=[150, 150], style=SUMMARY_TABLE_STYLE),
+        Spacer(1, 12),
+    )
+
+    table_rows = (
+        [date, txn_id or '—', (description or '—')[:48], txn_type, f"Rs.{amount:,.2f}", status, f"Rs.{balance:,.2f}"]
+        for date, txn_id, description, txn_type, amount, status, balance in rows
+    )
+    _section(doc, "Transactions")
+    _stream_table(doc, ['Date', 'Transaction ID', 'Description', 'Type', 'Amount', 'Status', 'Balance'],
+                  table_rows, [85, 95, 230, 50, 80, 65, 85])
+    doc.close()
@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from admin.customer_utils import customer_directory, rebuild_customer_metrics
+from admin.models import CustomerMetrics
+from orders.tests.helpers import make_order, make_user, make_variant
+from users.models import CustomUser
+from wallet.models import Wallet
+
+
+def make_customer(name):
+    user = make_user()
+    CustomUser.objects.filter(pk=user.pk).update(name=name)
+    return user
+
+
+class CustomerMetricsTests(TestCase):
+
+    def setUp(self):
+        self.user = make_customer('Meera')
+
+    def metrics(self):
+        rebuild_customer_metrics()
+        return CustomerMetrics.objects.get(user=self.user)
+
+    def test_return_rate_is_rounded_to_two_places(self):
+        make_order(self.user, [(make_variant(), 2)], status='Delivered')
+        make_order(self.user, [(make_variant(), 1)], status='Returned')
+        metrics = self.metrics()
+        self.assertEqual((metrics.items_bought, metrics.items_returned), (3, 1))
+        self.assertEqual(metrics.return_rate, Decimal('33.33'))
+        self.assertEqual(metrics.lifetime_spend, Decimal('200.00'))
+
+    def test_unplaced_orders_are_not_counted(self):
+        placed = make_order(self.user, [(make_variant(), 1)], status='Processing')
+        make_order(self.user, [(make_variant(), 1)], 'RP', item_payment_status='Pending')
+        make_order(self.user, [(make_variant(), 1)], 'RP', status='Payment_Failed', item_payment_status='Failed')
+        metrics = self.metrics()
+        self.assertEqual(metrics.order_count, 1)
+        self.assertEqual(metrics.last_order_at, placed.created_at)
+        self.assertEqual(metrics.lifetime_spend, Decimal('100.00'))
+
+    def test_balances_of_several_wallets_are_added(self):
+        Wallet.objects.create(user=self.user, balance=Decimal('150.00'))
+        Wallet.objects.create(user=self.user, balance=Decimal('25.50'))
+        self.assertEqual(self.metrics().wallet_balance, Decimal('175.50'))
+
+    def test_customer_without_orders_gets_zeroes(self):
+        metrics = self.metrics()
+        self.assertEqual((metrics.order_count, metrics.items_bought, metrics.return_rate), (0, 0, 0))
+        self.assertIsNone(metrics.last_order_at)
+
+
+class CustomerDirectoryTests(TestCase):
+
+    def setUp(self):
+        self.big = make_customer('Anil')
+        self.small = make_customer('Bina')
+        self.none = make_customer('Chitra')
+        make_order(self.big, [(make_variant(price='900.00'), 1)], status='Delivered')
+        make_order(self.big, [(make_variant(), 1)], status='Delivered')
+        make_order(self.small, [(make_variant(), 1)], status='Delivered')
+        rebuild_customer_metrics()
+        # signed up after the nightly rebuild, so no metrics row yet
+        self.new = make_customer('Aarav')
+
+    def names(self, **kwargs):
+        return list(customer_directory(**kwargs).values_list('name', flat=True))
+
+    def test_no_orders_segment_includes_customers_without_metrics(self):
+        self.assertFalse(CustomerMetrics.objects.filter(user=self.new).exists())
+        self.assertEqual(self.names(segment='no_orders'), ['Aarav', 'Chitra'])
+
+    def test_repeat_segment(self):
+        self.assertEqual(self.names(segment='repeat'), ['Anil'])
+
+    def test_customers_without_metrics_sort_last(self):
+        self.assertEqual(self.names(sort='spend'), ['Anil', 'Bina', 'Chitra', 'Aarav'])
+        # both have no last order; ties fall back to the name
+        self.assertEqual(self.names(sort='recent'), ['Bina', 'Anil', 'Aarav', 'Chitra'])
+        self.assertEqual(self.names(sort='name'), ['Aarav', 'Anil', 'Bina', 'Chitra'])
+
+    def test_min_spend_and_search(self):
+        self.assertEqual(self.names(min_spend=Decimal('500')), ['Anil'])
+        self.assertEqual(self.names(search='bi'), ['Bina'])
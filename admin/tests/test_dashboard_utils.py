@@ -0,0 +1,60 @@
+import time
+from datetime import date
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from admin.dashboard_utils import compute_dashboard_stats, get_dashboard_stats
+
+START, TODAY = date(2026, 10, 1), date(2026, 10, 19)
+KEY = f"dashboard:stats:monthly:{START.isoformat()}:{TODAY.isoformat()}"
+LOCK_KEY = f"{KEY}:lock"
+
+
+@override_settings(DASHBOARD_CACHE_SECONDS=60, DASHBOARD_CACHE_LOCK_SECONDS=10)
+class DashboardStatsCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def stats(self, refresh=False):
+        return get_dashboard_stats('monthly', START, TODAY, refresh=refresh)
+
+    def compute(self, **kwargs):
+        return mock.patch('admin.dashboard_utils.compute_dashboard_stats', wraps=compute_dashboard_stats, **kwargs)
+
+    def test_fresh_copy_is_served_without_computing(self):
+        with self.compute() as compute:
+            first = self.stats()
+            second = self.stats()
+        compute.assert_called_once()
+        self.assertEqual(first['computed_at'], second['computed_at'])
+        self.assertIsNone(cache.get(LOCK_KEY))
+
+    def test_stale_copy_is_served_while_another_request_holds_the_lock(self):
+        stale = {'total_orders': 1, 'computed_at': 1, 'fresh_until': time.time() - 1}
+        cache.set(KEY, stale)
+        cache.add(LOCK_KEY, 1, 10)
+        with self.compute() as compute:
+            self.assertEqual(self.stats(), stale)
+        compute.assert_not_called()
+
+    @override_settings(DASHBOARD_CACHE_LOCK_SECONDS=0.2)
+    def test_falls_back_to_computing_when_the_lock_holder_never_delivers(self):
+        cache.add(LOCK_KEY, 1, 10)
+        with self.compute() as compute, self.assertLogs('admin.dashboard_utils', 'WARNING'):
+            stats = self.stats()
+        compute.assert_called_once()
+        self.assertIn('total_revenue', stats)
+
+    def test_lock_is_released_when_computing_fails(self):
+        with self.compute(side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                self.stats()
+        self.assertIsNone(cache.get(LOCK_KEY))
+
+        with self.compute() as compute:
+            self.stats()
+        compute.assert_called_once()
@@ -12,18 +12,27 @@ urlpatterns = [
         path('orders/', views.admin_orders, name='orders'),
         path('order/<int:order_id>/', views.admin_order_overview, name='admin_order_overview'),
         path('order-item/update/<int:item_id>/', views.update_order_item, name='update_order_item'),
+        path('order/<int:order_id>/update-items/', views.update_order_items, name='update_order_items'),
         path('return-request/<int:request_id>/<str:action>/', views.handle_return_request, name='handle_return_request'),
         
         # Sales Report
         path('sales-report/', views.sales_report, name='sales_report'),
         path('sales-report/download-pdf/', views.download_report_pdf, name='download_report_pdf'),
         path('sales-report/download-excel/', views.download_report_excel, name='download_report_excel'),
+        path('sales-report/export-invoices/', views.export_invoices, name='export_invoices'),
+        path('sales-report/export/', views.export_sales_report, name='export_sales_report'),
+
+        # Background report jobs
+        path('report-jobs/status/', views.report_jobs_status, name='report_jobs_status'),
+        path('report-jobs/<int:job_id>/download/', views.download_report_job, name='download_report_job'),
 
         # Wallet Management
         path('wallet-transactions/', views.admin_wallet_transactions, name='admin_wallet_transactions'),
         path('wallet-transactions/<int:transaction_id>/', views.admin_wallet_transaction_detail, name='admin_wallet_transaction_detail'),
+        path('wallet-transactions/export/', views.export_wallet_transactions, name='export_wallet_transactions'),
 
         # Ledger Book
         path('download-ledger/', views.download_ledger, name='download_ledger'),
+        path('download-ledger/export/', views.export_ledger, name='export_ledger'),
     ]
 
@@ -9,9 +9,11 @@ from django.views.decorators.cache import cache_control
 from admin.forms import CustomAuthenticationForm
 from django.contrib.auth import logout
 from wallet.models import Wallet, WalletTransaction, Offer
+from wallet.ledger_utils import get_ledger_totals
+from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
-import json, uuid, time
+import json, uuid, time, tempfile
 from utils.decorators import admin_required
 from django.contrib.auth import logout
 from users.models import CustomUser
@@ -21,17 +23,24 @@ from referral.views import give_referral_rewards
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from orders.models import Order, OrderItem, ReturnRequest
-from django.http import HttpResponse, HttpResponseNotAllowed
+from orders.status_utils import apply_item_status, refresh_overall_statuses, BULK_ITEM_STATUSES, OPEN_ITEM_STATUSES
+from orders.refund_utils import refund_items, INACTIVE_ITEM_STATUSES
+from orders.search_utils import search_order_items, keyset_page
+from admin.customer_utils import customer_directory, CUSTOMER_SORTS, CUSTOMER_SEGMENTS
+from admin.dashboard_utils import get_revenue_series, get_dashboard_stats
+from admin.report_utils import iter_sales_rows
+from admin.export_utils import (
+    EXPORT_CONTENT_TYPES, SALES_EXPORT_COLUMNS, LEDGER_ORDER_COLUMNS, LEDGER_WALLET_COLUMNS, WALLET_EXPORT_COLUMNS,
+    export_response, sales_export_rows, ledger_order_rows, ledger_wallet_rows, wallet_transaction_rows,
+)
+from admin.job_utils import enqueue_report, recent_report_jobs, get_report_storage
+from admin.models import ReportJob
+from orders.rollup_utils import get_sales_summary, get_daily_sales
+from django.http import HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse, FileResponse, JsonResponse
+from django.urls import reverse
+from urllib.parse import urlencode
 import xlsxwriter
-from io import BytesIO
-from reportlab.pdfgen import canvas
 from decimal import Decimal
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm, inch
-from reportlab.lib.enums import TA_RIGHT, TA_CENTER, TA_LEFT
-from reportlab.lib import colors
 
 #admin login view
 
@@ -90,130 +99,19 @@ def dashboard_view(request):
     elif period == 'yearly':
         start = today.replace(month=1, day=1)
     else:  # monthly (default)
+        period = 'monthly'
         start = today.replace(day=1)
 
-    start_dt = tz.make_aware(datetime.combine(start, datetime.min.time()))
-    end_dt   = tz.make_aware(datetime.combine(today, datetime.max.time()))
-
-    # ── KPI Cards ───────────────────────────────────────────────────────────
-    from orders.models import Order, OrderItem
-    from users.models import CustomUser
-    from product.models import Product
-
-    all_completed = OrderItem.objects.filter(
-        status__in=['Delivered', 'Processing', 'Shipped', 'On_the_Way']
-    )
-    total_revenue = Order.objects.filter(
-        created_at__range=(start_dt, end_dt)
-    ).exclude(items__status__in=['Cancelled', 'Payment_Failed']).aggregate(
-        s=Sum('total_amount')
-    )['s'] or Decimal('0')
-
-    total_orders  = Order.objects.filter(created_at__range=(start_dt, end_dt)).count()
-    total_users   = CustomUser.objects.filter(is_superuser=False).count()
-    new_users     = CustomUser.objects.filter(
-        is_superuser=False, date_joined__range=(start_dt, end_dt)
-    ).count()
-    pending_orders = OrderItem.objects.filter(status='Pending').count()
-    total_products = Product.objects.filter(is_deleted=False).count()
+    # ── KPI Cards and Top 10 lists (cached per period) ─────────────────────
+    from orders.models import Order
+    stats = get_dashboard_stats(period, start, today, refresh=request.GET.get('refresh') == '1')
+    top_products   = stats['top_products']
+    top_categories = stats['top_categories']
+    top_brands     = stats['top_brands']
 
     # ── Sales Chart Data ─────────────────────────────────────────────────────
     import json
-    chart_labels = []
-    chart_data   = []
-
-    if period == 'daily':
-        # last 24 hours by hour
-        for h in range(24):
-            label = f"{h:02d}:00"
-            h_start = tz.make_aware(datetime.combine(today, datetime.min.time())) + timedelta(hours=h)
-            h_end   = h_start + timedelta(hours=1)
-            rev = Order.objects.filter(
-                created_at__range=(h_start, h_end)
-            ).aggregate(s=Sum('total_amount'))['s'] or 0
-            chart_labels.append(label)
-            chart_data.append(float(rev))
-
-    elif period == 'weekly':
-        for i in range(7):
-            day = start + timedelta(days=i)
-            d_start = tz.make_aware(datetime.combine(day, datetime.min.time()))
-            d_end   = tz.make_aware(datetime.combine(day, datetime.max.time()))
-            rev = Order.objects.filter(
-                created_at__range=(d_start, d_end)
-            ).aggregate(s=Sum('total_amount'))['s'] or 0
-            chart_labels.append(day.strftime('%a %d'))
-            chart_data.append(float(rev))
-
-    elif period == 'yearly':
-        import calendar
-        for m in range(1, 13):
-            last_day = calendar.monthrange(today.year, m)[1]
-            m_start = tz.make_aware(datetime.combine(
-                today.replace(month=m, day=1), datetime.min.time()))
-            m_end = tz.make_aware(datetime.combine(
-                today.replace(month=m, day=last_day), datetime.max.time()))
-            rev = Order.objects.filter(
-                created_at__range=(m_start, m_end)
-            ).aggregate(s=Sum('total_amount'))['s'] or 0
-            chart_labels.append(calendar.month_abbr[m])
-            chart_data.append(float(rev))
-
-    else:  # monthly – daily breakdown
-        import calendar
-        days_in_month = calendar.monthrange(today.year, today.month)[1]
-        for d in range(1, days_in_month + 1):
-            try:
-                day = today.replace(day=d)
-            except ValueError:
-                break
-            d_start = tz.make_aware(datetime.combine(day, datetime.min.time()))
-            d_end   = tz.make_aware(datetime.combine(day, datetime.max.time()))
-            rev = Order.objects.filter(
-                created_at__range=(d_start, d_end)
-            ).aggregate(s=Sum('total_amount'))['s'] or 0
-            chart_labels.append(str(d))
-            chart_data.append(float(rev))
-
-    # ── Top 10 Products ──────────────────────────────────────────────────────
-    from product.models import Product
-    top_products = (
-        OrderItem.objects
-        .filter(status__in=['Delivered', 'Processing', 'Shipped', 'On_the_Way'])
-        .values(
-            product_name=F('product_variant__product__name'),
-            product_id=F('product_variant__product__id'),
-        )
-        .annotate(
-            total_qty=Sum('quantity'),
-            total_rev=Sum(F('price') * F('quantity'))
-        )
-        .order_by('-total_qty')[:10]
-    )
-
-    # ── Top 10 Categories ────────────────────────────────────────────────────
-    top_categories = (
-        OrderItem.objects
-        .filter(status__in=['Delivered', 'Processing', 'Shipped', 'On_the_Way'])
-        .values(cat_name=F('product_variant__product__category__name'))
-        .annotate(
-            total_qty=Sum('quantity'),
-            total_rev=Sum(F('price') * F('quantity'))
-        )
-        .order_by('-total_qty')[:10]
-    )
-
-    # ── Top 10 Brands ────────────────────────────────────────────────────────
-    top_brands = (
-        OrderItem.objects
-        .filter(status__in=['Delivered', 'Processing', 'Shipped', 'On_the_Way'])
-        .values(brand_name=F('product_variant__product__brand__name'))
-        .annotate(
-            total_qty=Sum('quantity'),
-            total_rev=Sum(F('price') * F('quantity'))
-        )
-        .order_by('-total_qty')[:10]
-    )
+    chart_labels, chart_data = get_revenue_series(period, today)
 
     # ── Recent Orders ────────────────────────────────────────────────────────
     recent_orders = (
@@ -243,12 +141,13 @@ def dashboard_view(request):
     context = {
         'period': period,
         # KPIs
-        'total_revenue':  total_revenue,
-        'total_orders':   total_orders,
-        'total_users':    total_users,
-        'new_users':      new_users,
-        'pending_orders': pending_orders,
-        'total_products': total_products,
+        'total_revenue':  stats['total_revenue'],
+        'total_orders':   stats['total_orders'],
+        'total_users':    stats['total_users'],
+        'new_users':      stats['new_users'],
+        'pending_orders': stats['pending_orders'],
+        'total_products': stats['total_products'],
+        'stats_computed_at': stats['computed_at'],
         # Chart
         'chart_labels': json.dumps(chart_labels),
         'chart_data':   json.dumps(chart_data),
@@ -265,178 +164,65 @@ def dashboard_view(request):
         # Recent
         'recent_sales': recent_sales,
         'first_name': request.user.name.title(),
+        'report_jobs': recent_report_jobs(request.user),
     }
     return render(request, 'dashboard.html', context)
 
 
+def _ledger_period(period, today):
+    """(period, start date, label) of a ledger period ending today"""
+    if period == 'daily':
+        return period, today, f"Daily – {today.strftime('%d %b %Y')}"
+    if period == 'weekly':
+        start = today - timedelta(days=6)
+        return period, start, f"Weekly – {start.strftime('%d %b')} to {today.strftime('%d %b %Y')}"
+    if period == 'yearly':
+        return period, today.replace(month=1, day=1), f"Yearly – {today.year}"
+    return 'monthly', today.replace(day=1), f"Monthly – {today.strftime('%B %Y')}"
+
+
 @login_required
 @admin_required
 def download_ledger(request):
-    """Generate a ledger book PDF for the selected period."""
-    from django.db.models import Sum, F
-    from django.utils import timezone as tz
-    from datetime import timedelta
-    from decimal import Decimal
-    from io import BytesIO
-    import calendar
-
-    period = request.GET.get('period', 'monthly')
-    local_now = tz.localtime(tz.now())
-    today = local_now.date()
+    """Queue a ledger book PDF for the selected period."""
+    today = timezone.localtime(timezone.now()).date()
+    period, start, period_label = _ledger_period(request.GET.get('period', 'monthly'), today)
 
-    if period == 'daily':
-        start = today
-        period_label = f"Daily – {today.strftime('%d %b %Y')}"
-    elif period == 'weekly':
-        start = today - timedelta(days=6)
-        period_label = f"Weekly – {start.strftime('%d %b')} to {today.strftime('%d %b %Y')}"
-    elif period == 'yearly':
-        start = today.replace(month=1, day=1)
-        period_label = f"Yearly – {today.year}"
-    else:
-        start = today.replace(day=1)
-        period_label = f"Monthly – {today.strftime('%B %Y')}"
+    # Rendered by the process_report_jobs worker; progress and the download
+    # link show up in the reports panel on the dashboard
+    enqueue_report(
+        request.user, 'ledger_pdf',
+        {
+            'start': start.isoformat(),
+            'end': today.isoformat(),
+            'period_label': period_label,
+            'status': request.GET.get('status', ''),
+        },
+        filename=f"Walkoria_Ledger_{period}.pdf",
+    )
+    return redirect(f"{reverse('admin_dashboard')}?period={period}")
 
-    start_dt = tz.make_aware(datetime.combine(start, datetime.min.time()))
-    end_dt   = tz.make_aware(datetime.combine(today, datetime.max.time()))
 
-    from orders.models import Order, OrderItem
-    from wallet.models import WalletTransaction
+@login_required
+@admin_required
+def export_ledger(request):
+    """Stream the ledger's order or wallet section as CSV or NDJSON"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_CONTENT_TYPES:
+        fmt = 'csv'
+    today = timezone.localtime(timezone.now()).date()
+    period, start, _ = _ledger_period(request.GET.get('period', 'monthly'), today)
+    start_dt = timezone.make_aware(datetime.combine(start, datetime.min.time()))
+    end_dt = timezone.make_aware(datetime.combine(today, datetime.max.time()))
 
-    orders = Order.objects.filter(
-        created_at__range=(start_dt, end_dt)
-    ).select_related('user').prefetch_related('items__product_variant__product').order_by('created_at')
-
-    wallet_txns = WalletTransaction.objects.filter(
-        created_at__range=(start_dt, end_dt)
-    ).select_related('wallet__user').order_by('created_at')
-
-    # Build PDF
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Walkoria_Ledger_{period}.pdf"'
-
-    buf = BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=landscape(letter),
-                            rightMargin=25, leftMargin=25,
-                            topMargin=25, bottomMargin=25)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    title_style = ParagraphStyle('T', parent=styles['Heading1'],
-                                  fontSize=18, alignment=TA_CENTER,
-                                  textColor=colors.HexColor('#2c3e50'), spaceAfter=4)
-    sub_style   = ParagraphStyle('S', parent=styles['Normal'],
-                                  fontSize=10, alignment=TA_CENTER,
-                                  textColor=colors.HexColor('#7f8c8d'), spaceAfter=2)
-    hdr_style   = ParagraphStyle('H', parent=styles['Normal'],
-                                  fontSize=8, fontName='Helvetica-Bold',
-                                  alignment=TA_CENTER, textColor=colors.white)
-    cell_style  = ParagraphStyle('C', parent=styles['Normal'],
-                                  fontSize=7, alignment=TA_CENTER)
-    section_style = ParagraphStyle('Sec', parent=styles['Heading2'],
-                                    fontSize=12, spaceAfter=8, spaceBefore=16,
-                                    textColor=colors.HexColor('#2c3e50'))
-
-    elements.append(Paragraph("WALKORIA — Ledger Book", title_style))
-    elements.append(Paragraph(period_label, sub_style))
-    elements.append(Paragraph(f"Generated: {local_now.strftime('%d %b %Y, %I:%M %p')}", sub_style))
-    elements.append(Spacer(1, 14))
-
-    # ── Section 1: Orders ───────────────────────────────────────────────────
-    elements.append(Paragraph("SECTION 1 — Order Transactions", section_style))
-
-    hdr = ['Date', 'Order #', 'Customer', 'Payment', 'Subtotal', 'Discount', 'Shipping', 'Total', 'Status']
-    table_data = [[Paragraph(h, hdr_style) for h in hdr]]
-
-    total_ord_amount = Decimal('0')
-    for o in orders:
-        status = o.get_overall_status()
-        row = [
-            Paragraph(o.created_at.strftime('%d/%m/%y'), cell_style),
-            Paragraph(str(o.order_number), cell_style),
-            Paragraph(o.user.name[:20], cell_style),
-            Paragraph(o.get_payment_method_display(), cell_style),
-            Paragraph(f"Rs.{o.subtotal:,.2f}", cell_style),
-            Paragraph(f"Rs.{o.discount:,.2f}", cell_style),
-            Paragraph(f"Rs.{o.shipping_cost:,.2f}", cell_style),
-            Paragraph(f"Rs.{o.total_amount:,.2f}", cell_style),
-            Paragraph(status, cell_style),
-        ]
-        table_data.append(row)
-        total_ord_amount += o.total_amount
-
-    # Totals row
-    table_data.append([
-        Paragraph('', cell_style), Paragraph('', cell_style),
-        Paragraph('', cell_style), Paragraph('TOTAL', hdr_style),
-        Paragraph('', cell_style), Paragraph('', cell_style),
-        Paragraph('', cell_style),
-        Paragraph(f"Rs.{total_ord_amount:,.2f}", ParagraphStyle('Bold',
-            parent=cell_style, fontName='Helvetica-Bold', textColor=colors.HexColor('#27ae60'))),
-        Paragraph('', cell_style),
-    ])
-
-    col_w = [55, 70, 90, 65, 70, 65, 65, 70, 65]
-    t = Table(table_data, colWidths=col_w, repeatRows=1)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2c3e50')),
-        ('BACKGROUND', (0,-1), (-1,-1), colors.HexColor('#eafaf1')),
-        ('ROWBACKGROUNDS', (0,1), (-1,-2), [colors.white, colors.HexColor('#f8f9fa')]),
-        ('GRID', (0,0), (-1,-1), 0.4, colors.HexColor('#dee2e6')),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('ROWHEIGHT', (0,0), (-1,-1), 18),
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1, 20))
-
-    # ── Section 2: Wallet Ledger ─────────────────────────────────────────────
-    elements.append(Paragraph("SECTION 2 — Wallet Transactions", section_style))
-
-    hdr2 = ['Date', 'Transaction ID', 'User', 'Type', 'Amount', 'Status', 'Description']
-    table_data2 = [[Paragraph(h, hdr_style) for h in hdr2]]
-
-    total_credits = Decimal('0')
-    total_debits  = Decimal('0')
-    for txn in wallet_txns:
-        row = [
-            Paragraph(txn.created_at.strftime('%d/%m/%y'), cell_style),
-            Paragraph(str(txn.transaction_id or '—'), cell_style),
-            Paragraph(txn.wallet.user.name[:20], cell_style),
-            Paragraph('Credit' if txn.transaction_type == 'Cr' else 'Debit', cell_style),
-            Paragraph(f"Rs.{txn.amount:,.2f}", cell_style),
-            Paragraph(txn.status, cell_style),
-            Paragraph((txn.description or '—')[:40], cell_style),
-        ]
-        table_data2.append(row)
-        if txn.transaction_type == 'Cr':
-            total_credits += txn.amount
-        else:
-            total_debits += txn.amount
-
-    table_data2.append([
-        Paragraph('', cell_style), Paragraph('', cell_style),
-        Paragraph('', cell_style), Paragraph('TOTAL', hdr_style),
-        Paragraph(f"Cr: Rs.{total_credits:,.2f} | Dr: Rs.{total_debits:,.2f}",
-                  ParagraphStyle('Bold', parent=cell_style, fontName='Helvetica-Bold')),
-        Paragraph('', cell_style), Paragraph('', cell_style),
-    ])
-
-    col_w2 = [50, 90, 90, 50, 100, 65, 120]
-    t2 = Table(table_data2, colWidths=col_w2, repeatRows=1)
-    t2.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2c3e50')),
-        ('BACKGROUND', (0,-1), (-1,-1), colors.HexColor('#fdf0f0')),
-        ('ROWBACKGROUNDS', (0,1), (-1,-2), [colors.white, colors.HexColor('#f8f9fa')]),
-        ('GRID', (0,0), (-1,-1), 0.4, colors.HexColor('#dee2e6')),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('ROWHEIGHT', (0,0), (-1,-1), 18),
-    ]))
-    elements.append(t2)
-
-    doc.build(elements)
-    buf.seek(0)
-    response.write(buf.read())
-    return response
+    if request.GET.get('section') == 'wallet':
+        return export_response(
+            fmt, f"Walkoria_Ledger_Wallet_{period}", LEDGER_WALLET_COLUMNS, ledger_wallet_rows(start_dt, end_dt)
+        )
+    return export_response(
+        fmt, f"Walkoria_Ledger_Orders_{period}", LEDGER_ORDER_COLUMNS,
+        ledger_order_rows(start_dt, end_dt, request.GET.get('status', '')),
+    )
 
 
 
@@ -447,18 +233,18 @@ def download_ledger(request):
 @admin_required
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 def customers_view(request):
-    users = CustomUser.objects.filter(is_superuser=False).order_by('name')
-    search_query = request.GET.get('search')
-    status_filter = request.GET.get('status')
+    search_query = request.GET.get('search', '').strip()
+    status_filter = request.GET.get('status', '')
+    segment = request.GET.get('segment', '')
+    sort = request.GET.get('sort', 'name')
+    try:
+        min_spend = Decimal(request.GET['min_spend']) if request.GET.get('min_spend') else None
+    except ArithmeticError:
+        min_spend = None
+    if min_spend is not None and not min_spend.is_finite():
+        min_spend = None
 
-    if search_query:
-        users = users.filter(
-            Q(name__istartswith=search_query) |
-            Q(email__istartswith=search_query) |
-            Q(mobile_no__istartswith=search_query)
-        )
-    if status_filter:
-        users = users.filter(status=status_filter)
+    users = customer_directory(search_query, status_filter, segment, sort, min_spend)
 
     # Pagination
     page = request.GET.get('page', 1)
@@ -470,12 +256,24 @@ def customers_view(request):
     except EmptyPage:
         users_page = paginator.page(paginator.num_pages)
 
+    filter_params = urlencode({
+        key: value for key, value in [
+            ('search', search_query), ('status', status_filter), ('segment', segment),
+            ('sort', sort if sort in CUSTOMER_SORTS else ''), ('min_spend', min_spend if min_spend is not None else ''),
+        ] if value
+    })
+
     name = request.user.name.title()
     context = {
         'users': users_page,
-        'name': name
+        'name': name,
+        'sort': sort,
+        'segment': segment,
+        'min_spend': min_spend,
+        'sort_choices': [(key, label) for key, (label, _) in CUSTOMER_SORTS.items()],
+        'segment_choices': CUSTOMER_SEGMENTS.items(),
+        'filter_params': filter_params,
     }
-    print("sdfghj",users_page)
     return render(request, 'customers.html', context)
 
 
@@ -524,53 +322,59 @@ def customer_status(request):
 @admin_required
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 def admin_orders(request):
-    # name = request.user.name.title()
-    order_items_list = (
-        OrderItem.objects
-        .select_related('order__user', 'product_variant__product')
-        .order_by('-order__created_at')
+    order_items_list = OrderItem.objects.select_related(
+        'order__user', 'order__shipping_address', 'product_variant__product'
     )
 
     search_query = request.GET.get('search', '').strip()
-    print("Search Query:", search_query)
-
     if search_query:
-        order_items_list = order_items_list.filter(
-            Q(order__order_number__icontains=search_query) |   # Order ID
-            Q(order__user__name__icontains=search_query) |     # Customer Name
-            Q(order__user__email__icontains=search_query) |    # Email (optional)
-            Q(product_variant__product__name__icontains=search_query)  # Product
-        ).distinct()
+        order_items_list = search_order_items(order_items_list, search_query)
 
     status_filter = request.GET.get('status', '')
     if status_filter:
         order_items_list = order_items_list.filter(status=status_filter)
-    
-    # Get return requests (items with status 'Return Requested')
-    return_requests = OrderItem.objects.filter(
+
+    order_status_filter = request.GET.get('order_status', '')
+    if order_status_filter:
+        order_items_list = order_items_list.filter(order__overall_status=order_status_filter)
+
+    page = keyset_page(order_items_list, after=request.GET.get('after'), before=request.GET.get('before'), size=5)
+
+    # Return requests are paged on their own, inside the modal
+    return_requests_list = OrderItem.objects.filter(
         status='Return_Requested'
     ).select_related(
         'order__user',
         'product_variant__product'
-    ).order_by('-order__created_at')
-    
-    # Pagination
-    paginator = Paginator(order_items_list, 5)
-    page = request.GET.get('page', 1)
+    ).order_by('-order_id', '-id')
+    returns_paginator = Paginator(return_requests_list, 10)
+    returns_page = request.GET.get('returns_page', 1)
     try:
-        order_items = paginator.page(page)
+        return_requests = returns_paginator.page(returns_page)
     except PageNotAnInteger:
-        order_items = paginator.page(1)
+        return_requests = returns_paginator.page(1)
     except EmptyPage:
-        order_items = paginator.page(paginator.num_pages)
-    
+        return_requests = returns_paginator.page(returns_paginator.num_pages)
+
+    filter_params = urlencode({
+        key: value for key, value in [
+            ('search', search_query), ('status', status_filter), ('order_status', order_status_filter),
+        ] if value
+    })
+
     first_name = request.user.name.title()
     data = {
-        'order_items': order_items,
+        'order_items': page['items'],
+        'newer_cursor': page['newer'],
+        'older_cursor': page['older'],
+        'filter_params': filter_params,
         'return_requests': return_requests,
+        'open_returns': 'returns_page' in request.GET,
         'status_choices': OrderItem.STATUS_CHOICES,
         'search_query': search_query,
         'status_filter': status_filter,
+        'order_status_choices': Order.OVERALL_STATUS_CHOICES,
+        'order_status_filter': order_status_filter,
         'first_name': first_name,
     }
     return render(request, 'admin_orders.html', data)
@@ -588,48 +392,16 @@ def handle_return_request(request, request_id, action):
         return_requests = ReturnRequest.objects.filter(order_id=request_id).last()
 
         if action == 'approve':
-            order_item.status = 'Returned'
-            order_item.item_payment_status = 'Refunded'
             return_requests.status = 'Approved'
-            # Save status first so get_refund_amount() sees the correct item state
-            order_item.save()
             return_requests.save()
 
-            # Use the same proven formula as cancel_product:
-            # proportional offer share + coupon deduction + delivery refund if last item
-            from decimal import Decimal
-            refund_amount = order_item.get_refund_amount()
-
-            # Update order totals (mirrors cancel_product logic)
-            effective_item_price = order_item.price * order_item.quantity
-            order.subtotal = max(order.subtotal - effective_item_price, Decimal('0'))
-            if order.subtotal <= 0:
-                order.shipping_cost = Decimal('0')
-                order.total_amount = Decimal('0')
-            else:
-                order.total_amount = max(order.total_amount - refund_amount, Decimal('0'))
-            order.save()
-
-            if refund_amount > 0:
-                wallet, _ = Wallet.objects.get_or_create(user=order.user)
-                wallet.refresh_from_db()
-                refund_decimal = Decimal(str(refund_amount))
-                wallet.balance = wallet.balance + refund_decimal
-                wallet.save()
-                WalletTransaction.objects.create(
-                    wallet=wallet,
-                    transaction_type="Cr",
-                    amount=refund_decimal,
-                    status="Completed",
-                    description=f"Return approved refund - Order #{order.order_number} - Item #{order_item.id}",
-                    order=order,
-                    transaction_id="RT" + str(int(time.time()))[-6:] + uuid.uuid4().hex[:4].upper(),
-                )
-
-            # Restore stock
-            product_variant = order_item.product_variant
-            product_variant.quantity += order_item.quantity
-            product_variant.save()
+            # Refund, restock and order totals in one pass (refund_utils)
+            credited = refund_items(
+                order, [order_item], 'Returned',
+                description="Return approved refund - Order #{order_number} - Item #{item_id}",
+                txn_prefix='RT',
+            )
+            refund_amount = credited.get(order_item.id, 0)
 
             messages.success(request, f'Return request approved. \u20b9{refund_amount:.2f} refunded to wallet.')
             return redirect('orders')
@@ -638,6 +410,7 @@ def handle_return_request(request, request_id, action):
             order_item.status = 'Delivered'
             return_requests.status = 'Rejected'
             order_item.save()
+            refresh_overall_statuses([order.id])
             return_requests.save()
             messages.error(request, 'Return request rejected.')
             return redirect('orders')
@@ -705,10 +478,33 @@ def admin_order_overview(request, order_id):
         'total_normal_discount': total_normal_discount,
         'total_offer_discount': total_offer_discount,
         'total_sold_price': total_sold_price,
+        'bulk_status_choices': [c for c in OrderItem.STATUS_CHOICES if c[0] in BULK_ITEM_STATUSES],
     }
     return render(request, 'admin_order_overview.html', data)
 
 
+def _give_delivery_referral_rewards(request, user):
+    """Pay out pending referral rewards once a referred user's item is delivered"""
+    try:
+        referral = Referral.objects.get(referred_user=user)
+        # Check if rewards not yet given
+        if not referral.reward_given_to_referred or not referral.reward_given_to_referrer:
+            # Find the offer that was active when the referral was created
+            offer = ReferralOffer.objects.filter(
+                valid_from__lte=referral.created_at
+            ).filter(
+                Q(valid_until__gte=referral.created_at) | Q(valid_until__isnull=True)
+            ).first()
+            
+            if offer:
+                give_referral_rewards(referral, offer)
+                messages.success(request, 'Referral rewards distributed successfully.')
+    except Referral.DoesNotExist:
+        pass
+    except Exception as e:
+        print(f"Error giving referral rewards: {e}")
+
+
 @login_required
 @admin_required
 def update_order_item(request, item_id):
@@ -716,71 +512,99 @@ def update_order_item(request, item_id):
     order = order_item.order
     if request.method == 'POST':
         item = get_object_or_404(OrderItem, id=item_id)
-        item.status = request.POST.get('status')
-        item.admin_note = request.POST.get('admin_note')
-        item.is_cancelled = 'True'
-        item.save()
+        if request.POST.get('status') == 'Returned' and order_item.item_payment_status == 'Paid':
+            # Same refund as an approved return request: offer share, coupon
+            # deduction and delivery refund if it was the last active item.
+            # refund_items moves the item itself, and skips it if it was
+            # already refunded.
+            refund_items(
+                order, [item], 'Returned',
+                description="Return refund - Order #{order_number} - Item #{item_id}",
+                txn_prefix='RT',
+                item_fields={'admin_note': request.POST.get('admin_note'), 'is_cancelled': True},
+                from_statuses=[status for status, _ in OrderItem.STATUS_CHOICES if status not in INACTIVE_ITEM_STATUSES],
+            )
+        else:
+            item.status = request.POST.get('status')
+            item.admin_note = request.POST.get('admin_note')
+            item.is_cancelled = 'True'
+            item.save()
+            refresh_overall_statuses([order.id])
 
         if request.POST.get('status') == 'Delivered':
-            try:
-                referral = Referral.objects.get(referred_user=order.user)
-                # Check if rewards not yet given
-                if not referral.reward_given_to_referred or not referral.reward_given_to_referrer:
-                    # Find the offer that was active when the referral was created
-                    offer = ReferralOffer.objects.filter(
-                        valid_from__lte=referral.created_at
-                    ).filter(
-                        Q(valid_until__gte=referral.created_at) | Q(valid_until__isnull=True)
-                    ).first()
-                    
-                    if offer:
-                        give_referral_rewards(referral, offer)
-                        messages.success(request, 'Referral rewards distributed successfully.')
-            except Referral.DoesNotExist:
-                pass
-            except Exception as e:
-                print(f"Error giving referral rewards: {e}")
-
-        if request.POST.get('status') == 'Returned' and order_item.item_payment_status == 'Paid':
-            # Use the same proven formula as cancel_product:
-            # proportional offer share + coupon deduction + delivery refund if last item
-            # NOTE: item is already saved with status='Returned' above (line 718),
-            #       so get_refund_amount()'s exclude(pk=self.pk) correctly excludes it.
-            from decimal import Decimal
-            refund_amount = item.get_refund_amount()
-
-            # Update order totals (mirrors cancel_product logic)
-            effective_item_price = item.price * item.quantity
-            order.subtotal = max(order.subtotal - effective_item_price, Decimal('0'))
-            if order.subtotal <= 0:
-                order.shipping_cost = Decimal('0')
-                order.total_amount = Decimal('0')
-            else:
-                order.total_amount = max(order.total_amount - refund_amount, Decimal('0'))
-            order.save()
-
-            if order.payment_method in ['RP', 'WP', 'PP'] or (order.payment_method == 'COD' and item.status == 'Delivered'):
-                if refund_amount > 0:
-                    wallet, _ = Wallet.objects.get_or_create(user=order.user)
-                    wallet.refresh_from_db()
-                    refund_decimal = Decimal(str(refund_amount))
-                    wallet.balance = wallet.balance + refund_decimal
-                    wallet.save()
-                    WalletTransaction.objects.create(
-                        wallet=wallet,
-                        transaction_type="Cr",
-                        amount=refund_decimal,
-                        status="Completed",
-                        description=f"Return refund - Order #{order.order_number} - Item #{item.id}",
-                        order=order,
-                        transaction_id="RT" + str(int(time.time()))[-6:] + uuid.uuid4().hex[:4].upper(),
-                    )
-                item.item_payment_status = 'Refunded'
-                item.save()
+            _give_delivery_referral_rewards(request, order.user)
         messages.success(request, 'Status updated sucessful')
         return redirect('orders')
 
 
+@login_required
+@admin_required
+def update_order_items(request, order_id):
+    """Apply one fulfilment status to several items of an order at once"""
+    order = get_object_or_404(Order, id=order_id)
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    status = request.POST.get('status')
+    if status not in BULK_ITEM_STATUSES:
+        messages.error(request, 'That status has to be set item by item.')
+        return redirect('admin_order_overview', order_id=order.id)
+    if order.payment_method == 'RP' and not order.payment_status:
+        messages.error(request, 'This order has not been paid yet.')
+        return redirect('admin_order_overview', order_id=order.id)
+
+    items = order.items.filter(status__in=OPEN_ITEM_STATUSES)
+    item_ids = request.POST.getlist('item_ids')
+    if item_ids:
+        items = items.filter(id__in=item_ids)
+    updated = items.count()
+    apply_item_status(items, status, admin_note=request.POST.get('admin_note') or None)
+
+    if status == 'Delivered' and updated:
+        _give_delivery_referral_rewards(request, order.user)
+    messages.success(request, f'Status updated for {updated} item(s)')
+    return redirect('admin_order_overview', order_id=order.id)
+
+
+
+
+@login_required
+@admin_required
+def export_invoices(request):
+    """
+    ZIP of every delivered item's invoice for the selected period. Short
+    ranges are streamed straight away, rendered in this process; longer ones
+    are queued for the process_report_jobs worker.
+    """
+    from orders.invoice_utils import get_export_items, iter_invoice_zip
+
+    try:
+        start_date = datetime.strptime(request.GET.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.GET.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        messages.error(request, 'Select a valid date range to export invoices.')
+        return redirect('sales_report')
+
+    start_datetime = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+    end_datetime = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
+    item_ids = list(get_export_items(start_datetime, end_datetime).values_list('id', flat=True))
+    if not item_ids:
+        messages.info(request, 'No delivered items in that period.')
+        return redirect('sales_report')
+
+    filename = f"Walkoria_Invoices_{start_date}_{end_date}.zip"
+    if len(item_ids) > settings.INVOICE_EXPORT_INLINE_LIMIT:
+        enqueue_report(
+            request.user, 'invoice_zip',
+            {'start': start_date.isoformat(), 'end': end_date.isoformat()},
+            filename=filename,
+        )
+        messages.info(request, f'{len(item_ids)} invoices are being prepared. The ZIP will appear in the reports panel.')
+        return redirect(f"{reverse('sales_report')}?type=custom&start_date={start_date:%Y-%m-%d}&end_date={end_date:%Y-%m-%d}")
+
+    response = StreamingHttpResponse(iter_invoice_zip(item_ids, workers=0), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 # Sales Report Views
@@ -837,20 +661,36 @@ def sales_report(request):
         items_discount=Sum((F('items__original_price') - F('items__price')) * F('items__quantity'))
     ).order_by('-created_at')
 
-    # Calculate totals
-    total_sales_count = orders.count()
-    
-    # Aggregate totals
-    # We calculate item discounts again in aggregate because iterating over all orders for sum is inefficient
-    totals = orders.aggregate(
-        total_rev=Sum('total_amount'),
-        total_coupon_disc=Sum('discount'),
-        total_items_disc=Sum((F('items__original_price') - F('items__price')) * F('items__quantity'))
+    order_status = request.GET.get('order_status', '')
+    if order_status:
+        orders = orders.filter(overall_status=order_status)
+
+    status_counts = (
+        Order.objects.filter(created_at__range=(start_datetime, end_datetime))
+        .exclude(items__status='Cancelled')
+        .values('overall_status')
+        .annotate(count=Count('id', distinct=True))
+        .order_by('overall_status')
     )
-    
-    total_amount = totals['total_rev'] or 0
-    # Total Discount = Coupon Discount + Product Offer Discount
-    total_discount = (totals['total_coupon_disc'] or 0) + (totals['total_items_disc'] or 0)
+
+    # Calculate totals
+    if order_status:
+        total_sales_count = orders.count()
+        # We calculate item discounts again in aggregate because iterating over all orders for sum is inefficient
+        totals = orders.aggregate(
+            total_rev=Sum('total_amount'),
+            total_coupon_disc=Sum('discount'),
+            total_items_disc=Sum((F('items__original_price') - F('items__price')) * F('items__quantity'))
+        )
+        total_amount = totals['total_rev'] or 0
+        # Total Discount = Coupon Discount + Product Offer Discount
+        total_discount = (totals['total_coupon_disc'] or 0) + (totals['total_items_disc'] or 0)
+    else:
+        # Unfiltered totals come from the daily sales rollup
+        sales = get_sales_summary(start_date, end_date)
+        total_sales_count = sales['sales_order_count']
+        total_amount = sales['sales_amount']
+        total_discount = sales['coupon_discount'] + sales['offer_discount']
     
     # Pagination
     page = request.GET.get('page', 1)
@@ -871,64 +711,61 @@ def sales_report(request):
         'total_sales_count': total_sales_count,
         'total_amount': total_amount,
         'total_discount': total_discount,
+        'order_status': order_status,
+        'order_status_choices': Order.OVERALL_STATUS_CHOICES,
+        'status_counts': status_counts,
         'first_name': request.user.first_name or request.user.name, 
+        'report_jobs': recent_report_jobs(request.user),
     }
     
     return render(request, 'sales_report.html', context)
 
 
-@login_required
-@admin_required
-def download_report_excel(request):
+def _report_dates(request):
+    """Start and end date of a sales report download"""
     report_type = request.GET.get('type', 'daily')
     start_date_str = request.GET.get('start_date')
     end_date_str = request.GET.get('end_date')
 
-    local_now = timezone.localtime(timezone.now())
-    today = local_now.date()
-    
-    
+    today = timezone.localtime(timezone.now()).date()
+
+    # Priority 1: Use specific dates if provided (from URL or Custom filter)
     if start_date_str and end_date_str:
         try:
             start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
         except ValueError:
-            
+            # Fallback if invalid format
             start_date = today
             end_date = today
     # Priority 2: Use Report Type Logic
-    else:
-        if report_type == 'daily':
-            start_date = today
-            end_date = today
-        elif report_type == 'weekly':
-            start_date = today - timedelta(days=7)
-            end_date = today
-        elif report_type == 'monthly':
-            start_date = today.replace(day=1)
-            end_date = today
-        elif report_type == 'yearly':
-            start_date = today.replace(month=1, day=1)
-            end_date = today
-        else: # custom handled above or fallback
-            start_date = today
-            end_date = today
+    elif report_type == 'weekly':
+        start_date = today - timedelta(days=7)
+        end_date = today
+    elif report_type == 'monthly':
+        start_date = today.replace(day=1)
+        end_date = today
+    elif report_type == 'yearly':
+        start_date = today.replace(month=1, day=1)
+        end_date = today
+    else:  # daily, or custom without dates
+        start_date = today
+        end_date = today
+    return start_date, end_date
+
 
-   
+@login_required
+@admin_required
+def download_report_excel(request):
+    start_date, end_date = _report_dates(request)
     start_datetime = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
     end_datetime = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
 
-    orders = Order.objects.filter(
-        created_at__range=(start_datetime, end_datetime)
-    ).exclude(items__status='Cancelled').select_related('user').prefetch_related('items__product_variant__product').annotate(
-        items_discount=Sum((F('items__original_price') - F('items__price')) * F('items__quantity'))
-    ).distinct().order_by('-created_at')
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="Walkoria_Sales_Report.xlsx"'
-
-    output = BytesIO()
-    workbook = xlsxwriter.Workbook(output)
+    # Rows are streamed into a constant_memory workbook backed by a temp
+    # file, then the file itself is streamed back, so a yearly export never
+    # holds the orders or the spreadsheet in memory.
+    output = tempfile.TemporaryFile()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
     worksheet = workbook.add_worksheet()
     
     headers = [
@@ -953,301 +790,136 @@ def download_report_excel(request):
     
     # Write headers
     for col, header in enumerate(headers):
-        worksheet.write(0, col, header, header_format)
         worksheet.set_column(col, col, 15)
+        worksheet.write(0, col, header, header_format)
 
     row = 1
-    for order in orders:
-        total_order_discount = (order.discount or 0) + (order.items_discount or 0)
-        for item in order.items.all():
-            worksheet.write(row, 0, order.order_number, cell_format)
-            worksheet.write(row, 1, order.created_at.strftime('%Y-%m-%d'), cell_format)
-            worksheet.write(row, 2, order.user.name, cell_format)
-            
-            product_name = item.product_variant.product.name if item.product_variant else "N/A"
-            worksheet.write(row, 3, product_name, cell_format)
-            
-            variant_info = f"{item.product_variant.size} - {item.product_variant.color}" if item.product_variant else "N/A"
-            worksheet.write(row, 4, variant_info, cell_format)
-            
-            worksheet.write(row, 5, item.quantity, cell_format)
-            worksheet.write(row, 6, float(item.price), cell_format)
-            worksheet.write(row, 7, float(item.total_price), cell_format) # Item total
-            
+    for item in iter_sales_rows(start_datetime, end_datetime):
+        total_order_discount = (item['order__discount'] or 0) + item['items_discount']
+        has_variant = item['product_variant__product__name'] is not None
+        worksheet.write_row(row, 0, [
+            item['order__order_number'],
+            item['created_at'].strftime('%Y-%m-%d'),
+            item['order__user__name'],
+            item['product_variant__product__name'] if has_variant else "N/A",
+            f"{item['product_variant__size']} - {item['product_variant__color']}" if has_variant else "N/A",
+            item['quantity'],
+            float(item['price']),
+            float(item['price'] * item['quantity']),  # Item total
             # Item discount
-            item_disc = (item.original_price - item.price) * item.quantity
-            worksheet.write(row, 8, float(item_disc), cell_format)
-
-            # Coupon Discount (Per Order) - Show on every row or just first? Excel usually prefers every row for sorting.
-            # But might be confusing if summed. Let's precise: "Coupon Discount (Order Level)"
-            worksheet.write(row, 9, float(order.discount), cell_format)
-            
+            float((item['original_price'] - item['price']) * item['quantity']),
+            # Coupon Discount (Order Level), repeated on every row so the sheet sorts cleanly
+            float(item['order__discount']),
             # Total Discount (Item + Coupon)
-            worksheet.write(row, 10, float(total_order_discount), cell_format)
-            
+            float(total_order_discount),
             # Payable amount per order.
-            worksheet.write(row, 11, float(order.total_amount), cell_format)
-            
-            worksheet.write(row, 12, order.get_payment_method_display(), cell_format)
-            worksheet.write(row, 13, item.status, cell_format)
-            row += 1
+            float(item['order__total_amount']),
+            item['payment_method'],
+            item['status'],
+        ], cell_format)
+        row += 1
+
+    # Per-day totals straight from the daily sales rollup
+    summary_sheet = workbook.add_worksheet('Daily Summary')
+    summary_headers = [
+        'Date', 'Orders', 'Revenue', 'Coupon Discount', 'Offer Discount',
+        'Items Sold', 'Cancellations', 'Returns', 'Refunds'
+    ]
+    for col, header in enumerate(summary_headers):
+        summary_sheet.set_column(col, col, 15)
+        summary_sheet.write(0, col, header, header_format)
+    for row, day in enumerate(get_daily_sales(start_date, end_date).iterator(), start=1):
+        summary_sheet.write_row(row, 0, [
+            day.date.strftime('%Y-%m-%d'),
+            day.sales_order_count,
+            float(day.sales_amount),
+            float(day.coupon_discount),
+            float(day.offer_discount),
+            day.items_sold,
+            day.cancellations,
+            day.returns,
+            float(day.refunds),
+        ], cell_format)
 
     workbook.close()
     output.seek(0)
-    response.write(output.read())
-    return response
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename='Walkoria_Sales_Report.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
 
 
 @login_required
 @admin_required
 def download_report_pdf(request):
     report_type = request.GET.get('type', 'daily')
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
+    start_date, end_date = _report_dates(request)
+
+    # Rendered by the process_report_jobs worker; the sales report page
+    # shows its progress and the download link when it is ready
+    enqueue_report(
+        request.user, 'sales_pdf',
+        {'start': start_date.isoformat(), 'end': end_date.isoformat()},
+        filename=f"Walkoria_Sales_Report_{start_date:%Y%m%d}_{end_date:%Y%m%d}.pdf",
+    )
+    return redirect(
+        f"{reverse('sales_report')}?type={report_type}"
+        f"&start_date={start_date:%Y-%m-%d}&end_date={end_date:%Y-%m-%d}"
+    )
 
-    today = timezone.localtime(timezone.now()).date()
-    
-    # Priority 1: Use specific dates if provided (from URL or Custom filter)
-    if start_date_str and end_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-        except ValueError:
-            # Fallback if invalid format
-            start_date = today
-            end_date = today
-    # Priority 2: Use Report Type Logic
-    else:
-        if report_type == 'daily':
-            start_date = today
-            end_date = today
-        elif report_type == 'weekly':
-            start_date = today - timedelta(days=7)
-            end_date = today
-        elif report_type == 'monthly':
-            start_date = today.replace(day=1)
-            end_date = today
-        elif report_type == 'yearly':
-            start_date = today.replace(month=1, day=1)
-            end_date = today
-        else: # custom handled above or fallback
-            start_date = today
-            end_date = today
 
-    # Create aware datetimes for the range to be precise
+@login_required
+@admin_required
+def export_sales_report(request):
+    """Stream the sales report rows as CSV or NDJSON"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_CONTENT_TYPES:
+        fmt = 'csv'
+    start_date, end_date = _report_dates(request)
     start_datetime = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
     end_datetime = timezone.make_aware(datetime.combine(end_date, datetime.max.time()))
-
-    orders = Order.objects.filter(
-        created_at__range=(start_datetime, end_datetime)
-    ).exclude(items__status='Cancelled').select_related('user').prefetch_related('items__product_variant__product').annotate(
-        items_discount=Sum((F('items__original_price') - F('items__price')) * F('items__quantity'))
-    ).distinct().order_by('-created_at')
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="Walkoria_Sales_Report.pdf"'
-    
-    # Use Landscape for more width
-    doc = SimpleDocTemplate(response, pagesize=landscape(letter), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
-    elements = []
-
-    styles = getSampleStyleSheet()
-    
-    # Custom Styles for Professional Look
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        alignment=TA_CENTER,
-        spaceAfter=10,
-        textColor=colors.HexColor('#2c3e50')
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#7f8c8d')
-    )
-    
-    header_style = ParagraphStyle(
-        'TableHeader',
-        parent=styles['Normal'],
-        fontSize=8,
-        fontName='Helvetica-Bold',
-        alignment=TA_CENTER,
-        textColor=colors.white
-    )
-    
-    cell_style = ParagraphStyle(
-        'TableCell',
-        parent=styles['Normal'],
-        fontSize=7,
-        alignment=TA_CENTER,
-        textColor=colors.black
+    return export_response(
+        fmt, f"Walkoria_Sales_{start_date:%Y%m%d}_{end_date:%Y%m%d}",
+        SALES_EXPORT_COLUMNS, sales_export_rows(start_datetime, end_datetime),
     )
 
-    # --- Header Section ---
-    elements.append(Paragraph("WALKORIA", title_style))
-    elements.append(Paragraph("123 Fashion Street, Kerala, India - 670001", subtitle_style))
-    elements.append(Paragraph("Email: support@walkoria.com | Phone: +91 9876543210", subtitle_style))
-    elements.append(Spacer(1, 20))
-    
-    elements.append(Paragraph(f"Sales Report: {start_date.strftime('%d %b %Y')} to {end_date.strftime('%d %b %Y')}", 
-        ParagraphStyle('Period', parent=styles['Heading2'], fontSize=12, alignment=TA_CENTER, spaceAfter=15)))
-
-    # Calculate overall totals for the PDF
-    totals = orders.aggregate(
-        total_rev=Sum('total_amount'),
-        total_coupon_disc=Sum('discount'),
-        total_items_disc=Sum((F('items__original_price') - F('items__price')) * F('items__quantity'))
-    )
-    
-    total_sales_amount = totals['total_rev'] or 0
-    total_discount_amount = (totals['total_coupon_disc'] or 0) + (totals['total_items_disc'] or 0)
-    
-    # Summary Table
-    summary_data = [
-        ['Total Revenue', f"Rs. {total_sales_amount:,.2f}"],
-        ['Total Discount Given', f"Rs. {total_discount_amount:,.2f}"],
-        ['Total Orders', str(orders.count())]
-    ]
-    summary_table = Table(summary_data, colWidths=[150, 150])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 20))
-
-    # --- Main Data Table ---
-    # Columns: Date | Order ID | Customer | Product | MRP | Sold At | Qty | Disc. | Coupon | Order Total | Status
-    headers = ['Date', 'Order #', 'Customer', 'Product', 'MRP', 'Sold At', 'Qty', 'Disc.', 'Coupon', 'Order Total', 'Status']
-    table_data = [[Paragraph(h, header_style) for h in headers]]
-    
-    for order in orders:
-        for i, item in enumerate(order.items.all()):
-            p_name = item.product_variant.product.name if item.product_variant else "N/A"
-            v_info = f" ({item.product_variant.size}-{item.product_variant.color})" if item.product_variant else ""
-            full_product_name = p_name + v_info
-            
-            # Truncate to fit column
-            if len(full_product_name) > 30:
-                full_product_name = full_product_name[:27] + "..."
-
-            # Calculations
-            mrp_val = item.original_price
-            sold_val = item.price
-            qty_val = item.quantity
-            
-            # Use Order Total Amount (Final Paid Amount) & Coupon
-            # Show ONLY on the first item row for the order to avoid confusion
-            if i == 0:
-                order_total_disp = f"Rs.{order.total_amount:,.2f}"
-                coupon_disp = f"Rs.{order.discount:,.2f}" if order.discount > 0 else "-"
-                order_id_disp = str(order.order_number)
-                date_disp = order.created_at.strftime('%Y-%m-%d')
-                customer_disp = order.user.name
-            else:
-                order_total_disp = "" 
-                coupon_disp = ""
-                order_id_disp = ""
-                date_disp = ""
-                customer_disp = ""
-            
-            # Context rows
-            order_id_disp = str(order.order_number)
-            date_disp = order.created_at.strftime('%Y-%m-%d')
-            customer_disp = order.user.name
-
-            # Item Discount
-            item_discount_val = (mrp_val - sold_val) * qty_val
-            
-            # Formatting
-            mrp_disp = f"Rs.{mrp_val:,.2f}"
-            sold_disp = f"Rs.{sold_val:,.2f}"
-            disc_disp = f"Rs.{item_discount_val:,.2f}"
-            
-            # Highlight discount if exists
-            if item_discount_val > 0:
-                disc_paragraph = Paragraph(f"<font color='green'>{disc_disp}</font>", cell_style)
-            else:
-                disc_paragraph = Paragraph("-", cell_style)
-
-            # Highlight coupon if exists
-            if i == 0 and order.discount > 0:
-                 coupon_paragraph = Paragraph(f"<font color='blue'>{coupon_disp}</font>", cell_style)
-            elif i == 0:
-                 coupon_paragraph = Paragraph("-", cell_style)
-            else:
-                 coupon_paragraph = Paragraph("", cell_style)
-
-            table_data.append([
-                Paragraph(date_disp, cell_style),
-                Paragraph(order_id_disp, cell_style),
-                Paragraph(customer_disp, cell_style),
-                Paragraph(full_product_name, cell_style),
-                Paragraph(mrp_disp, cell_style),
-                Paragraph(sold_disp, cell_style),
-                Paragraph(str(qty_val), cell_style),
-                disc_paragraph,
-                coupon_paragraph,
-                Paragraph(order_total_disp, cell_style), # Order Total
-                Paragraph(item.status, cell_style)
-            ])
-
-    # Define table style
-    table_style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')), # Modern dark header
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.lightgrey),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 3),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 3),
-    ])
-
-    # Add alternating row colors
-    for i in range(1, len(table_data)):
-        if i % 2 == 0:
-            bg_color = colors.HexColor('#f8f9fa')
-        else:
-            bg_color = colors.white
-        table_style.add('BACKGROUND', (0, i), (-1, i), bg_color)
-
-    
-    col_widths = [55, 65, 80, 140, 45, 45, 25, 45, 45, 55, 60]
-    
-    t = Table(table_data, colWidths=col_widths, repeatRows=1)
-    t.setStyle(table_style)
-    elements.append(t)
-    
-    doc.build(elements)
-    return response
 
+@login_required
+@admin_required
+@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+def report_jobs_status(request):
+    """Recent report jobs of this admin, polled by the reports panel"""
+    jobs = [
+        {
+            'id': job.id,
+            'kind': job.get_kind_display(),
+            'filename': job.filename,
+            'status': job.status,
+            'progress': job.progress,
+            'download_url': reverse('download_report_job', args=[job.id]) if job.status == 'Completed' else None,
+        }
+        for job in recent_report_jobs(request.user)
+    ]
+    return JsonResponse({'jobs': jobs})
 
-# Wallet Management Views
 
 @login_required
 @admin_required
-@cache_control(no_cache=True, must_revalidate=True, no_store=True)
-def admin_wallet_transactions(request):
-    """View all wallet transactions across all users"""
-    transactions = WalletTransaction.objects.select_related(
-        'wallet__user', 'order'
-    ).order_by('-created_at')
+def download_report_job(request, job_id):
+    job = get_object_or_404(ReportJob, id=job_id, status='Completed')
+    return FileResponse(
+        get_report_storage().open(job.file_path, 'rb'),
+        as_attachment=True,
+        filename=job.filename,
+        content_type='application/zip' if job.kind == 'invoice_zip' else 'application/pdf',
+    )
 
-    search_query = request.GET.get('search', '').strip()
-    type_filter = request.GET.get('type', '')
-    status_filter = request.GET.get('status', '')
 
+# Wallet Management Views
+
+def _filter_wallet_transactions(transactions, search_query, type_filter, status_filter):
     if search_query:
         transactions = transactions.filter(
             Q(transaction_id__icontains=search_query) |
@@ -1261,20 +933,31 @@ def admin_wallet_transactions(request):
 
     if status_filter:
         transactions = transactions.filter(status=status_filter)
+    return transactions
+
 
-    # Summary stats
-    from django.db.models import Sum
-    total_credits = WalletTransaction.objects.filter(
-        transaction_type='Cr', status='Completed'
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    total_debits = WalletTransaction.objects.filter(
-        transaction_type='Dr', status='Completed'
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    total_transactions = WalletTransaction.objects.count()
+@login_required
+@admin_required
+@cache_control(no_cache=True, must_revalidate=True, no_store=True)
+def admin_wallet_transactions(request):
+    """View all wallet transactions across all users"""
+    search_query = request.GET.get('search', '').strip()
+    type_filter = request.GET.get('type', '')
+    status_filter = request.GET.get('status', '')
+
+    transactions = _filter_wallet_transactions(
+        WalletTransaction.objects.select_related('wallet__user', 'order').order_by('-created_at'),
+        search_query, type_filter, status_filter,
+    )
+
+    # Summary stats, kept up to date by every ledger insert
+    totals = get_ledger_totals()
 
     # Pagination
     page = request.GET.get('page', 1)
     paginator = Paginator(transactions, 10)
+    if not (search_query or type_filter or status_filter):
+        paginator.count = totals['count']  # skip the COUNT(*) over the whole ledger
     try:
         transactions_page = paginator.page(page)
     except PageNotAnInteger:
@@ -1287,14 +970,28 @@ def admin_wallet_transactions(request):
         'search_query': search_query,
         'type_filter': type_filter,
         'status_filter': status_filter,
-        'total_credits': total_credits,
-        'total_debits': total_debits,
-        'total_transactions': total_transactions,
+        'total_credits': totals['credits'],
+        'total_debits': totals['debits'],
+        'total_transactions': totals['count'],
         'first_name': request.user.name.title(),
     }
     return render(request, 'admin_wallet_transactions.html', context)
 
 
+@login_required
+@admin_required
+def export_wallet_transactions(request):
+    """Stream the wallet transactions matching the list's filters as CSV or NDJSON"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_CONTENT_TYPES:
+        fmt = 'csv'
+    transactions = _filter_wallet_transactions(
+        WalletTransaction.objects.all(),
+        request.GET.get('search', '').strip(), request.GET.get('type', ''), request.GET.get('status', ''),
+    )
+    return export_response(fmt, "Walkoria_Wallet_Transactions", WALLET_EXPORT_COLUMNS, wallet_transaction_rows(transactions))
+
+
 @login_required
 @admin_required
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'walkoria.settings')
+    # `manage.py test` runs without the production environment; see test_settings.py
+    default_settings = 'walkoria.test_settings' if sys.argv[1:2] == ['test'] else 'walkoria.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,61 @@
+from decimal import Decimal
+
+from .models import OrderItem
+from .rollup_utils import schedule_sales_rollup
+from .search_utils import index_order_items
+
+
+def load_cart_snapshot(cart):
+    """
+    Load the cart lines once, with their variant and product, so checkout can
+    validate, total and materialize the order without re-querying the cart.
+    """
+    if not cart:
+        return []
+    return list(cart.items.select_related('variant__product'))
+
+
+def get_snapshot_subtotal(cart_items):
+    """Sum of item.price * qty — what Order.subtotal stores (no offer applied)"""
+    return sum((item.price * item.quantity for item in cart_items), Decimal('0'))
+
+
+def materialize_order_items(order, cart_items, total_amount, discount_amount, delivery_charge, item_payment_status):
+    """
+    Create every OrderItem for `order` with a single bulk INSERT.
+
+    Each line's effective (after-offer) unit price is its sale-price weight of
+    the items total after offers, i.e. total_amount + coupon − delivery.
+    """
+    total_sale_all = get_snapshot_subtotal(cart_items) or 1
+    items_total_after_offers = total_amount + discount_amount - (delivery_charge or 0)
+
+    order_items = []
+    for item in cart_items:
+        item_sale_val = item.price * item.quantity
+        eff_subtotal = (item_sale_val / total_sale_all) * items_total_after_offers
+        eff_unit_price = round(eff_subtotal / item.quantity, 2) if item.quantity else item.price
+        order_items.append(OrderItem(
+            order=order,
+            product_variant=item.variant,
+            quantity=item.quantity,
+            price=item.price,
+            item_payment_status=item_payment_status,
+            original_price=item.variant.actual_price,
+            effective_price=eff_unit_price,
+        ))
+    created = OrderItem.objects.bulk_create(order_items)
+    # bulk_create leaves pks unset on MySQL, so index from the saved rows
+    index_order_items(
+        OrderItem.objects.filter(order=order).select_related('order__user', 'product_variant__product')
+    )
+    schedule_sales_rollup([order.created_at])
+    return created
+
+
+def get_snapshot_quantities(cart_items):
+    """Return {variant_id: total quantity} for a set-based stock update"""
+    quantities = {}
+    for item in cart_items:
+        quantities[item.variant_id] = quantities.get(item.variant_id, 0) + item.quantity
+    return quantities
@@ -0,0 +1,121 @@
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse, HttpResponseRedirect
+from django.http.response import HttpResponseRedirectBase
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 64
+
+
+def claim_idempotency_key(user, endpoint, key):
+    """
+    Try to claim (user, endpoint, key). Returns (record, is_new).
+
+    The unique constraint decides the winner when two gunicorn workers get
+    the same key at once; the loser reads the winner's row. An expired row
+    is taken over so the key can be reused after its TTL.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(minutes=settings.IDEMPOTENCY_KEY_TTL_MINUTES)
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(user=user, endpoint=endpoint, key=key, expires_at=expires_at)
+        return record, True
+    except IntegrityError:
+        record = IdempotencyKey.objects.get(user=user, endpoint=endpoint, key=key)
+
+    if record.expires_at <= now:
+        taken = IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).update(
+            status='Processing', response=None, expires_at=expires_at
+        )
+        record.refresh_from_db()
+        if taken:
+            return record, True
+    return record, False
+
+
+def do_not_store(response):
+    """
+    Mark a response as an error outcome whose key must be released, for views
+    that report errors with a redirect and a flash message
+    """
+    response.idempotency_store = False
+    return response
+
+
+def summarize_response(response):
+    """Reduce a view response to something we can store and replay later"""
+    if not getattr(response, 'idempotency_store', True):
+        return None
+    summary = getattr(response, 'idempotency_summary', None)
+    if summary:
+        return summary
+    if isinstance(response, HttpResponseRedirectBase):
+        return {'kind': 'redirect', 'url': response.url}
+    if isinstance(response, JsonResponse):
+        return {'kind': 'json', 'status': response.status_code, 'body': json.loads(response.content)}
+    return None
+
+
+def replay_response(summary):
+    if summary['kind'] == 'redirect':
+        return HttpResponseRedirect(summary['url'])
+    return JsonResponse(summary['body'], status=summary['status'])
+
+
+def run_idempotent(user, endpoint, key, handler, in_progress):
+    """
+    Run `handler()` at most once per (user, endpoint, key) within the TTL.
+
+    Replays return the stored summary of the first response and never call
+    the handler again. Only successes and redirects are stored: client and
+    server errors (out of stock, coupon problems, gateway down), redirects
+    marked with do_not_store and unrecognised responses release the key, so
+    a retry from the same page runs again instead of replaying the error.
+    Requests without a key run as before.
+    """
+    key = (key or '').strip()
+    if not key or not user or not user.is_authenticated:
+        return handler()
+
+    record, is_new = claim_idempotency_key(user, endpoint, key[:MAX_KEY_LENGTH])
+    if not is_new:
+        if record.status == 'Completed' and record.response:
+            logger.info(f"Replaying {endpoint} for idempotency key {record.key}")
+            return replay_response(record.response)
+        return in_progress()
+
+    try:
+        response = handler()
+    except Exception:
+        record.delete()
+        raise
+
+    summary = summarize_response(response)
+    if summary is None or not 200 <= response.status_code < 400:
+        record.delete()
+    else:
+        record.status = 'Completed'
+        record.response = summary
+        record.save(update_fields=['status', 'response'])
+    return response
+
+
+def purge_expired_idempotency_keys(batch_size=1000):
+    """Delete expired keys in small batches"""
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+    return deleted
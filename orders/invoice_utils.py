@@ -6,10 +6,19 @@ from reportlab.lib.units import mm
 from reportlab.lib.enums import TA_RIGHT, TA_CENTER, TA_LEFT
 from io import BytesIO
 from decimal import Decimal
+from functools import lru_cache
+from django.conf import settings
+from django.core.files.base import ContentFile
 from django.utils import timezone
+from django.utils.module_loading import import_string
+import hashlib, logging, os, zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import barcode
 from barcode.writer import ImageWriter
 
+logger = logging.getLogger(__name__)
+
 
 def generate_barcode(invoice_number):
     """Generate a Code128 barcode for the invoice number or fallback"""
@@ -269,3 +278,185 @@ def generate_invoice_pdf(order_item, address):
     doc.build(elements)
     buffer.seek(0)
     return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def get_invoice_storage():
+    """Storage backend for rendered invoices (INVOICE_STORAGE_BACKEND)"""
+    return import_string(settings.INVOICE_STORAGE_BACKEND)(**settings.INVOICE_STORAGE_OPTIONS)
+
+
+def get_invoice_label(order_item):
+    return order_item.invoice_number or f"ORD-{order_item.order.order_number}-{order_item.id}"
+
+
+def invoice_fingerprint(order_item, address):
+    """
+    Hash of every field generate_invoice_pdf prints.
+
+    Used as the stored invoice's version and ETag: when it no longer matches
+    (e.g. a sibling item was cancelled and the order totals moved) the PDF is
+    re-rendered.
+    """
+    order = order_item.order
+    variant = order_item.product_variant
+    parts = [
+        get_invoice_label(order_item), order.order_number, order.created_at.isoformat(),
+        order.user.name, order.user.username,
+        address.full_name, address.address, address.city, address.state,
+        address.pin_code, address.mobile_no,
+        order.payment_method, order.payment_status, order_item.item_payment_status,
+        order.subtotal, order.total_amount, order.discount, order.shipping_cost,
+        order.items.count(),
+        order_item.quantity, order_item.price,
+        variant.product_id if variant else None, variant.product.name if variant else None,
+        variant.color if variant else None, variant.size if variant else None,
+    ]
+    return hashlib.sha256('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+def store_invoice(order_item, address=None, force=False):
+    """
+    Render the item's invoice once and keep it in invoice storage.
+
+    Re-renders only when the fingerprint changed (or `force`). Returns
+    (storage name, fingerprint).
+    """
+    from userpanel.models import Address
+    from .models import OrderItem
+
+    if address is None:
+        address = Address.objects.get(id=order_item.order.shipping_address_id)
+    fingerprint = invoice_fingerprint(order_item, address)
+    storage = get_invoice_storage()
+    if (not force and order_item.invoice_file
+            and order_item.invoice_fingerprint == fingerprint
+            and storage.exists(order_item.invoice_file)):
+        return order_item.invoice_file, fingerprint
+
+    pdf = generate_invoice_pdf(order_item, address)
+    name = f"invoices/{order_item.order.order_number}/invoice_{get_invoice_label(order_item)}.pdf"
+    if storage.exists(name):
+        storage.delete(name)
+    name = storage.save(name, ContentFile(pdf))
+
+    OrderItem.objects.filter(pk=order_item.pk).update(invoice_file=name, invoice_fingerprint=fingerprint)
+    order_item.invoice_file = name
+    order_item.invoice_fingerprint = fingerprint
+    logger.info(f"Rendered invoice {name}")
+    return name, fingerprint
+
+
+def store_invoice_quietly(order_item_id):
+    """on_commit hook: render a newly billed item's invoice, never failing the caller"""
+    from .models import OrderItem
+    try:
+        order_item = OrderItem.objects.select_related(
+            'order__user', 'product_variant__product'
+        ).get(pk=order_item_id)
+        store_invoice(order_item)
+    except Exception as e:
+        logger.error(f"Could not render invoice for item {order_item_id}: {e}")
+
+
+def get_export_items(start_datetime, end_datetime):
+    """Delivered items whose order was placed in the range, oldest first"""
+    from .models import OrderItem
+    return (
+        OrderItem.objects
+        .filter(status='Delivered', order__created_at__range=(start_datetime, end_datetime))
+        .order_by('order__created_at', 'id')
+    )
+
+
+def _init_export_worker():
+    # no-op under fork; spawned workers need the app registry loaded
+    import django
+    django.setup()
+
+
+def _render_for_export(item_id):
+    """Process-pool task: bring the stored invoice up to date and return its bytes"""
+    from .models import OrderItem
+    order_item = OrderItem.objects.select_related(
+        'order__user', 'product_variant__product'
+    ).get(pk=item_id)
+    name, _ = store_invoice(order_item)
+    with get_invoice_storage().open(name, 'rb') as f:
+        return f"invoice_{get_invoice_label(order_item)}.pdf", f.read()
+
+
+class _ZipChunks:
+    """Write-only file object that hands back whatever zipfile wrote since the last call"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def iter_invoice_zip(item_ids, workers=None, progress=None):
+    """
+    Yield a ZIP of the given items' invoices chunk by chunk.
+
+    With workers=0 the invoices are rendered one after another in this
+    process, which is what a web request should use. Otherwise they are
+    rendered across CPU cores by a process pool (export_invoices command and
+    the report worker only). At most 2 × workers PDFs are in flight, and each
+    is written to the archive and dropped as soon as it arrives, so memory
+    stays flat however long the range is. An invoice that fails to render is
+    logged and listed in errors.txt instead of breaking the archive.
+    `progress(done, total)` is called after each item.
+    """
+    from django.db import connections
+    item_ids = list(item_ids)
+    out = _ZipChunks()
+    errors = []
+    done = 0
+
+    def add(archive, item_id, result):
+        nonlocal done
+        try:
+            filename, pdf = result()
+        except Exception as e:
+            logger.error(f"Could not export invoice for item {item_id}: {e}")
+            errors.append(f"Item {item_id}: {e}")
+        else:
+            archive.writestr(filename, pdf)
+        done += 1
+        if progress:
+            progress(done, len(item_ids))
+
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as archive:
+        if workers == 0:
+            for item_id in item_ids:
+                add(archive, item_id, lambda: _render_for_export(item_id))
+                yield out.drain()
+        else:
+            workers = workers or os.cpu_count() or 1
+            # the parent's connection must not be inherited mid-query by forked workers
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_export_worker) as pool:
+                pending = deque()
+                for item_id in item_ids:
+                    pending.append((item_id, pool.submit(_render_for_export, item_id)))
+                    if len(pending) < workers * 2:
+                        continue
+                    ready_id, future = pending.popleft()
+                    add(archive, ready_id, future.result)
+                    yield out.drain()
+                for ready_id, future in pending:
+                    add(archive, ready_id, future.result)
+                    yield out.drain()
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+    yield out.drain()
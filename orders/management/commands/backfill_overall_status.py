@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+from orders.status_utils import refresh_overall_statuses
+
+
+class Command(BaseCommand):
+    help = "Recompute Order.overall_status from item statuses for every order"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+        while True:
+            ids = list(
+                Order.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            refresh_overall_statuses(ids)
+            last_id = ids[-1]
+            total += len(ids)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed overall status for {total} order(s)"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from orders.payment_utils import expire_abandoned_orders
+from orders.stock_utils import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Expire unpaid Razorpay orders whose payment was abandoned and release their stock"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None,
+                            help="Minutes since the order was last touched (default ABANDONED_ORDER_MINUTES)")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(batch_size=options['batch_size'])
+        expired = expire_abandoned_orders(
+            older_than_minutes=options['older_than'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {expired} abandoned order(s), released {released} expired reservation(s)"
+        ))
@@ -0,0 +1,47 @@
+import tempfile
+from datetime import datetime
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.invoice_utils import get_export_items, get_invoice_storage, iter_invoice_zip
+
+
+class Command(BaseCommand):
+    help = "Render every delivered item's invoice for a date range into one ZIP"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="First order date, YYYY-MM-DD")
+        parser.add_argument('--end', required=True, help="Last order date, YYYY-MM-DD")
+        parser.add_argument('--output', help="ZIP path; defaults to exports/ in invoice storage")
+        parser.add_argument('--workers', type=int, default=None, help="Render processes (default: CPU count; 0 renders in this process)")
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date()
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError("Dates must be YYYY-MM-DD")
+
+        start_dt = timezone.make_aware(datetime.combine(start, datetime.min.time()))
+        end_dt = timezone.make_aware(datetime.combine(end, datetime.max.time()))
+        item_ids = list(get_export_items(start_dt, end_dt).values_list('id', flat=True))
+        if not item_ids:
+            self.stdout.write("No delivered items in that range")
+            return
+
+        chunks = iter_invoice_zip(item_ids, workers=options['workers'])
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            location = options['output']
+        else:
+            with tempfile.TemporaryFile() as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                f.seek(0)
+                location = get_invoice_storage().save(f"exports/invoices_{start}_{end}.zip", File(f))
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {len(item_ids)} invoice(s) to {location}"))
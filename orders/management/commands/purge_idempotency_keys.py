@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.idempotency_utils import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = "Delete expired checkout/payment idempotency keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_idempotency_keys(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency key(s)"))
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.models import OrderItem
+from orders.search_utils import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the admin order search terms. Run once with --days 0 to "
+        "backfill every order item, then nightly to pick up renamed customers "
+        "and products."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help="Items ordered in this many days; 0 for all")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Items indexed per transaction")
+
+    def handle(self, *args, **options):
+        items = OrderItem.objects.all()
+        if options['days'] > 0:
+            items = items.filter(order__created_at__gte=timezone.now() - timedelta(days=options['days']))
+        count = rebuild_search_index(items, batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} order item(s)"))
@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.models import Order
+from orders.rollup_utils import rebuild_pending_sales_days, rebuild_sales_range
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily sales rollup. Run with --pending --loop as a worker to "
+        "rebuild the days orders have marked, nightly to reconcile the last few "
+        "days, or with --all once to backfill every day that has orders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help="Rebuild this many days up to today")
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD), default today")
+        parser.add_argument('--all', action='store_true', help="Rebuild from the first order to today")
+        parser.add_argument('--pending', action='store_true', help="Rebuild only the days marked by order changes")
+        parser.add_argument('--loop', action='store_true', help="With --pending, keep polling instead of exiting")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Seconds to wait between passes when idle")
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            return self.rebuild_pending(options)
+
+        today = timezone.localdate()
+        try:
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else today
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+        except ValueError:
+            raise CommandError("Dates must be YYYY-MM-DD")
+
+        if options['all']:
+            first = Order.objects.order_by('created_at').values_list('created_at', flat=True).first()
+            start = timezone.localtime(first).date() if first else today
+        elif start is None:
+            start = end - timedelta(days=max(options['days'], 1) - 1)
+        if start > end:
+            raise CommandError("--start must not be after --end")
+
+        count = rebuild_sales_range(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollup for {count} day(s), {start} to {end}"))
+
+    def rebuild_pending(self, options):
+        while True:
+            count = rebuild_pending_sales_days()
+            if count:
+                self.stdout.write(f"Rebuilt sales rollup for {count} marked day(s)")
+            if not options['loop']:
+                break
+            if not count:
+                time.sleep(options['sleep'])
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 16:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_add_effective_price_to_orderitem'),
+        ('product', '0002_product_is_listed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('Held', 'Held'), ('Confirmed', 'Confirmed'), ('Released', 'Released')], default='Held', max_length=10)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='orders.order')),
+                ('product_variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='product.productvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product_variant', 'status', 'expires_at'], name='reservation_variant_live_idx'), models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx')],
+            },
+        ),
+    ]
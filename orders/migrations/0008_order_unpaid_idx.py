@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-19 16:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupon', '0001_initial'),
+        ('orders', '0007_idempotencykey'),
+        ('userpanel', '0002_alter_address_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_method', 'payment_status', 'updated_at'], name='order_unpaid_idx'),
+        ),
+    ]
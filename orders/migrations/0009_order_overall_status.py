@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-19 16:32
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+
+from orders.models import compute_overall_status
+
+
+def fill_overall_status(apps, schema_editor):
+    """Compute overall_status of the existing orders from their items, in id batches"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    last_id = 0
+    while True:
+        ids = list(Order.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:1000])
+        if not ids:
+            break
+        last_id = ids[-1]
+        statuses = defaultdict(list)
+        for order_id, status in (
+            OrderItem.objects.filter(order_id__in=ids).order_by('id').values_list('order_id', 'status')
+        ):
+            statuses[order_id].append(status)
+        by_status = defaultdict(list)
+        for order_id in ids:
+            by_status[compute_overall_status(statuses[order_id])].append(order_id)
+        for status, order_ids in by_status.items():
+            if status != 'Pending':
+                Order.objects.filter(id__in=order_ids).update(overall_status=status)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coupon', '0001_initial'),
+        ('orders', '0008_order_unpaid_idx'),
+        ('userpanel', '0002_alter_address_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='overall_status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Payment Failed', 'Payment Failed'), ('Processing', 'Processing'), ('On Hold', 'On Hold'), ('Shipped', 'Shipped'), ('On the Way', 'On the Way'), ('Partially Delivered', 'Partially Delivered'), ('Delivered', 'Delivered'), ('Cancelled', 'Cancelled'), ('Return Requested', 'Return Requested'), ('Returned', 'Returned'), ('Refunded', 'Refunded')], default='Pending', max_length=24),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['overall_status', 'created_at'], name='order_overall_status_idx'),
+        ),
+        migrations.RunPython(fill_overall_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_overall_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='invoice_file',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='invoice_fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2 on 2026-10-19 16:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brand', '0001_initial'),
+        ('category', '0001_initial'),
+        ('coupon', '0001_initial'),
+        ('orders', '0010_orderitem_invoice_file'),
+        ('userpanel', '0002_alter_address_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategoryBrandSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('items_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('offer_discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue_order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sales_order_count', models.PositiveIntegerField(default=0)),
+                ('sales_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('coupon_discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('offer_discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('items_sold', models.PositiveIntegerField(default=0)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailycategorybrandsales',
+            name='brand',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='brand.brand'),
+        ),
+        migrations.AddField(
+            model_name='dailycategorybrandsales',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='category.category'),
+        ),
+        migrations.AddIndex(
+            model_name='dailycategorybrandsales',
+            index=models.Index(fields=['date'], name='daily_catbrand_date_idx'),
+        ),
+    ]
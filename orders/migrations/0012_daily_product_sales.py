@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 18:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_daily_sales_rollup'),
+        ('product', '0002_product_is_listed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('items_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='product.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='daily_product_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-19 18:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_daily_product_sales'),
+        ('product', '0002_product_is_listed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItemSearch',
+            fields=[
+                ('order_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_doc', serialize=False, to='orders.orderitem')),
+                ('document', models.CharField(max_length=500)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['status', 'order'], name='order_item_status_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-19 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_order_item_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
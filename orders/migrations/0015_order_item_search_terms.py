@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-19 19:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_search_documents(apps, schema_editor):
+    """Split the existing search documents into one term row per word, in batches"""
+    OrderItemSearch = apps.get_model('orders', 'OrderItemSearch')
+    OrderItemSearchTerm = apps.get_model('orders', 'OrderItemSearchTerm')
+    last_id = 0
+    while True:
+        docs = list(
+            OrderItemSearch.objects.filter(order_item_id__gt=last_id).order_by('order_item_id')
+            .values_list('order_item_id', 'document')[:1000]
+        )
+        if not docs:
+            break
+        last_id = docs[-1][0]
+        OrderItemSearchTerm.objects.bulk_create([
+            OrderItemSearchTerm(order_item_id=item_id, term=term)
+            for item_id, document in docs
+            for term in sorted({word[:100] for word in document.split()})
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_pending_sales_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItemSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('order_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='orders.orderitem')),
+            ],
+        ),
+        migrations.RunPython(copy_search_documents, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='OrderItemSearch',
+        ),
+        migrations.AddIndex(
+            model_name='orderitemsearchterm',
+            index=models.Index(fields=['term', 'order_item'], name='order_item_search_term_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from users.models import CustomUser
 from userpanel.models import Address
@@ -6,13 +6,73 @@ from product.models import ProductVariant
 from coupon.models import Coupon
 
 
+def compute_overall_status(statuses):
+    """Determine overall order status based on all items' statuses"""
+    if not statuses:
+        return 'Pending'
+
+    # Check if all items have Payment_Failed status
+    if all(s == 'Payment_Failed' for s in statuses):
+        return 'Payment Failed'
+
+    # Priority order for determining overall status
+    # If all items have the same status, return that status
+    if len(set(statuses)) == 1:
+        return statuses[0].replace('_', ' ')
+
+    # If any item is Delivered, show as Delivered (or Partially Delivered)
+    if 'Delivered' in statuses:
+        if all(s in ['Delivered', 'Returned', 'Cancelled'] for s in statuses):
+            return 'Delivered'
+        return 'Partially Delivered'
+
+    # If any item is Shipped or On_the_Way
+    if 'Shipped' in statuses or 'On_the_Way' in statuses:
+        return 'Shipped'
+
+    # If any item is Processing
+    if 'Processing' in statuses:
+        return 'Processing'
+
+    # If all items are Cancelled
+    if all(s == 'Cancelled' for s in statuses):
+        return 'Cancelled'
+
+    # If all items are Returned
+    if all(s == 'Returned' for s in statuses):
+        return 'Returned'
+
+    # If any item has Return_Requested
+    if 'Return_Requested' in statuses:
+        return 'Return Requested'
+
+    # Default to Pending
+    return 'Pending'
+
+
 class Order(models.Model):
     PAYMENT_METHOD_CHOICES = [
         ('RP', 'Razor Pay'),
         ('WP', 'Wallet Pay'),
         ('COD', 'Cash on Delivery'),
     ]
-    
+
+    # Values produced by compute_overall_status (display text, as shown in templates)
+    OVERALL_STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Payment Failed', 'Payment Failed'),
+        ('Processing', 'Processing'),
+        ('On Hold', 'On Hold'),
+        ('Shipped', 'Shipped'),
+        ('On the Way', 'On the Way'),
+        ('Partially Delivered', 'Partially Delivered'),
+        ('Delivered', 'Delivered'),
+        ('Cancelled', 'Cancelled'),
+        ('Return Requested', 'Return Requested'),
+        ('Returned', 'Returned'),
+        ('Refunded', 'Refunded'),
+    ]
+
 
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='orders')
     coupon = models.ForeignKey(Coupon, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
@@ -29,56 +89,34 @@ class Order(models.Model):
     razorpay_order_id = models.CharField(max_length=100, blank=True, null=True)
     razorpay_payment_id = models.CharField(max_length=100, blank=True, null=True)
     razorpay_signature = models.CharField(max_length=200, blank=True, null=True)
+    # Denormalized from the items; every path that changes an item status
+    # calls status_utils.refresh_overall_statuses (or apply_item_status)
+    overall_status = models.CharField(choices=OVERALL_STATUS_CHOICES, max_length=24, default='Pending')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['overall_status', 'created_at'], name='order_overall_status_idx'),
+            # abandoned-payment reaper: unpaid online orders by age
+            models.Index(fields=['payment_method', 'payment_status', 'updated_at'], name='order_unpaid_idx'),
+            # period reports and the per-day sales rollup
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
 
     def calculate_total(self):
         self.subtotal = sum(item.price * item.quantity for item in self.items.all())
-        self.save()
+        self.save(update_fields=['subtotal', 'updated_at'])
 
     def get_overall_status(self):
-        """Determine overall order status based on all items' statuses"""
-        items = self.items.all()
-        if not items:
-            return 'Pending'
-        
-        statuses = [item.status for item in items]
-        
-        # Check if all items have Payment_Failed status
-        if all(s == 'Payment_Failed' for s in statuses):
-            return 'Payment Failed'
-        
-        # Priority order for determining overall status
-        # If all items have the same status, return that status
-        if len(set(statuses)) == 1:
-            return statuses[0].replace('_', ' ')
-        
-        # If any item is Delivered, show as Delivered (or Partially Delivered)
-        if 'Delivered' in statuses:
-            if all(s in ['Delivered', 'Returned', 'Cancelled'] for s in statuses):
-                return 'Delivered'
-            return 'Partially Delivered'
-        
-        # If any item is Shipped or On_the_Way
-        if 'Shipped' in statuses or 'On_the_Way' in statuses:
-            return 'Shipped'
-        
-        # If any item is Processing
-        if 'Processing' in statuses:
-            return 'Processing'
-        
-        # If all items are Cancelled
-        if all(s == 'Cancelled' for s in statuses):
-            return 'Cancelled'
-        
-        # If all items are Returned
-        if all(s == 'Returned' for s in statuses):
-            return 'Returned'
-        
-        # If any item has Return_Requested
-        if 'Return_Requested' in statuses:
-            return 'Return Requested'
-        
-        # Default to Pending
-        return 'Pending'
+        """Overall order status, kept in sync with the items' statuses"""
+        return self.overall_status
+
+    def refresh_overall_status(self):
+        """Recompute overall_status from the items and save it if it changed"""
+        status = compute_overall_status(list(self.items.values_list('status', flat=True)))
+        if status != self.overall_status:
+            self.overall_status = status
+            self.save(update_fields=['overall_status'])
+        return status
 
     def __str__(self):
         return f"Order {self.order_number} by {self.user.name}"
@@ -138,12 +176,24 @@ class OrderItem(models.Model):
     invoice_number = models.CharField(max_length=50, blank=True, null=True, unique=True)
     # Effective (after-offer) unit price saved at checkout — survives cancellation zeroing
     effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Rendered invoice in invoice storage, and the fingerprint it was rendered from
+    invoice_file = models.CharField(max_length=255, blank=True, null=True)
+    invoice_fingerprint = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # admin order list status filter and the return requests queue, newest first
+            models.Index(fields=['status', 'order'], name='order_item_status_idx'),
+        ]
 
     def generate_bill(self):
+        """Give a saved Delivered item its invoice number; the PDF is rendered after commit"""
         if self.status == 'Delivered' and not self.is_bill_generated:
             self.invoice_number = f"INV-{self.id}{timezone.now().strftime('%Y%m%d%H%M%S')}"
             self.is_bill_generated = True
-            self.save()
+            OrderItem.objects.filter(pk=self.pk).update(invoice_number=self.invoice_number, is_bill_generated=True)
+            from .invoice_utils import store_invoice_quietly
+            transaction.on_commit(lambda: store_invoice_quietly(self.pk))
 
     def get_effective_price(self):
         """
@@ -197,95 +247,39 @@ class OrderItem(models.Model):
 
     def get_refund_amount(self):
         """
-        Calculate the actual amount credited to wallet on return/cancellation.
-
-        Refund = item's effective (after-offer) value
-                 − proportional coupon share
-                 + delivery refund (ONLY if this is the last active item)
-
-        The order stores:
-          - total_amount  : items_after_offers + shipping - coupon
-          - discount      : coupon amount
-          - shipping_cost : delivery charge
-          - subtotal      : raw sale_price × qty (NO offer applied)
-
-        items_total_after_offers = total_amount + discount - shipping_cost
-
-        ⚠️ IMPORTANT: This method is called AFTER the item's status is already
-        saved as 'Cancelled' in the DB (order_item.save() runs before this call
-        in cancel_product). So we must use exclude(pk=self.pk) — NOT
-        exclude(status='Cancelled') — to determine whether other active items
-        still remain. Using status='Cancelled' would incorrectly exclude the
-        current item and give a wrong (too-high) delivery share in multi-item orders.
+        Calculate the amount that would be credited to wallet on
+        return/cancellation of this item alone.
+
+        See refund_utils.calculate_refunds for the formula; the delivery charge
+        is only included when no other item of the order is still active.
         """
-        from decimal import Decimal
+        from .refund_utils import calculate_refunds
         try:
-            order = self.order
-            shipping = order.shipping_cost or Decimal('0')
-            coupon   = order.discount      or Decimal('0')
-
-            # True items-only total after offers, before coupon & delivery
-            items_total_after_offers = order.total_amount + coupon - shipping
-
-            # This item's sale-price weight
-            item_sale_value = self.price * self.quantity
-            all_sale_value  = order.subtotal  # sum of item.price * qty (no offer)
-
-            # Derive this item's effective (after-offer) value
-            if all_sale_value > 0:
-                item_effective_value = (item_sale_value / all_sale_value) * items_total_after_offers
-            else:
-                item_effective_value = item_sale_value
-
-            # Proportional coupon share for this item
-            if items_total_after_offers > 0 and coupon > 0:
-                coupon_proportion = item_effective_value / items_total_after_offers
-                coupon_share = coupon * coupon_proportion
-            else:
-                coupon_share = Decimal('0')
-
-            # Delivery refund:
-            # Use exclude(pk=self.pk) — NOT exclude(status='Cancelled') — because
-            # this item is ALREADY saved as 'Cancelled' in DB when this runs,
-            # so checking status would always make len=1 in a 2-item order.
-            # We check for other items that are still active (not cancelled/returned).
-            other_active_items = order.items.exclude(pk=self.pk).exclude(
-                status__in=['Cancelled', 'Returned', 'Payment_Failed', 'Refunded']
-            )
-            is_last_active_item = not other_active_items.exists()
-
-            if is_last_active_item:
-                # Truly the last item — refund the full delivery charge too
-                item_delivery_share = shipping
-            else:
-                # Partial cancellation — delivery still needed for remaining items
-                # Do NOT refund delivery
-                item_delivery_share = Decimal('0')
-
-            refund = item_effective_value - coupon_share + item_delivery_share
-            return round(max(refund, Decimal('0')), 2)
+            return calculate_refunds(self.order, [self])[self.id]['amount']
         except Exception:
             return round(self.price * self.quantity, 2)
 
     def get_actual_refund_credited(self):
         """
         Return the actual refund amount that was credited to the wallet for
-        THIS specific item's cancellation/return, by filtering on the item ID
-        embedded in the WalletTransaction description.
+        THIS specific item's cancellation/return.
 
-        All refund transactions now include '- Item #<id>' in their description
-        (set in cancel_product, handle_return_request, and update_order_item),
-        so each item correctly shows its own credit amount in the order timeline.
+        Refund transactions are linked to the item through
+        WalletTransaction.order_item (set by the refund paths and backfilled
+        from the old '- Item #<id>' descriptions). order_detail preloads every
+        item's refund in one query into `refund_credited`.
         """
+        if hasattr(self, 'refund_credited'):
+            return self.refund_credited
         try:
             from wallet.models import WalletTransaction
             txn = (
                 WalletTransaction.objects
                 .filter(
-                    order=self.order,
+                    order_id=self.order_id,
                     transaction_type='Cr',
                     status='Completed',
-                    description__icontains=f'Item #{self.id}'
+                    order_item=self,
                 )
                 .order_by('-created_at')
                 .first()
@@ -296,9 +290,10 @@ class OrderItem(models.Model):
             txn_old = (
                 WalletTransaction.objects
                 .filter(
-                    order=self.order,
+                    order_id=self.order_id,
                     transaction_type='Cr',
                     status='Completed',
+                    order_item__isnull=True,
                     description__icontains='Refund'
                 )
                 .order_by('created_at')   # oldest-first for old orders → closer to per-item
@@ -310,15 +305,16 @@ class OrderItem(models.Model):
 
     def save(self, *args, **kwargs):
         if self.status == 'Delivered':
-            if not self.is_bill_generated:
-                self.generate_bill()
             self.item_payment_status = 'Paid'
         super().save(*args, **kwargs)
+        # after the row is written, so the invoice stored on commit is not overwritten
+        self.generate_bill()
+        # Order.overall_status is not touched here: callers that change the
+        # status call status_utils.refresh_overall_statuses themselves
         if self.item_payment_status == 'Paid':
-            order = self.order
-            if all(item.item_payment_status == 'Paid' for item in order.items.all()):
-                order.payment_status = True
-                order.save()
+            from .status_utils import rollup_payment_status
+            if rollup_payment_status([self.order_id]) and OrderItem.order.is_cached(self):
+                self.order.payment_status = True
 
     def __str__(self):
         return f"{self.product_variant.product.name} - {self.quantity} pcs at ₹{self.price}"
@@ -340,3 +336,156 @@ class ReturnRequest(models.Model):
 
     def __str__(self):
         return f"Return Request for {self.order.product_variant.product.name}"
+
+
+class StockReservation(models.Model):
+    """Stock held for an online order while the shopper is on the payment page"""
+    STATUS_CHOICES = [
+        ('Held', 'Held'),
+        ('Confirmed', 'Confirmed'),
+        ('Released', 'Released'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations')
+    product_variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(choices=STATUS_CHOICES, max_length=10, default='Held')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # available-to-sell: live holds for a set of variants
+            models.Index(fields=['product_variant', 'status', 'expires_at'], name='reservation_variant_live_idx'),
+            # sweeper: held rows past their expiry
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    @property
+    def is_live(self):
+        return self.status == 'Held' and self.expires_at > timezone.now()
+
+    def __str__(self):
+        return f"{self.quantity} x variant {self.product_variant_id} for order {self.order_id} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """Client token that makes a retried order/payment request replay its first result"""
+    STATUS_CHOICES = [
+        ('Processing', 'Processing'),
+        ('Completed', 'Completed'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='idempotency_keys')
+    endpoint = models.CharField(max_length=50)
+    key = models.CharField(max_length=64)
+    status = models.CharField(choices=STATUS_CHOICES, max_length=10, default='Processing')
+    response = models.JSONField(null=True, blank=True)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'endpoint', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key} ({self.status})"
+
+
+class DailySales(models.Model):
+    """
+    Sales totals for the orders created on one (local) day.
+
+    An order change only marks its day in PendingSalesDay; the
+    rebuild_sales_rollup --pending worker rebuilds marked days shortly after,
+    and the nightly rebuild_sales_rollup run reconciles the last week. "revenue" follows the dashboard
+    rule (no cancelled or failed item), "sales" the sales report rule (no
+    cancelled item).
+    """
+    date = models.DateField(unique=True)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue_order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sales_order_count = models.PositiveIntegerField(default=0)
+    sales_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    coupon_discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    offer_discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    refunds = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Sales {self.date}: {self.order_count} order(s), ₹{self.revenue}"
+
+
+class DailyCategoryBrandSales(models.Model):
+    """Per-day item totals for one category/brand pair, rebuilt with DailySales"""
+    date = models.DateField()
+    category = models.ForeignKey('category.Category', on_delete=models.SET_NULL, null=True, related_name='+')
+    brand = models.ForeignKey('brand.Brand', on_delete=models.SET_NULL, null=True, related_name='+')
+    items_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    offer_discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    refunds = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='daily_catbrand_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Sales {self.date} category {self.category_id} brand {self.brand_id}"
+
+
+class DailyProductSales(models.Model):
+    """Per-day sold quantity and revenue of one product, rebuilt with DailySales"""
+    date = models.DateField()
+    product = models.ForeignKey('product.Product', on_delete=models.SET_NULL, null=True, related_name='+')
+    items_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='daily_product_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Sales {self.date} product {self.product_id}"
+
+
+class PendingSalesDay(models.Model):
+    """A day whose DailySales rows are out of date, waiting for rebuild_sales_rollup --pending"""
+    date = models.DateField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pending sales rollup {self.date}"
+
+
+class OrderItemSearchTerm(models.Model):
+    """
+    One search word of an order item for the admin order list: a lowercased
+    word of its order number, customer name or email, or product name. The
+    (term, order_item) index answers a word-prefix match (term LIKE 'abc%')
+    with an index range scan, without joining user and product. Written at
+    checkout; rebuild_order_search refreshes renamed customers and products.
+    """
+    order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'order_item'], name='order_item_search_term_idx'),
+        ]
+
+    def __str__(self):
+        return f"Search term {self.term!r} of item {self.order_item_id}"
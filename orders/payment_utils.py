@@ -0,0 +1,127 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Order, OrderItem, StockReservation
+from .stock_utils import confirm_reservations, release_reservations
+from .status_utils import refresh_overall_statuses
+
+logger = logging.getLogger(__name__)
+
+# Items still waiting on the gateway; anything else has moved on (e.g. cancelled)
+AWAITING_PAYMENT_STATUSES = ['Pending', 'Payment_Failed']
+
+SOLD_OUT_AFTER_PAYMENT_NOTE = (
+    "Paid after the stock hold expired and the item sold out meanwhile. "
+    "Refund required: cancel the item to credit the customer's wallet."
+)
+
+
+def mark_order_paid(order, razorpay_payment_id, razorpay_signature=None):
+    """
+    Apply a captured Razorpay payment to an order.
+
+    Used by both the browser callback and the webhook worker, so it locks the
+    order row and does nothing if the payment was already applied. Items
+    whose stock could not be confirmed (see confirm_reservations) are put
+    On Hold with a refund note instead of Processing.
+    Returns True when this call changed the order.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if order.payment_status:
+            return False
+        order.payment_status = True
+        order.razorpay_payment_id = razorpay_payment_id
+        if razorpay_signature:
+            order.razorpay_signature = razorpay_signature
+        order.save(update_fields=['payment_status', 'razorpay_payment_id', 'razorpay_signature', 'updated_at'])
+
+        awaiting = order.items.filter(status__in=AWAITING_PAYMENT_STATUSES)
+        # items cancelled before the payment landed keep their stock
+        short = confirm_reservations(order, set(awaiting.values_list('product_variant_id', flat=True)))
+        awaiting.exclude(product_variant_id__in=short).update(status='Processing', item_payment_status='Paid')
+        if short:
+            # paid, but the stock went to someone else after the hold lapsed
+            awaiting.filter(product_variant_id__in=short).update(
+                status='On_Hold', item_payment_status='Paid', admin_note=SOLD_OUT_AFTER_PAYMENT_NOTE
+            )
+        refresh_overall_statuses([order.id])
+    logger.info(f"Order {order.order_number} marked paid with payment {razorpay_payment_id}")
+    return True
+
+
+def mark_order_payment_failed(order):
+    """
+    Record a failed/abandoned Razorpay payment and release held stock.
+
+    A failure reported after the order was paid (e.g. for an earlier attempt
+    delivered late by the webhook) is ignored. Returns True when applied.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if order.payment_status:
+            return False
+        order.items.filter(status__in=AWAITING_PAYMENT_STATUSES).update(
+            status='Payment_Failed', item_payment_status='Failed'
+        )
+        refresh_overall_statuses([order.id])
+        release_reservations(order)
+    return True
+
+
+def expire_abandoned_orders(now=None, older_than_minutes=None, batch_size=200):
+    """
+    Mark unpaid Razorpay orders whose payment never completed as Payment_Failed
+    and release their held stock.
+
+    An order counts as abandoned once it has not been touched (retry_payment
+    saves it) for ABANDONED_ORDER_MINUTES and no reservation is still live.
+    Orders are walked by id in batches, each in its own short transaction.
+    Returns the number of orders expired.
+    """
+    now = now or timezone.now()
+    older_than_minutes = older_than_minutes or settings.ABANDONED_ORDER_MINUTES
+    cutoff = now - timedelta(minutes=older_than_minutes)
+
+    abandoned = (
+        Order.objects.filter(payment_method='RP', payment_status=False, updated_at__lte=cutoff)
+        .exclude(id__in=StockReservation.objects.filter(
+            status='Held', expires_at__gt=now,
+        ).values('order_id'))
+    )
+    candidates = abandoned.filter(items__status='Pending').order_by('id')
+
+    expired = 0
+    last_id = 0
+    while True:
+        ids = list(candidates.filter(id__gt=last_id).values_list('id', flat=True).distinct()[:batch_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        with transaction.atomic():
+            # checked again under the lock: a retry_payment since the candidate
+            # query touched the order and took a fresh hold
+            locked = abandoned.filter(id__in=ids)
+            if connection.features.has_select_for_update_skip_locked:
+                locked = locked.select_for_update(skip_locked=True)
+            elif connection.features.has_select_for_update:
+                locked = locked.select_for_update()
+            # orders locked by a verify in flight are picked up next run
+            locked_ids = list(locked.values_list('id', flat=True))
+            if not locked_ids:
+                continue
+            OrderItem.objects.filter(order_id__in=locked_ids, status='Pending').update(
+                status='Payment_Failed', item_payment_status='Failed'
+            )
+            refresh_overall_statuses(locked_ids)
+            StockReservation.objects.filter(order_id__in=locked_ids, status='Held').update(
+                status='Released', updated_at=now
+            )
+        expired += len(locked_ids)
+    if expired:
+        logger.info(f"Expired {expired} abandoned Razorpay order(s)")
+    return expired
@@ -0,0 +1,162 @@
+import time, uuid, logging
+from decimal import Decimal
+
+from django.db import transaction
+
+from wallet.ledger_utils import record_wallet_transactions
+from wallet.models import Wallet, WalletTransaction
+from .models import Order, OrderItem
+from .status_utils import refresh_overall_statuses
+from .stock_utils import restock_order_items
+
+logger = logging.getLogger(__name__)
+
+# Items that no longer need delivery, so they don't keep the shipping charge alive
+INACTIVE_ITEM_STATUSES = ['Cancelled', 'Returned', 'Payment_Failed', 'Refunded']
+
+# Statuses a customer can still cancel from (matches the Cancel Item button)
+CANCELLABLE_ITEM_STATUSES = ['Pending', 'Processing', 'On_Hold']
+
+# Statuses a return can be approved from
+RETURNABLE_ITEM_STATUSES = ['Return_Requested']
+
+
+def calculate_refunds(order, items, all_items=None):
+    """
+    Work out the wallet refund for each of `items` cancelled/returned together.
+
+    Refund = item's effective (after-offer) value
+             − proportional coupon share
+             + delivery charge (only on the last item, if no other item stays active)
+
+    items_total_after_offers = total_amount + discount − shipping_cost, and each
+    item's effective value is its sale-price weight of that. Everything is
+    derived from the order as loaded, so N items cost no extra queries once
+    `all_items` (every item of the order) is known.
+    Returns {item_id: {'amount', 'effective_value', 'coupon_share', 'delivery_share'}}.
+    """
+    if all_items is None:
+        all_items = list(order.items.all())
+
+    shipping = order.shipping_cost or Decimal('0')
+    coupon = order.discount or Decimal('0')
+    items_total_after_offers = order.total_amount + coupon - shipping
+    all_sale_value = order.subtotal  # sum of item.price * qty (no offer)
+
+    batch_ids = {item.id for item in items}
+    others_active = any(
+        item.id not in batch_ids and item.status not in INACTIVE_ITEM_STATUSES
+        for item in all_items
+    )
+
+    refunds = {}
+    for index, item in enumerate(items):
+        item_sale_value = item.price * item.quantity
+        if all_sale_value > 0:
+            effective_value = (item_sale_value / all_sale_value) * items_total_after_offers
+        else:
+            effective_value = item_sale_value
+
+        if items_total_after_offers > 0 and coupon > 0:
+            coupon_share = coupon * (effective_value / items_total_after_offers)
+        else:
+            coupon_share = Decimal('0')
+
+        is_last = index == len(items) - 1
+        delivery_share = shipping if (is_last and not others_active) else Decimal('0')
+
+        refunds[item.id] = {
+            'amount': round(max(effective_value - coupon_share + delivery_share, Decimal('0')), 2),
+            'effective_value': effective_value,
+            'coupon_share': coupon_share,
+            'delivery_share': delivery_share,
+        }
+    return refunds
+
+
+def refund_items(order, items, status, description, txn_prefix, is_paid=None, item_fields=None,
+                 from_statuses=None):
+    """
+    Cancel or return `items` of `order` together and refund them.
+
+    In one transaction: lock the order, drop any item that is no longer in one
+    of `from_statuses` (default: CANCELLABLE_ITEM_STATUSES for a cancel,
+    RETURNABLE_ITEM_STATUSES otherwise), compute every refund from it, move the
+    items to `status` (Refunded when paid, Cancelled otherwise), put their
+    stock back, shrink the order totals once, and credit the wallet with one
+    balance update plus one transaction row per item. The query count does
+    not grow with the number of items. Items are re-read under the lock, so a
+    second cancel of the same item refunds and restocks nothing.
+
+    `description` is formatted with order_number and item_id; `is_paid(item)`
+    decides whether an item's refund goes to the wallet (default: all).
+    Returns {item_id: amount credited}.
+    """
+    item_fields = item_fields or {}
+    if from_statuses is None:
+        from_statuses = CANCELLABLE_ITEM_STATUSES if status == 'Cancelled' else RETURNABLE_ITEM_STATUSES
+    with transaction.atomic():
+        order = Order.objects.select_for_update().select_related('user').get(pk=order.pk)
+        all_items = list(order.items.all())
+        by_id = {item.id: item for item in all_items}
+        items = [
+            by_id[item.id] for item in items
+            if item.id in by_id and by_id[item.id].status in from_statuses
+        ]
+        if not items:
+            return {}
+
+        refunds = calculate_refunds(order, items, all_items)
+        paid_ids = [item.id for item in items if is_paid is None or is_paid(item)]
+        unpaid_ids = [item.id for item in items if item.id not in paid_ids]
+
+        if paid_ids:
+            OrderItem.objects.filter(id__in=paid_ids).update(
+                status=status, item_payment_status='Refunded', **item_fields
+            )
+        if unpaid_ids:
+            OrderItem.objects.filter(id__in=unpaid_ids).update(
+                status=status, item_payment_status='Cancelled', **item_fields
+            )
+        refresh_overall_statuses([order.id])
+        restock_order_items(order, items)
+
+        # Update order totals once for the whole batch
+        order.subtotal = max(order.subtotal - sum(item.price * item.quantity for item in items), Decimal('0'))
+        if order.subtotal <= 0:
+            order.shipping_cost = Decimal('0')
+            order.total_amount = Decimal('0')
+        else:
+            refunded_total = sum(refunds[item.id]['amount'] for item in items)
+            order.total_amount = max(order.total_amount - refunded_total, Decimal('0'))
+        order.save(update_fields=['subtotal', 'shipping_cost', 'total_amount', 'updated_at'])
+
+        credited = {item_id: refunds[item_id]['amount'] for item_id in paid_ids}
+        to_credit = [item for item in items if credited.get(item.id, 0) > 0]
+        if to_credit:
+            wallet, _ = Wallet.objects.get_or_create(user=order.user)
+            stamp = str(int(time.time()))[-6:]
+            record_wallet_transactions([
+                WalletTransaction(
+                    wallet=wallet,
+                    transaction_type='Cr',
+                    amount=credited[item.id],
+                    status='Completed',
+                    description=description.format(order_number=order.order_number, item_id=item.id),
+                    order=order,
+                    order_item=item,
+                    transaction_id=txn_prefix + stamp + uuid.uuid4().hex[:4].upper(),
+                )
+                for item in to_credit
+            ])
+
+    for item in items:
+        item.status = status
+        item.item_payment_status = 'Refunded' if item.id in credited else 'Cancelled'
+        for field, value in item_fields.items():
+            setattr(item, field, value)
+    logger.info(
+        f"Order {order.order_number}: {status} {len(items)} item(s), "
+        f"credited ₹{sum(credited.values(), Decimal('0'))}"
+    )
+    return credited
@@ -0,0 +1,253 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from django.utils import timezone
+
+from wallet.models import WalletTransaction
+from .models import Order, OrderItem, DailySales, DailyCategoryBrandSales, DailyProductSales, PendingSalesDay
+
+logger = logging.getLogger(__name__)
+
+# Items that count as sold (same set as the dashboard's top-N lists)
+SOLD_ITEM_STATUSES = ['Delivered', 'Processing', 'Shipped', 'On_the_Way']
+
+ZERO = Decimal('0')
+
+
+def day_bounds(day):
+    """Aware start/end datetimes of a local calendar day"""
+    start_dt = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    end_dt = timezone.make_aware(datetime.combine(day, datetime.max.time()))
+    return start_dt, end_dt
+
+
+def rebuild_sales_day(day):
+    """
+    Recompute DailySales and its category/brand rows for one day.
+
+    The day's DailySales row is locked first, so two rebuilds of the same day
+    run one after the other and the later one reads everything committed
+    before it. Costs a handful of queries over that day's orders only.
+    """
+    start_dt, end_dt = day_bounds(day)
+    cancelled = OrderItem.objects.filter(order=OuterRef('pk'), status='Cancelled')
+    failed = OrderItem.objects.filter(order=OuterRef('pk'), status='Payment_Failed')
+    sibling_cancelled = OrderItem.objects.filter(order=OuterRef('order'), status='Cancelled')
+
+    with transaction.atomic():
+        DailySales.objects.get_or_create(date=day)
+        row = DailySales.objects.select_for_update().get(date=day)
+
+        counts_as_revenue = ~Exists(cancelled) & ~Exists(failed)
+        totals = Order.objects.filter(created_at__range=(start_dt, end_dt)).aggregate(
+            order_count=Count('id'),
+            revenue_order_count=Count('id', filter=counts_as_revenue),
+            revenue=Sum('total_amount', filter=counts_as_revenue),
+            sales_order_count=Count('id', filter=~Exists(cancelled)),
+            sales_amount=Sum('total_amount', filter=~Exists(cancelled)),
+            coupon_discount=Sum('discount', filter=~Exists(cancelled)),
+        )
+
+        breakdown = defaultdict(lambda: {
+            'items_sold': 0, 'revenue': ZERO, 'offer_discount': ZERO,
+            'cancellations': 0, 'returns': 0, 'refunds': ZERO,
+        })
+        item_groups = (
+            OrderItem.objects.filter(order__created_at__range=(start_dt, end_dt))
+            .values(
+                category_id=F('product_variant__product__category_id'),
+                brand_id=F('product_variant__product__brand_id'),
+            )
+            .annotate(
+                items_sold=Sum('quantity', filter=Q(status__in=SOLD_ITEM_STATUSES)),
+                revenue=Sum(F('price') * F('quantity'), filter=Q(status__in=SOLD_ITEM_STATUSES)),
+                offer_discount=Sum(
+                    (F('original_price') - F('price')) * F('quantity'), filter=~Exists(sibling_cancelled)
+                ),
+                cancellations=Count('id', filter=Q(status='Cancelled')),
+                returns=Count('id', filter=Q(status='Returned')),
+            )
+            .order_by()
+        )
+        for group in item_groups:
+            entry = breakdown[(group['category_id'], group['brand_id'])]
+            for field in ('items_sold', 'revenue', 'offer_discount', 'cancellations', 'returns'):
+                entry[field] += group[field] or 0
+
+        refund_groups = (
+            WalletTransaction.objects.filter(
+                order__created_at__range=(start_dt, end_dt), transaction_type='Cr', status='Completed'
+            )
+            .values(
+                category_id=F('order_item__product_variant__product__category_id'),
+                brand_id=F('order_item__product_variant__product__brand_id'),
+            )
+            .annotate(amount=Sum('amount'))
+            .order_by()
+        )
+        for group in refund_groups:
+            breakdown[(group['category_id'], group['brand_id'])]['refunds'] += group['amount'] or ZERO
+
+        product_groups = (
+            OrderItem.objects.filter(order__created_at__range=(start_dt, end_dt), status__in=SOLD_ITEM_STATUSES)
+            .values(product_id=F('product_variant__product_id'))
+            .annotate(items_sold=Sum('quantity'), revenue=Sum(F('price') * F('quantity')))
+            .order_by()
+        )
+
+        row.order_count = totals['order_count']
+        row.revenue_order_count = totals['revenue_order_count']
+        row.revenue = totals['revenue'] or ZERO
+        row.sales_order_count = totals['sales_order_count']
+        row.sales_amount = totals['sales_amount'] or ZERO
+        row.coupon_discount = totals['coupon_discount'] or ZERO
+        for field in ('items_sold', 'offer_discount', 'cancellations', 'returns', 'refunds'):
+            setattr(row, field, sum((entry[field] for entry in breakdown.values()), 0))
+        row.save()
+
+        DailyCategoryBrandSales.objects.filter(date=day).delete()
+        DailyCategoryBrandSales.objects.bulk_create([
+            DailyCategoryBrandSales(date=day, category_id=category_id, brand_id=brand_id, **entry)
+            for (category_id, brand_id), entry in breakdown.items()
+        ])
+        DailyProductSales.objects.filter(date=day).delete()
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(date=day, **group) for group in product_groups if group['product_id'] is not None
+        ])
+    return row
+
+
+def _mark_pending_days():
+    connection = transaction.get_connection()
+    days = getattr(connection, '_sales_rollup_days', None)
+    if not days:
+        return
+    connection._sales_rollup_days = set()
+    try:
+        PendingSalesDay.objects.bulk_create(
+            [PendingSalesDay(date=day) for day in sorted(days)], ignore_conflicts=True
+        )
+    except Exception as e:
+        # the nightly rebuild_sales_rollup run repairs the day
+        logger.error(f"Could not mark sales days {sorted(days)} for rebuild: {e}")
+
+
+def schedule_sales_rollup(created_ats):
+    """
+    Mark the days of these order timestamps for a rollup rebuild once the
+    current transaction commits. Only a marker row is written, so checkout
+    never aggregates or waits on another day's rebuild; the
+    rebuild_sales_rollup --pending worker picks the days up. Days are
+    collected per connection, so a checkout that touches one order many
+    times marks its day once.
+    """
+    days = {timezone.localtime(created_at).date() for created_at in created_ats if created_at}
+    if not days:
+        return
+    connection = transaction.get_connection()
+    if getattr(connection, '_sales_rollup_days', None) is None:
+        connection._sales_rollup_days = set()
+    connection._sales_rollup_days.update(days)
+    transaction.on_commit(_mark_pending_days)
+
+
+def rebuild_pending_sales_days(limit=100):
+    """
+    Rebuild up to `limit` marked days, oldest first; returns how many.
+
+    Each marker is removed before its day is rebuilt, so an order committed
+    during the rebuild marks the day again rather than being missed.
+    """
+    days = list(PendingSalesDay.objects.order_by('date').values_list('date', flat=True)[:limit])
+    for day in days:
+        PendingSalesDay.objects.filter(date=day).delete()
+        try:
+            rebuild_sales_day(day)
+        except Exception as e:
+            logger.error(f"Sales rollup for {day} failed: {e}")
+            PendingSalesDay.objects.bulk_create([PendingSalesDay(date=day)], ignore_conflicts=True)
+    return len(days)
+
+
+def get_sales_summary(start_date, end_date):
+    """Period totals summed from at most one DailySales row per day"""
+    totals = DailySales.objects.filter(date__range=(start_date, end_date)).aggregate(
+        order_count=Sum('order_count'),
+        revenue_order_count=Sum('revenue_order_count'),
+        revenue=Sum('revenue'),
+        sales_order_count=Sum('sales_order_count'),
+        sales_amount=Sum('sales_amount'),
+        coupon_discount=Sum('coupon_discount'),
+        offer_discount=Sum('offer_discount'),
+        items_sold=Sum('items_sold'),
+        cancellations=Sum('cancellations'),
+        returns=Sum('returns'),
+        refunds=Sum('refunds'),
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def get_daily_sales(start_date, end_date):
+    """DailySales rows for the period, oldest first"""
+    return DailySales.objects.filter(date__range=(start_date, end_date)).order_by('date')
+
+
+def get_category_brand_sales(start_date, end_date):
+    """Period item totals per category and brand, best sellers first"""
+    return (
+        DailyCategoryBrandSales.objects.filter(date__range=(start_date, end_date))
+        .values(cat_name=F('category__name'), brand_name=F('brand__name'))
+        .annotate(
+            items_sold=Sum('items_sold'),
+            revenue=Sum('revenue'),
+            offer_discount=Sum('offer_discount'),
+            cancellations=Sum('cancellations'),
+            returns=Sum('returns'),
+            refunds=Sum('refunds'),
+        )
+        .order_by('-items_sold', 'cat_name', 'brand_name')
+    )
+
+
+def get_top_products(start_date, end_date, limit=10):
+    """Best-selling products of the period by quantity, from DailyProductSales"""
+    return list(
+        DailyProductSales.objects.filter(date__range=(start_date, end_date), product__isnull=False)
+        .values('product_id', product_name=F('product__name'))
+        .annotate(total_qty=Sum('items_sold'), total_rev=Sum('revenue'))
+        .order_by('-total_qty', 'product_name')[:limit]
+    )
+
+
+def _top_from_category_brand(group_field, start_date, end_date, limit):
+    return list(
+        DailyCategoryBrandSales.objects.filter(date__range=(start_date, end_date), items_sold__gt=0)
+        .values(**group_field)
+        .annotate(total_qty=Sum('items_sold'), total_rev=Sum('revenue'))
+        .order_by('-total_qty', *group_field)[:limit]
+    )
+
+
+def get_top_categories(start_date, end_date, limit=10):
+    """Best-selling categories of the period by quantity (keys cat_name, total_qty, total_rev)"""
+    return _top_from_category_brand({'cat_name': F('category__name')}, start_date, end_date, limit)
+
+
+def get_top_brands(start_date, end_date, limit=10):
+    """Best-selling brands of the period by quantity (keys brand_name, total_qty, total_rev)"""
+    return _top_from_category_brand({'brand_name': F('brand__name')}, start_date, end_date, limit)
+
+
+def rebuild_sales_range(start_date, end_date):
+    """Rebuild every day from start_date to end_date; returns the day count"""
+    day = start_date
+    count = 0
+    while day <= end_date:
+        rebuild_sales_day(day)
+        day += timedelta(days=1)
+        count += 1
+    return count
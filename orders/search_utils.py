@@ -0,0 +1,128 @@
+"""
+Admin order list search and paging.
+
+Order numbers and emails are looked up exactly through their unique
+indexes. Anything else matches word prefixes against the indexed term
+column of OrderItemSearchTerm, one index range scan per search term. Pages are keyset-positioned on (order_id, id), newest first,
+so page 500 costs the same as page 1.
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from .models import OrderItem, OrderItemSearchTerm
+
+MAX_SEARCH_TERMS = 5
+
+MAX_TERM_LENGTH = 100  # OrderItemSearchTerm.term
+
+
+def build_search_terms(order_number, customer_name, customer_email, product_name):
+    """The distinct lowercased words an item can be found by"""
+    words = ' '.join(filter(None, [order_number, customer_name, customer_email, product_name])).lower().split()
+    return sorted({word[:MAX_TERM_LENGTH] for word in words})
+
+
+def _terms_for(item):
+    order = item.order
+    product = item.product_variant.product.name if item.product_variant else ''
+    return build_search_terms(order.order_number, order.user.name, order.user.email, product)
+
+
+def index_order_items(items):
+    """
+    Write the search terms of `items` (with order__user and
+    product_variant__product loaded), replacing any existing ones.
+    """
+    items = list(items)
+    if not items:
+        return 0
+    with transaction.atomic():
+        OrderItemSearchTerm.objects.filter(order_item_id__in=[item.id for item in items]).delete()
+        OrderItemSearchTerm.objects.bulk_create([
+            OrderItemSearchTerm(order_item_id=item.id, term=term) for item in items for term in _terms_for(item)
+        ])
+    return len(items)
+
+
+def rebuild_search_index(items=None, batch_size=2000):
+    """Rebuild the search terms of `items` (default every OrderItem) in id batches; returns the count"""
+    items = (items if items is not None else OrderItem.objects.all()).select_related(
+        'order__user', 'product_variant__product'
+    ).order_by('id')
+    count = 0
+    last_id = 0
+    while True:
+        batch = list(items.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return count
+        count += index_order_items(batch)
+        last_id = batch[-1].id
+
+
+def search_order_items(items, query):
+    """
+    Narrow the OrderItem queryset `items` to `query`: an exact order number
+    or customer email when one matches, otherwise items with a term
+    starting with each search word.
+    """
+    query = query.strip()
+    if '@' in query:
+        exact = items.filter(order__user__email__iexact=query)
+        if exact.exists():
+            return exact
+    elif ' ' not in query:
+        exact = items.filter(order__order_number__iexact=query)
+        if exact.exists():
+            return exact
+
+    for word in query.lower().split()[:MAX_SEARCH_TERMS]:
+        matching = OrderItemSearchTerm.objects.filter(term__startswith=word[:MAX_TERM_LENGTH])
+        items = items.filter(id__in=matching.values('order_item_id'))
+    return items
+
+
+def _parse_cursor(cursor):
+    try:
+        order_id, item_id = (int(part) for part in cursor.split('.'))
+        return order_id, item_id
+    except (AttributeError, ValueError):
+        return None
+
+
+def _cursor(item):
+    return f"{item.order_id}.{item.id}"
+
+
+def keyset_page(items, after=None, before=None, size=5):
+    """
+    One page of `items`, newest order first.
+
+    `after` is the cursor of the last row of the page above (next page),
+    `before` the first row of the page below (previous page). Returns the
+    rows and the cursors for the neighbouring pages, None at either end.
+    """
+    after, before = _parse_cursor(after), _parse_cursor(before)
+    if before:
+        order_id, item_id = before
+        rows = list(
+            items.filter(Q(order_id__gt=order_id) | Q(order_id=order_id, id__gt=item_id))
+            .order_by('order_id', 'id')[:size + 1]
+        )
+        has_newer = len(rows) > size
+        rows = rows[:size][::-1]
+        has_older = True
+    else:
+        page = items.order_by('-order_id', '-id')
+        if after:
+            order_id, item_id = after
+            page = page.filter(Q(order_id__lt=order_id) | Q(order_id=order_id, id__lt=item_id))
+        rows = list(page[:size + 1])
+        has_older = len(rows) > size
+        rows = rows[:size]
+        has_newer = after is not None
+
+    return {
+        'items': rows,
+        'newer': _cursor(rows[0]) if rows and has_newer else None,
+        'older': _cursor(rows[-1]) if rows and has_older else None,
+    }
@@ -0,0 +1,116 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import CharField, Exists, OuterRef, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from .invoice_utils import store_invoice_quietly
+from .models import Order, OrderItem, compute_overall_status
+from .rollup_utils import schedule_sales_rollup
+
+# Fulfilment moves that carry no refund/stock side effects, so they can be
+# applied to many items with one UPDATE. Cancel/return go through their views.
+BULK_ITEM_STATUSES = ['Processing', 'On_Hold', 'Shipped', 'On_the_Way', 'Delivered']
+# Items that are still moving through fulfilment and can be bulk-updated
+OPEN_ITEM_STATUSES = ['Pending', 'Processing', 'On_Hold', 'Shipped', 'On_the_Way']
+
+
+def refresh_overall_statuses(order_ids):
+    """
+    Recompute Order.overall_status for the given orders from their items.
+
+    One query reads every item status, then one UPDATE is issued per distinct
+    new value for the orders whose status actually changed. The orders' days
+    are queued for a sales rollup rebuild.
+    Returns {order_id: overall_status}.
+    """
+    order_ids = list(set(order_ids))
+    if not order_ids:
+        return {}
+
+    statuses = defaultdict(list)
+    for order_id, status in (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .order_by('id')
+        .values_list('order_id', 'status')
+    ):
+        statuses[order_id].append(status)
+
+    overall = {order_id: compute_overall_status(statuses[order_id]) for order_id in order_ids}
+
+    current = {}
+    created_ats = []
+    for order_id, status, created_at in Order.objects.filter(id__in=order_ids).values_list(
+        'id', 'overall_status', 'created_at'
+    ):
+        current[order_id] = status
+        created_ats.append(created_at)
+    changed = defaultdict(list)
+    for order_id, status in overall.items():
+        if order_id in current and current[order_id] != status:
+            changed[status].append(order_id)
+    for status, ids in changed.items():
+        Order.objects.filter(id__in=ids).update(overall_status=status)
+    # every item/total change passes through here, so the sales rollup of
+    # the orders' days is refreshed after commit
+    schedule_sales_rollup(created_ats)
+    return overall
+
+
+def rollup_payment_status(order_ids):
+    """
+    Mark orders paid once none of their items is unpaid.
+
+    A single UPDATE guarded by NOT EXISTS, touching only orders whose
+    payment_status actually flips. Returns the number of orders flipped.
+    """
+    unpaid_items = OrderItem.objects.filter(order=OuterRef('pk')).exclude(item_payment_status='Paid')
+    return (
+        Order.objects.filter(id__in=list(order_ids), payment_status=False)
+        .exclude(Exists(unpaid_items))
+        .update(payment_status=True, updated_at=timezone.now())
+    )
+
+
+def apply_item_status(items, status, admin_note=None):
+    """
+    Move many order items to `status` at once.
+
+    Mirrors OrderItem.save for each item (Delivered items become Paid and get
+    an invoice number) but with set-based UPDATEs, then refreshes the
+    overall/payment status of every affected order.
+    Returns the list of affected order ids.
+    """
+    if status not in BULK_ITEM_STATUSES:
+        raise ValueError(f"{status} cannot be applied in bulk")
+
+    rows = list(items.values_list('id', 'order_id'))
+    if not rows:
+        return []
+    item_ids = [item_id for item_id, _ in rows]
+    order_ids = list({order_id for _, order_id in rows})
+
+    fields = {'status': status}
+    if admin_note is not None:
+        fields['admin_note'] = admin_note
+    if status == 'Delivered':
+        fields['item_payment_status'] = 'Paid'
+
+    with transaction.atomic():
+        OrderItem.objects.filter(id__in=item_ids).update(**fields)
+        if status == 'Delivered':
+            # same invoice number format as OrderItem.generate_bill
+            stamp = timezone.now().strftime('%Y%m%d%H%M%S')
+            billed_ids = list(
+                OrderItem.objects.filter(id__in=item_ids, is_bill_generated=False).values_list('id', flat=True)
+            )
+            for item_id in billed_ids:
+                transaction.on_commit(lambda item_id=item_id: store_invoice_quietly(item_id))
+            OrderItem.objects.filter(id__in=billed_ids).update(
+                invoice_number=Concat(Value('INV-'), Cast('id', CharField()), Value(stamp)),
+                is_bill_generated=True,
+            )
+        refresh_overall_statuses(order_ids)
+        rollup_payment_status(order_ids)
+    return order_ids
@@ -0,0 +1,304 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum, F, Value, Case, When, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from product.models import Product, ProductVariant
+from .models import StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    """Some variants cannot cover the quantity asked for"""
+
+    def __init__(self, shortages):
+        # {variant_id: quantity still available}
+        self.shortages = shortages
+        super().__init__(f"Not enough stock for variant(s) {sorted(shortages)}")
+
+
+def live_reservations(now=None):
+    """Reservations that still hold stock: Held and not yet expired"""
+    return StockReservation.objects.filter(status='Held', expires_at__gt=now or timezone.now())
+
+
+def get_reserved_quantities(variant_ids, exclude_order=None):
+    """Return {variant_id: quantity held by live reservations} in one grouped query"""
+    qs = live_reservations().filter(product_variant_id__in=list(variant_ids))
+    if exclude_order is not None:
+        qs = qs.exclude(order=exclude_order)
+    return dict(
+        qs.values('product_variant_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_variant_id', 'total')
+    )
+
+
+def get_available_quantities(variants, exclude_order=None):
+    """
+    Available-to-sell per variant = on-hand quantity − live reservations.
+
+    `variants` are already-loaded ProductVariant rows, so this costs a single
+    query regardless of how many variants are passed.
+    """
+    variants = list(variants)
+    reserved = get_reserved_quantities({v.id for v in variants}, exclude_order=exclude_order)
+    return {v.id: max(v.quantity - reserved.get(v.id, 0), 0) for v in variants}
+
+
+def get_available_quantity(variant, exclude_order=None):
+    return get_available_quantities([variant], exclude_order=exclude_order)[variant.id]
+
+
+def sync_product_totals(product_ids):
+    """Recompute Product.total_quantity for the given products in one UPDATE"""
+    variant_totals = (
+        ProductVariant.objects.filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    Product.objects.filter(id__in=list(product_ids)).update(
+        total_quantity=Coalesce(Subquery(variant_totals, output_field=IntegerField()), Value(0))
+    )
+
+
+def _apply_stock_delta(quantities, sign):
+    """
+    Add (sign=1) or subtract (sign=-1) {variant_id: qty} from on-hand stock
+    with a single set-based UPDATE, then resync the parent product totals.
+    Subtraction is clamped at zero. quantity is UNSIGNED on MySQL, where
+    quantity - qty below zero is an error rather than a negative value, so
+    the subtraction only runs on rows that can cover it.
+    """
+    quantities = {vid: qty for vid, qty in quantities.items() if vid and qty}
+    if not quantities:
+        return
+    if sign > 0:
+        new_quantity = F('quantity') + Case(
+            *[When(id=vid, then=Value(qty)) for vid, qty in quantities.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    else:
+        new_quantity = Case(
+            *[When(id=vid, quantity__gte=qty, then=F('quantity') - Value(qty)) for vid, qty in quantities.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    ProductVariant.objects.filter(id__in=quantities.keys()).update(quantity=new_quantity)
+    sync_product_totals(
+        ProductVariant.objects.filter(id__in=quantities.keys()).values_list('product_id', flat=True)
+    )
+
+
+def decrement_stock(quantities):
+    _apply_stock_delta(quantities, -1)
+
+
+def restore_stock(quantities):
+    _apply_stock_delta(quantities, 1)
+
+
+def lock_on_hand_quantities(variant_ids):
+    """
+    Lock the variants' rows, in id order so concurrent callers cannot
+    deadlock, and return {variant_id: on-hand quantity}. Whoever holds the
+    locks decides alone what is still available until the transaction ends.
+    """
+    return dict(
+        ProductVariant.objects.select_for_update()
+        .filter(id__in=list(variant_ids))
+        .order_by('id')
+        .values_list('id', 'quantity')
+    )
+
+
+def _check_available(quantities, exclude_order=None):
+    """Raise InsufficientStock unless every {variant_id: qty} is available; call under lock"""
+    on_hand = lock_on_hand_quantities(quantities.keys())
+    reserved = get_reserved_quantities(quantities.keys(), exclude_order=exclude_order)
+    shortages = {}
+    for variant_id, quantity in quantities.items():
+        available = max(on_hand.get(variant_id, 0) - reserved.get(variant_id, 0), 0)
+        if quantity > available:
+            shortages[variant_id] = available
+    if shortages:
+        raise InsufficientStock(shortages)
+
+
+def sell_stock(quantities):
+    """
+    Take {variant_id: qty} off on-hand stock for an order paid or placed at
+    checkout (COD, wallet). Checks availability, live reservations included,
+    under the variants' row locks and raises InsufficientStock, having
+    changed nothing, when another shopper got there first.
+    """
+    quantities = {vid: qty for vid, qty in quantities.items() if vid and qty}
+    with transaction.atomic():
+        _check_available(quantities)
+        decrement_stock(quantities)
+
+
+def reserve_stock(order, lines, ttl_minutes=None):
+    """
+    Hold stock for an unpaid online order.
+
+    `lines` is an iterable of (variant, quantity). An order keeps one
+    reservation row per variant, so a payment retry re-arms the existing
+    rows with a fresh expiry instead of stacking new ones. Availability is
+    checked under the variants' row locks, so two shoppers cannot both hold
+    the last unit; raises InsufficientStock, having held nothing.
+    """
+    ttl = ttl_minutes if ttl_minutes is not None else settings.STOCK_RESERVATION_TTL_MINUTES
+    expires_at = timezone.now() + timedelta(minutes=ttl)
+
+    wanted = {}
+    for variant, quantity in lines:
+        wanted[variant.id] = wanted.get(variant.id, 0) + quantity
+
+    with transaction.atomic():
+        _check_available(wanted, exclude_order=order)
+        existing = {
+            r.product_variant_id: r
+            for r in order.reservations.select_for_update().exclude(status='Confirmed')
+        }
+        to_update, to_create = [], []
+        for variant_id, quantity in wanted.items():
+            reservation = existing.get(variant_id)
+            if reservation:
+                reservation.quantity = quantity
+                reservation.status = 'Held'
+                reservation.expires_at = expires_at
+                reservation.updated_at = timezone.now()
+                to_update.append(reservation)
+            else:
+                to_create.append(StockReservation(
+                    order=order,
+                    product_variant_id=variant_id,
+                    quantity=quantity,
+                    expires_at=expires_at,
+                ))
+        if to_update:
+            StockReservation.objects.bulk_update(to_update, ['quantity', 'status', 'expires_at', 'updated_at'])
+        if to_create:
+            StockReservation.objects.bulk_create(to_create)
+    return expires_at
+
+
+def confirm_reservations(order, variant_ids=None):
+    """
+    Turn an order's reservations into real stock decrements after a verified
+    payment. Safe to call more than once: confirmed rows are skipped.
+
+    Only reservations of `variant_ids` (the variants whose items are still
+    waiting for this payment; default all) are confirmed. Any other
+    unconfirmed reservation belongs to an item cancelled meanwhile, so it is
+    released rather than sold.
+
+    A reservation that lapsed (released, or expired and not yet swept)
+    before the payment arrived no longer holds anything, so it is only
+    confirmed if the stock is still available to this order. Otherwise it
+    is released and nothing is decremented, instead of overselling.
+    Returns the set of variant ids that could not be confirmed; the caller
+    flags those items for a refund.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # variants first, in the same order as reserve_stock and sell_stock
+        held_ids = set(order.reservations.exclude(status='Confirmed').values_list('product_variant_id', flat=True))
+        on_hand = lock_on_hand_quantities(held_ids)
+        reservations = list(order.reservations.select_for_update().exclude(status='Confirmed'))
+        if variant_ids is not None:
+            dropped = [r.id for r in reservations if r.product_variant_id not in variant_ids]
+            if dropped:
+                StockReservation.objects.filter(id__in=dropped, status='Held').update(status='Released', updated_at=now)
+            reservations = [r for r in reservations if r.product_variant_id in variant_ids]
+        if not reservations:
+            return set()
+
+        quantities, lapsed = {}, set()
+        for r in reservations:
+            quantities[r.product_variant_id] = quantities.get(r.product_variant_id, 0) + r.quantity
+            if r.status == 'Released' or r.expires_at <= now:
+                lapsed.add(r.product_variant_id)
+        reserved = get_reserved_quantities(lapsed, exclude_order=order)
+
+        short = set()
+        for variant_id, quantity in quantities.items():
+            available = on_hand.get(variant_id, 0)
+            if variant_id in lapsed:
+                available -= reserved.get(variant_id, 0)
+            if quantity > available:
+                short.add(variant_id)
+
+        confirmed = [r.id for r in reservations if r.product_variant_id not in short]
+        decrement_stock({vid: qty for vid, qty in quantities.items() if vid not in short})
+        StockReservation.objects.filter(id__in=confirmed).update(status='Confirmed', updated_at=now)
+        StockReservation.objects.filter(
+            id__in=[r.id for r in reservations if r.product_variant_id in short]
+        ).update(status='Released', updated_at=now)
+    if short:
+        logger.error(
+            f"Order {order.order_number} was paid after its stock hold lapsed; "
+            f"variant(s) {sorted(short)} sold out and need a refund"
+        )
+    return short
+
+
+def release_reservations(order):
+    """Give back stock held for an order whose payment failed or was abandoned"""
+    return order.reservations.filter(status='Held').update(status='Released', updated_at=timezone.now())
+
+
+def restock_order_items(order, items):
+    """
+    Put cancelled/returned items' quantities back, for any number of items.
+
+    If an item's stock was only ever reserved (unpaid online order), the
+    reservation is released instead so on-hand stock is not inflated.
+    """
+    quantities = {}
+    for item in items:
+        if item.product_variant_id:
+            quantities[item.product_variant_id] = quantities.get(item.product_variant_id, 0) + item.quantity
+    if not quantities:
+        return
+    reserved = set(
+        order.reservations.filter(product_variant_id__in=quantities.keys())
+        .exclude(status='Confirmed')
+        .values_list('product_variant_id', flat=True)
+    )
+    if reserved:
+        order.reservations.filter(product_variant_id__in=reserved, status='Held').update(
+            status='Released', updated_at=timezone.now()
+        )
+    restore_stock({vid: qty for vid, qty in quantities.items() if vid not in reserved})
+
+
+def restock_order_item(order_item):
+    """Put a single cancelled item's quantity back (see restock_order_items)"""
+    restock_order_items(order_item.order, [order_item])
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """Sweep Held reservations past their expiry to Released, in small batches"""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(status='Held', expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        released += StockReservation.objects.filter(id__in=ids, status='Held').update(
+            status='Released', updated_at=now
+        )
+    return released
@@ -0,0 +1,75 @@
+import uuid
+from decimal import Decimal
+
+from brand.models import Brand
+from cart.models import Cart, CartItem
+from category.models import Category
+from product.models import Product, ProductVariant
+from userpanel.models import Address
+from users.models import CustomUser
+from orders.models import Order, OrderItem
+from orders.status_utils import refresh_overall_statuses
+
+
+def make_user(email=None):
+    email = email or f"{uuid.uuid4().hex[:8]}@example.com"
+    return CustomUser.objects.create_user(username=email, email=email, password=None, name='Order Test')
+
+
+def make_variant(quantity=5, price='100.00'):
+    suffix = uuid.uuid4().hex[:6]
+    product = Product.objects.create(
+        name=f"Test shoe {suffix}",
+        description='Test shoe',
+        category=Category.objects.create(name=f"Category {suffix}"),
+        brand=Brand.objects.create(name=f"Brand {suffix}"),
+    )
+    return ProductVariant.objects.create(
+        product=product, color='Black', size='6', quantity=quantity,
+        actual_price=Decimal(price), sale_price=Decimal(price),
+    )
+
+
+def make_address(user):
+    return Address.objects.create(
+        user_id=user, full_name='Order Test', mobile_no='9876543210', pin_code='682001',
+        address='1 Test Street', street='Test Street', city='Kochi', state='KL',
+    )
+
+
+def make_cart(user, lines):
+    """The user's cart holding (variant, quantity) lines"""
+    cart = Cart.objects.create(user=user)
+    for variant, quantity in lines:
+        CartItem.objects.create(
+            cart=cart, product=variant.product, variant=variant, quantity=quantity,
+            price=variant.sale_price, total_price=0,
+        )
+    cart.refresh_from_db()
+    return cart
+
+
+def make_order(user, lines, payment_method='COD', status='Pending', item_payment_status='Unpaid',
+               payment_status=False, shipping_cost='0'):
+    """An order with one item per (variant, quantity) line, priced from the variants"""
+    subtotal = sum((variant.sale_price * quantity for variant, quantity in lines), Decimal('0'))
+    shipping = Decimal(shipping_cost)
+    order = Order.objects.create(
+        user=user,
+        order_number=uuid.uuid4().hex[:12].upper(),
+        payment_method=payment_method,
+        payment_status=payment_status,
+        subtotal=subtotal,
+        total_amount=subtotal + shipping,
+        shipping_cost=shipping,
+        shipping_address=make_address(user),
+    )
+    for variant, quantity in lines:
+        OrderItem.objects.create(
+            order=order, product_variant=variant, quantity=quantity,
+            price=variant.sale_price, original_price=variant.actual_price, effective_price=variant.sale_price,
+            status=status, item_payment_status=item_payment_status,
+        )
+    refresh_overall_statuses([order.id])
+    order.refresh_from_db()
+    return order
@@ -0,0 +1,164 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.http import JsonResponse, HttpResponseRedirect
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.idempotency_utils import claim_idempotency_key, do_not_store, run_idempotent
+from orders.models import IdempotencyKey, Order
+from orders.payment_utils import mark_order_paid
+from product.models import ProductVariant
+from wallet.mock_gateway import sign_payment
+from .helpers import make_address, make_cart, make_order, make_user, make_variant
+
+
+class CountingHandler:
+    """A view stand-in returning the given responses in turn"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.responses[min(self.calls, len(self.responses)) - 1]
+
+
+def in_progress():
+    return JsonResponse({'error': 'in progress'}, status=409)
+
+
+class RunIdempotentTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user()
+
+    def run_twice(self, handler, key='k1'):
+        first = run_idempotent(self.user, 'test', key, handler, in_progress)
+        second = run_idempotent(self.user, 'test', key, handler, in_progress)
+        return first, second
+
+    def test_success_is_stored_and_replayed(self):
+        handler = CountingHandler(JsonResponse({'order_id': 7}))
+        first, second = self.run_twice(handler)
+        self.assertEqual(handler.calls, 1)
+        self.assertEqual(second.status_code, 200)
+        self.assertJSONEqual(second.content, {'order_id': 7})
+        self.assertEqual(IdempotencyKey.objects.get().status, 'Completed')
+
+    def test_redirect_is_stored_and_replayed(self):
+        handler = CountingHandler(HttpResponseRedirect('/orders/success/1/'))
+        first, second = self.run_twice(handler)
+        self.assertEqual(handler.calls, 1)
+        self.assertEqual(second['Location'], '/orders/success/1/')
+
+    def test_redirect_marked_do_not_store_releases_the_key(self):
+        handler = CountingHandler(do_not_store(HttpResponseRedirect('/cart/')), HttpResponseRedirect('/orders/success/1/'))
+        first, second = self.run_twice(handler)
+        self.assertEqual(handler.calls, 2)
+        self.assertEqual(second['Location'], '/orders/success/1/')
+
+    def test_client_error_releases_the_key(self):
+        handler = CountingHandler(
+            JsonResponse({'error': 'Not enough stock'}, status=400),
+            JsonResponse({'order_id': 8}),
+        )
+        first, second = self.run_twice(handler)
+        self.assertEqual(first.status_code, 400)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(handler.calls, 2)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'Completed')
+
+    def test_server_error_and_exception_release_the_key(self):
+        handler = CountingHandler(JsonResponse({'error': 'gateway'}, status=503))
+        run_idempotent(self.user, 'test', 'k1', handler, in_progress)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        def boom():
+            raise RuntimeError('boom')
+        with self.assertRaises(RuntimeError):
+            run_idempotent(self.user, 'test', 'k1', boom, in_progress)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_concurrent_duplicate_gets_in_progress(self):
+        claim_idempotency_key(self.user, 'test', 'k1')
+        handler = CountingHandler(JsonResponse({}))
+        response = run_idempotent(self.user, 'test', 'k1', handler, in_progress)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(handler.calls, 0)
+
+    def test_expired_key_runs_again(self):
+        handler = CountingHandler(JsonResponse({'n': 1}), JsonResponse({'n': 2}))
+        run_idempotent(self.user, 'test', 'k1', handler, in_progress)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = run_idempotent(self.user, 'test', 'k1', handler, in_progress)
+        self.assertJSONEqual(response.content, {'n': 2})
+
+    def test_requests_without_a_key_are_not_tracked(self):
+        handler = CountingHandler(JsonResponse({}))
+        self.run_twice(handler, key='')
+        self.assertEqual(handler.calls, 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class VerifyPaymentIdempotencyTests(TestCase):
+
+    def test_duplicate_callback_while_verifying_is_not_told_it_succeeded(self):
+        user = make_user()
+        order = make_order(user, [(make_variant(), 1)], 'RP', item_payment_status='Pending')
+        order.razorpay_order_id = 'order_test'
+        order.save(update_fields=['razorpay_order_id'])
+        claim_idempotency_key(user, 'verify_razorpay_payment', 'pay_test')
+
+        response = self.client.post(reverse('verify_razorpay_payment'), {
+            'razorpay_order_id': 'order_test', 'razorpay_payment_id': 'pay_test', 'razorpay_signature': 'sig',
+        })
+        self.assertEqual(response.status_code, 202)
+        self.assertContains(response, 'still confirming your payment', status_code=202)
+        order.refresh_from_db()
+        self.assertFalse(order.payment_status)
+
+
+class CheckoutIdempotencyTests(TestCase):
+
+    def test_failed_checkout_runs_again_with_the_same_key(self):
+        user = make_user()
+        variant = make_variant(quantity=1)
+        make_cart(user, [(variant, 2)])
+        post = {'address_id': make_address(user).id, 'payment_method': 'COD', 'idempotency_key': 'k1'}
+        self.client.force_login(user)
+
+        response = self.client.post(reverse('checkout'), post)
+        self.assertRedirects(response, reverse('view_cart'), fetch_redirect_response=False)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        ProductVariant.objects.filter(pk=variant.pk).update(quantity=5)
+        self.client.post(reverse('checkout'), post)
+        self.assertEqual(Order.objects.filter(user=user).count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'Completed')
+
+
+class VerifyPaymentRetryTests(TestCase):
+
+    def test_verify_that_raised_runs_again_on_the_retried_callback(self):
+        user = make_user()
+        order = make_order(user, [(make_variant(), 1)], 'RP', item_payment_status='Pending')
+        Order.objects.filter(pk=order.pk).update(razorpay_order_id='order_retry')
+        post = {
+            'razorpay_order_id': 'order_retry', 'razorpay_payment_id': 'pay_retry',
+            'razorpay_signature': sign_payment('order_retry', 'pay_retry'),
+        }
+
+        with mock.patch('orders.views.mark_order_paid', side_effect=RuntimeError('db went away')), \
+                self.assertLogs('orders.views', 'ERROR'):
+            response = self.client.post(reverse('verify_razorpay_payment'), post)
+        self.assertRedirects(response, reverse('order_failure', args=[order.id]), fetch_redirect_response=False)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        with mock.patch('orders.views.mark_order_paid', wraps=mark_order_paid) as paid:
+            response = self.client.post(reverse('verify_razorpay_payment'), post)
+        paid.assert_called_once()
+        self.assertRedirects(response, reverse('order_success', args=[order.id]), fetch_redirect_response=False)
+        self.assertTrue(Order.objects.get(pk=order.pk).payment_status)
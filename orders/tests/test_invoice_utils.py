@@ -0,0 +1,75 @@
+import io
+import zipfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from admin.job_utils import process_report_jobs
+from admin.models import ReportJob
+from orders.invoice_utils import get_invoice_storage, iter_invoice_zip
+from orders.status_utils import apply_item_status
+from .helpers import make_order, make_user, make_variant
+
+
+class InvoiceZipTests(TestCase):
+
+    def setUp(self):
+        self.order = make_order(make_user(), [(make_variant(), 1), (make_variant(), 1)])
+        apply_item_status(self.order.items.all(), 'Delivered')
+        self.item_ids = list(self.order.items.order_by('id').values_list('id', flat=True))
+
+    def read_zip(self, chunks):
+        return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+    def test_inline_export_has_one_pdf_per_item(self):
+        seen = []
+        archive = self.read_zip(iter_invoice_zip(self.item_ids, workers=0, progress=lambda *args: seen.append(args)))
+        self.assertEqual(len(archive.namelist()), 2)
+        self.assertTrue(all(name.endswith('.pdf') for name in archive.namelist()))
+        self.assertEqual(seen, [(1, 2), (2, 2)])
+
+    def test_failed_item_is_listed_in_errors_txt(self):
+        missing_id = max(self.item_ids) + 100
+        with self.assertLogs('orders.invoice_utils', 'ERROR'):
+            archive = self.read_zip(iter_invoice_zip([self.item_ids[0], missing_id], workers=0))
+        pdfs = [name for name in archive.namelist() if name.endswith('.pdf')]
+        self.assertEqual(len(pdfs), 1)
+        self.assertIn(f"Item {missing_id}:", archive.read('errors.txt').decode())
+
+
+class ExportInvoicesViewTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user()
+        self.admin.is_superuser = True
+        self.admin.save()
+        order = make_order(make_user(), [(make_variant(), 1), (make_variant(), 1)])
+        apply_item_status(order.items.all(), 'Delivered')
+        today = timezone.localdate().isoformat()
+        self.client.force_login(self.admin)
+        self.url = f"{reverse('export_invoices')}?start_date={today}&end_date={today}"
+
+    def test_short_range_is_streamed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 2)
+        self.assertFalse(ReportJob.objects.exists())
+
+    @override_settings(INVOICE_EXPORT_INLINE_LIMIT=1)
+    def test_long_range_is_queued_for_the_worker(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        job = ReportJob.objects.get()
+        self.assertEqual((job.kind, job.status), ('invoice_zip', 'Pending'))
+
+        # the worker renders with a process pool; keep the test in this process
+        inline = lambda item_ids, **kwargs: iter_invoice_zip(item_ids, workers=0, **kwargs)
+        with mock.patch('admin.job_utils.iter_invoice_zip', inline):
+            self.assertEqual(process_report_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Completed')
+        with get_invoice_storage().open(job.file_path, 'rb') as f:
+            self.assertEqual(len(zipfile.ZipFile(f).namelist()), 2)
@@ -0,0 +1,90 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from orders.payment_utils import expire_abandoned_orders, mark_order_paid
+from orders.refund_utils import refund_items
+from orders.stock_utils import get_available_quantity, reserve_stock
+from product.models import ProductVariant
+from .helpers import make_order, make_user, make_variant
+
+
+class ExpireAbandonedOrdersTests(TestCase):
+
+    def setUp(self):
+        self.variant = make_variant(quantity=2)
+        self.order = make_order(make_user(), [(self.variant, 2)], 'RP', item_payment_status='Pending')
+        reserve_stock(self.order, [(self.variant, 2)])
+
+    def age(self, order, minutes):
+        Order.objects.filter(pk=order.pk).update(updated_at=timezone.now() - timedelta(minutes=minutes))
+
+    def test_stale_unpaid_order_is_failed_and_its_stock_released(self):
+        self.age(self.order, 60)
+        self.order.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(expire_abandoned_orders(older_than_minutes=30), 1)
+
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(list(order.items.values_list('status', 'item_payment_status')), [('Payment_Failed', 'Failed')])
+        self.assertEqual(order.overall_status, 'Payment Failed')
+        self.assertEqual(order.reservations.get().status, 'Released')
+        self.assertEqual(get_available_quantity(self.variant), 2)
+        self.assertEqual(expire_abandoned_orders(older_than_minutes=30), 0)
+
+    def test_order_with_a_live_hold_is_left_alone(self):
+        self.age(self.order, 60)
+        self.assertEqual(expire_abandoned_orders(older_than_minutes=30), 0)
+        self.assertEqual(list(self.order.items.values_list('status', flat=True)), ['Pending'])
+
+    def test_recent_and_paid_orders_are_left_alone(self):
+        self.order.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(expire_abandoned_orders(older_than_minutes=30), 0)
+
+        mark_order_paid(self.order, 'pay_test')
+        self.age(self.order, 60)
+        self.assertEqual(expire_abandoned_orders(older_than_minutes=30), 0)
+        self.assertEqual(list(self.order.items.values_list('status', flat=True)), ['Processing'])
+
+    def test_retry_between_candidate_query_and_lock_is_left_alone(self):
+        self.age(self.order, 60)
+        self.order.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        real_atomic = transaction.atomic
+        retried = []
+
+        def retry_then_atomic(*args, **kwargs):
+            # runs after the candidate ids were read, before the locked re-query
+            if not retried:
+                retried.append(True)
+                Order.objects.filter(pk=self.order.pk).update(updated_at=timezone.now())
+                reserve_stock(self.order, [(self.variant, 2)])
+            return real_atomic(*args, **kwargs)
+
+        with mock.patch('orders.payment_utils.transaction.atomic', side_effect=retry_then_atomic):
+            self.assertEqual(expire_abandoned_orders(older_than_minutes=30), 0)
+        self.assertTrue(retried)
+        self.assertEqual(list(self.order.items.values_list('status', flat=True)), ['Pending'])
+        self.assertEqual(self.order.reservations.get().status, 'Held')
+
+
+class MarkOrderPaidTests(TestCase):
+
+    def setUp(self):
+        self.kept, self.cancelled = make_variant(quantity=3), make_variant(quantity=3)
+        self.order = make_order(make_user(), [(self.kept, 1), (self.cancelled, 2)], 'RP', item_payment_status='Pending')
+        reserve_stock(self.order, [(self.kept, 1), (self.cancelled, 2)])
+
+    def test_item_cancelled_before_payment_keeps_its_stock(self):
+        item = self.order.items.get(product_variant=self.cancelled)
+        refund_items(self.order, [item], 'Cancelled', description="Refund #{order_number} {item_id}", txn_prefix='RF')
+
+        mark_order_paid(self.order, 'pay_late')
+
+        self.assertEqual(ProductVariant.objects.get(pk=self.cancelled.pk).quantity, 3)
+        self.assertEqual(ProductVariant.objects.get(pk=self.kept.pk).quantity, 2)
+        self.assertEqual(OrderItem.objects.get(pk=item.pk).status, 'Cancelled')
+        self.assertEqual(self.order.reservations.get(product_variant=self.cancelled).status, 'Released')
+        self.assertEqual(self.order.reservations.get(product_variant=self.kept).status, 'Confirmed')
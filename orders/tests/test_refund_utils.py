@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from orders.models import Order
+from orders.refund_utils import refund_items
+from orders.stock_utils import get_available_quantity, reserve_stock
+from product.models import ProductVariant
+from wallet.models import Wallet, WalletTransaction
+from .helpers import make_order, make_user, make_variant
+
+
+class RefundItemsTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user()
+        self.variant = make_variant(quantity=3)
+
+    def on_hand(self):
+        return ProductVariant.objects.get(pk=self.variant.pk).quantity
+
+    def balance(self):
+        return Wallet.objects.get(user=self.user).balance
+
+    def cancel(self, items, **kwargs):
+        return refund_items(
+            items[0].order, items, 'Cancelled',
+            description="Refund - Order #{order_number} - Item #{item_id}", txn_prefix='RF',
+            is_paid=lambda item: item.item_payment_status == 'Paid', **kwargs
+        )
+
+    def test_double_cancel_refunds_and_restocks_once(self):
+        order = make_order(self.user, [(self.variant, 2)], 'WP', status='Processing',
+                           item_payment_status='Paid', payment_status=True)
+        stale = list(order.items.all())
+
+        self.assertEqual(self.cancel(stale), {stale[0].id: Decimal('200.00')})
+        self.assertEqual(self.cancel(stale), {})
+
+        self.assertEqual(self.balance(), Decimal('200.00'))
+        self.assertEqual(WalletTransaction.objects.filter(order=order).count(), 1)
+        self.assertEqual(self.on_hand(), 5)
+        self.assertEqual(Order.objects.get(pk=order.pk).total_amount, Decimal('0'))
+
+    def test_cancel_order_view_posted_twice(self):
+        order = make_order(self.user, [(self.variant, 1), (make_variant(), 1)], 'WP', status='Processing',
+                           item_payment_status='Paid', payment_status=True)
+        self.client.force_login(self.user)
+        url = reverse('cancel_order', args=[order.id])
+        self.client.post(url, {'cancellation_reason': 'CMM'})
+        self.client.post(url, {'cancellation_reason': 'CMM'})
+
+        self.assertEqual(self.balance(), Decimal('200.00'))
+        self.assertEqual(WalletTransaction.objects.filter(order=order).count(), 2)
+        self.assertEqual(self.on_hand(), 4)
+        self.assertEqual(Order.objects.get(pk=order.pk).overall_status, 'Cancelled')
+
+    def test_unpaid_razorpay_order_is_cancelled_without_a_refund(self):
+        order = make_order(self.user, [(self.variant, 2)], 'RP', item_payment_status='Pending')
+        reserve_stock(order, [(self.variant, 2)])
+        self.assertEqual(get_available_quantity(self.variant), 1)
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('cancel_order', args=[order.id]), {'cancellation_reason': 'CMM'})
+
+        self.assertEqual(list(order.items.values_list('status', 'item_payment_status')), [('Cancelled', 'Cancelled')])
+        self.assertFalse(WalletTransaction.objects.exists())
+        self.assertEqual(order.reservations.get().status, 'Released')
+        self.assertEqual(self.on_hand(), 3)
+        self.assertEqual(get_available_quantity(self.variant), 3)
+
+    def test_return_is_only_refunded_from_return_requested(self):
+        order = make_order(self.user, [(self.variant, 1)], 'WP', status='Delivered',
+                           item_payment_status='Paid', payment_status=True)
+        items = list(order.items.all())
+        refund = dict(description="Return - Order #{order_number} - Item #{item_id}", txn_prefix='RT')
+
+        self.assertEqual(refund_items(order, items, 'Returned', **refund), {})
+        order.items.update(status='Return_Requested')
+        self.assertEqual(refund_items(order, items, 'Returned', **refund), {items[0].id: Decimal('100.00')})
+        self.assertEqual(refund_items(order, items, 'Returned', **refund), {})
+        self.assertEqual(self.balance(), Decimal('100.00'))
+        self.assertEqual(self.on_hand(), 4)
@@ -0,0 +1,43 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from orders.models import DailySales, PendingSalesDay
+from orders.rollup_utils import rebuild_pending_sales_days
+from orders.status_utils import apply_item_status
+from .helpers import make_order, make_user, make_variant
+
+
+class PendingSalesDayTests(TestCase):
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = make_order(make_user(), [(make_variant(), 1), (make_variant(), 2)], status='Processing')
+
+    def test_order_change_only_marks_its_day(self):
+        self.assertEqual(list(PendingSalesDay.objects.values_list('date', flat=True)), [self.today])
+        self.assertFalse(DailySales.objects.exists())
+
+    def test_pending_days_are_rebuilt_and_cleared(self):
+        self.assertEqual(rebuild_pending_sales_days(), 1)
+        self.assertFalse(PendingSalesDay.objects.exists())
+        row = DailySales.objects.get(date=self.today)
+        self.assertEqual((row.order_count, row.items_sold, row.revenue), (1, 3, Decimal('300.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_item_status(self.order.items.all(), 'Shipped')
+            apply_item_status(self.order.items.all(), 'Delivered')
+        self.assertEqual(PendingSalesDay.objects.count(), 1)
+        self.assertEqual(rebuild_pending_sales_days(), 1)
+        self.assertEqual(rebuild_pending_sales_days(), 0)
+
+    def test_command_rebuilds_pending_days(self):
+        out = StringIO()
+        call_command('rebuild_sales_rollup', '--pending', stdout=out)
+        self.assertIn('1 marked day', out.getvalue())
+        self.assertTrue(DailySales.objects.filter(date=self.today).exists())
+        self.assertFalse(PendingSalesDay.objects.exists())
@@ -0,0 +1,99 @@
+from django.test import TestCase
+
+from orders.models import OrderItem, OrderItemSearchTerm
+from orders.search_utils import keyset_page, rebuild_search_index, search_order_items
+from product.models import Product
+from users.models import CustomUser
+from .helpers import make_order, make_user, make_variant
+
+
+def make_named_variant(name):
+    variant = make_variant()
+    Product.objects.filter(pk=variant.product_id).update(name=name)
+    return variant
+
+
+class SearchOrderItemsTests(TestCase):
+
+    def setUp(self):
+        self.asha = make_user('asha@example.com')
+        CustomUser.objects.filter(pk=self.asha.pk).update(name='Asha Menon')
+        self.ravi = make_user('ravi@example.com')
+        CustomUser.objects.filter(pk=self.ravi.pk).update(name='Ravi Kumar')
+        self.sneaker_order = make_order(self.asha, [(make_named_variant('Blue Running Sneaker'), 1)])
+        self.sandal_order = make_order(self.asha, [(make_named_variant('Leather Sandal'), 1)])
+        self.ravi_order = make_order(self.ravi, [(make_named_variant('Blue Leather Boot'), 1)])
+        self.assertEqual(rebuild_search_index(), 3)
+
+    def search(self, query):
+        return set(search_order_items(OrderItem.objects.all(), query).values_list('order_id', flat=True))
+
+    def test_index_holds_each_distinct_word_once(self):
+        item = self.sneaker_order.items.get()
+        terms = set(OrderItemSearchTerm.objects.filter(order_item=item).values_list('term', flat=True))
+        self.assertEqual(terms, {
+            self.sneaker_order.order_number.lower(), 'asha', 'menon', 'asha@example.com', 'blue', 'running', 'sneaker',
+        })
+        rebuild_search_index()
+        self.assertEqual(OrderItemSearchTerm.objects.filter(order_item=item).count(), 7)
+
+    def test_exact_order_number(self):
+        self.assertEqual(self.search(self.sandal_order.order_number.lower()), {self.sandal_order.id})
+
+    def test_exact_email(self):
+        self.assertEqual(self.search('RAVI@example.com'), {self.ravi_order.id})
+
+    def test_unknown_email_falls_back_to_prefixes(self):
+        self.assertEqual(self.search('asha@'), {self.sneaker_order.id, self.sandal_order.id})
+
+    def test_every_word_must_prefix_a_term(self):
+        self.assertEqual(self.search('blu'), {self.sneaker_order.id, self.ravi_order.id})
+        self.assertEqual(self.search('Blue leath'), {self.ravi_order.id})
+        self.assertEqual(self.search('asha leather'), {self.sandal_order.id})
+        self.assertEqual(self.search('asha boot'), set())
+
+    def test_words_match_only_at_their_start(self):
+        self.assertEqual(self.search('eather'), set())
+
+    def test_renamed_product_is_found_after_a_rebuild(self):
+        Product.objects.filter(pk=self.sandal_order.items.get().product_variant.product_id).update(name='Slipper')
+        self.assertEqual(self.search('slip'), set())
+        rebuild_search_index(OrderItem.objects.filter(order=self.sandal_order))
+        self.assertEqual(self.search('slip'), {self.sandal_order.id})
+
+
+class KeysetPageTests(TestCase):
+
+    def setUp(self):
+        user = make_user()
+        for _ in range(5):
+            make_order(user, [(make_variant(), 1)])
+        self.items = OrderItem.objects.all()
+        self.newest_first = list(self.items.order_by('-order_id', '-id'))
+
+    def test_first_page(self):
+        page = keyset_page(self.items, size=2)
+        self.assertEqual(page['items'], self.newest_first[:2])
+        self.assertIsNone(page['newer'])
+        self.assertEqual(page['older'], f"{self.newest_first[1].order_id}.{self.newest_first[1].id}")
+
+    def test_walk_to_the_last_page_and_back(self):
+        second = keyset_page(self.items, after=keyset_page(self.items, size=2)['older'], size=2)
+        self.assertEqual(second['items'], self.newest_first[2:4])
+        last = keyset_page(self.items, after=second['older'], size=2)
+        self.assertEqual(last['items'], self.newest_first[4:])
+        self.assertIsNone(last['older'])
+        self.assertIsNotNone(last['newer'])
+
+        back = keyset_page(self.items, before=last['newer'], size=2)
+        self.assertEqual(back['items'], self.newest_first[2:4])
+        first = keyset_page(self.items, before=back['newer'], size=2)
+        self.assertEqual(first['items'], self.newest_first[:2])
+        self.assertIsNone(first['newer'])
+        self.assertIsNotNone(first['older'])
+
+    def test_bad_cursor_starts_from_the_newest(self):
+        for cursor in ('garbage', '1.x', ''):
+            page = keyset_page(self.items, after=cursor, before=cursor, size=2)
+            self.assertEqual(page['items'], self.newest_first[:2])
+            self.assertIsNone(page['newer'])
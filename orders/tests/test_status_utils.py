@@ -0,0 +1,72 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.test import TestCase
+from django.urls import reverse
+
+from orders.models import Order, OrderItem
+from orders.status_utils import apply_item_status, refresh_overall_statuses
+from .helpers import make_order, make_user, make_variant
+
+
+class OverallStatusTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user()
+        self.order = make_order(self.user, [(make_variant(), 1), (make_variant(), 1)])
+
+    def overall(self, order=None):
+        return Order.objects.get(pk=(order or self.order).pk).overall_status
+
+    def test_refresh_follows_item_changes(self):
+        self.order.items.update(status='Shipped')
+        self.assertEqual(self.overall(), 'Pending')
+        self.assertEqual(refresh_overall_statuses([self.order.id]), {self.order.id: 'Shipped'})
+        self.assertEqual(self.overall(), 'Shipped')
+
+    def test_bulk_delivery_bills_pays_and_rolls_up(self):
+        apply_item_status(self.order.items.all(), 'Delivered')
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(order.overall_status, 'Delivered')
+        self.assertTrue(order.payment_status)
+        self.assertEqual(order.items.filter(item_payment_status='Paid', is_bill_generated=True).count(), 2)
+
+    def test_partial_delivery(self):
+        apply_item_status(self.order.items.all()[:1], 'Delivered')
+        self.assertEqual(self.overall(), 'Partially Delivered')
+
+    def test_bulk_refuses_refund_statuses(self):
+        with self.assertRaises(ValueError):
+            apply_item_status(self.order.items.all(), 'Cancelled')
+
+    def test_full_order_save_keeps_the_refreshed_status(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        self.order.items.update(status='Processing')
+        refresh_overall_statuses([self.order.id])
+        stale.shipping_cost = 0
+        stale.save(update_fields=['shipping_cost', 'updated_at'])
+        self.assertEqual(self.overall(), 'Processing')
+
+    def test_return_request_updates_the_order(self):
+        apply_item_status(self.order.items.all(), 'Delivered')
+        item = self.order.items.first()
+        self.client.force_login(self.user)
+        self.client.post(reverse('return_product', args=[item.id]), {'cancellation_reason': 'SCI'})
+        self.assertEqual(OrderItem.objects.get(pk=item.pk).status, 'Return_Requested')
+        self.assertEqual(self.overall(), 'Partially Delivered')
+
+        other = self.order.items.exclude(pk=item.pk).get()
+        self.client.post(reverse('return_product', args=[other.id]), {'cancellation_reason': 'SCI'})
+        self.assertEqual(self.overall(), 'Return Requested')
+
+    def test_migration_fills_existing_orders(self):
+        delivered = make_order(self.user, [(make_variant(), 1)])
+        apply_item_status(delivered.items.all(), 'Delivered')
+        cancelled = make_order(self.user, [(make_variant(), 1)], status='Cancelled')
+        Order.objects.update(overall_status='Pending')
+
+        migration = import_module('orders.migrations.0009_order_overall_status')
+        migration.fill_overall_status(apps, None)
+        self.assertEqual(self.overall(delivered), 'Delivered')
+        self.assertEqual(self.overall(cancelled), 'Cancelled')
+        self.assertEqual(self.overall(), 'Pending')
@@ -0,0 +1,135 @@
+import threading
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from product.models import ProductVariant
+from orders.models import StockReservation
+from orders.payment_utils import mark_order_paid
+from orders.stock_utils import (
+    InsufficientStock, confirm_reservations, decrement_stock, get_available_quantity, reserve_stock, sell_stock,
+)
+from .helpers import make_order, make_user, make_variant
+
+
+def on_hand(variant):
+    return ProductVariant.objects.get(pk=variant.pk).quantity
+
+
+class StockUtilsTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user()
+        self.variant = make_variant(quantity=2)
+
+    def test_decrement_clamps_at_zero_instead_of_underflowing(self):
+        other = make_variant(quantity=5)
+        decrement_stock({self.variant.id: 3, other.id: 2})
+        self.assertEqual(on_hand(self.variant), 0)
+        self.assertEqual(on_hand(other), 3)
+        self.variant.product.refresh_from_db()
+        self.assertEqual(self.variant.product.total_quantity, 0)
+
+    def test_sell_stock_decrements_when_available(self):
+        sell_stock({self.variant.id: 2})
+        self.assertEqual(on_hand(self.variant), 0)
+
+    def test_sell_stock_does_not_take_units_held_for_a_payment(self):
+        reserve_stock(make_order(self.user, [(self.variant, 2)], 'RP'), [(self.variant, 2)])
+        with self.assertRaises(InsufficientStock) as caught:
+            sell_stock({self.variant.id: 1})
+        self.assertEqual(caught.exception.shortages, {self.variant.id: 0})
+        self.assertEqual(on_hand(self.variant), 2)
+
+    def test_second_reservation_of_the_last_units_is_refused(self):
+        reserve_stock(make_order(self.user, [(self.variant, 2)], 'RP'), [(self.variant, 2)])
+        second = make_order(make_user(), [(self.variant, 1)], 'RP')
+        with self.assertRaises(InsufficientStock):
+            reserve_stock(second, [(self.variant, 1)])
+        self.assertFalse(second.reservations.exists())
+
+    def test_retry_rearms_the_orders_own_hold(self):
+        order = make_order(self.user, [(self.variant, 2)], 'RP')
+        reserve_stock(order, [(self.variant, 2)], ttl_minutes=1)
+        expires_at = reserve_stock(order, [(self.variant, 2)], ttl_minutes=30)
+        reservation = order.reservations.get()
+        self.assertEqual(reservation.expires_at, expires_at)
+        self.assertEqual(get_available_quantity(self.variant), 0)
+
+    def test_confirm_live_reservation_decrements_stock(self):
+        order = make_order(self.user, [(self.variant, 2)], 'RP')
+        reserve_stock(order, [(self.variant, 2)])
+        self.assertEqual(confirm_reservations(order), set())
+        self.assertEqual(on_hand(self.variant), 0)
+        self.assertEqual(order.reservations.get().status, 'Confirmed')
+        self.assertEqual(confirm_reservations(order), set())
+        self.assertEqual(on_hand(self.variant), 0)
+
+    def test_confirm_lapsed_reservation_while_stock_is_still_free(self):
+        order = make_order(self.user, [(self.variant, 1)], 'RP')
+        reserve_stock(order, [(self.variant, 1)])
+        order.reservations.update(status='Released')
+        self.assertEqual(confirm_reservations(order), set())
+        self.assertEqual(on_hand(self.variant), 1)
+
+    def test_confirm_lapsed_reservation_after_the_stock_sold_does_not_oversell(self):
+        order = make_order(self.user, [(self.variant, 2)], 'RP')
+        reserve_stock(order, [(self.variant, 2)])
+        order.reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        sell_stock({self.variant.id: 1})
+        with self.assertLogs('orders.stock_utils', 'ERROR'):
+            self.assertEqual(confirm_reservations(order), {self.variant.id})
+        self.assertEqual(on_hand(self.variant), 1)
+        self.assertEqual(order.reservations.get().status, 'Released')
+
+    def test_paid_order_with_sold_out_item_is_flagged_for_refund(self):
+        kept = make_variant(quantity=1)
+        order = make_order(self.user, [(self.variant, 2), (kept, 1)], 'RP', item_payment_status='Pending')
+        reserve_stock(order, [(self.variant, 2), (kept, 1)])
+        order.reservations.update(status='Released')
+        sell_stock({self.variant.id: 1})
+
+        with self.assertLogs('orders.stock_utils', 'ERROR'):
+            self.assertTrue(mark_order_paid(order, 'pay_test'))
+        statuses = dict(order.items.values_list('product_variant_id', 'status'))
+        self.assertEqual(statuses, {self.variant.id: 'On_Hold', kept.id: 'Processing'})
+        flagged = order.items.get(product_variant=self.variant)
+        self.assertEqual(flagged.item_payment_status, 'Paid')
+        self.assertIn('Refund required', flagged.admin_note)
+        self.assertEqual(on_hand(self.variant), 1)
+        self.assertEqual(on_hand(kept), 0)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockReservationConcurrencyTests(TransactionTestCase):
+    """Shoppers racing for the last units, each thread on its own connection"""
+    THREADS = 8
+
+    def test_only_one_shopper_holds_the_last_unit(self):
+        variant = make_variant(quantity=1)
+        orders = [make_order(make_user(), [(variant, 1)], 'RP') for _ in range(self.THREADS)]
+        barrier = threading.Barrier(self.THREADS)
+        held, errors = [], []
+
+        def worker(order):
+            try:
+                barrier.wait()
+                reserve_stock(order, [(variant, 1)])
+                held.append(order.id)
+            except InsufficientStock:
+                pass
+            except Exception as e:  # surfaced by the assertion below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(order,)) for order in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(held), 1)
+        self.assertEqual(StockReservation.objects.filter(status='Held').count(), 1)
@@ -10,6 +10,7 @@ urlpatterns = [
     path('my-orders/', views.my_orders, name='my_orders'),
     path('order-detail/<int:order_id>/', views.order_detail, name='order_detail'),
     path('cancel-product/<int:item_id>/', views.cancel_product, name='cancel_product'),
+    path('cancel-order/<int:order_id>/', views.cancel_order, name='cancel_order'),
     path('return-product/<int:item_id>/', views.return_product, name='return_product'),
     path('download-invoice/<int:item_id>/', views.download_invoice, name='download_invoice'),
     path('razorpay/create/', views.create_razorpay_order, name='create_razorpay_order'),
@@ -4,8 +4,11 @@ from django.views.decorators.cache import cache_control
 from django.db.models import Prefetch
 from django.db import transaction
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag, parse_etags
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.urls import reverse
 from decimal import Decimal
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
@@ -15,10 +18,22 @@ from django.conf import settings
 from .models import Order, OrderItem, ReturnRequest
 from cart.models import Cart
 from userpanel.models import Address
-from .invoice_utils import generate_invoice_pdf
+from .invoice_utils import store_invoice, get_invoice_storage, get_invoice_label
+from .stock_utils import (
+    get_available_quantities, reserve_stock, sell_stock, InsufficientStock,
+)
+from .payment_utils import mark_order_paid, mark_order_payment_failed
+from .status_utils import refresh_overall_statuses
+from .refund_utils import refund_items, CANCELLABLE_ITEM_STATUSES
+from .idempotency_utils import do_not_store, run_idempotent
+from .checkout_utils import (
+    load_cart_snapshot, get_snapshot_subtotal, get_snapshot_quantities, materialize_order_items,
+)
 from django.db.models import Q
 from coupon.models import Coupon, UserCoupon
 from wallet.models import Wallet, WalletTransaction
+from wallet.ledger_utils import debit_wallet, InsufficientWalletBalance
+from wallet.gateway_utils import create_gateway_order, GatewayUnavailable
 import json
 import requests
 import base64
@@ -31,12 +46,27 @@ logger = logging.getLogger(__name__)
 @login_required
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 def checkout(request):
+    """Place orders at most once per checkout-page token (double clicks, browser retries)"""
+    if request.method == 'POST':
+        def in_progress():
+            messages.info(request, 'Your order is already being placed. Please wait a moment.')
+            return redirect('my_orders')
+        return run_idempotent(
+            request.user, 'checkout', request.POST.get('idempotency_key'),
+            lambda: _checkout(request), in_progress,
+        )
+    return _checkout(request)
+
+
+def _checkout(request):
     try:
         """Handle checkout process with address selection and payment method"""
         cart = Cart.objects.filter(user=request.user).first()
-        if not cart or not cart.items.exists():
+        # Load the cart lines once; every step below works off this snapshot
+        cart_items = load_cart_snapshot(cart)
+        if not cart_items:
             messages.error(request, 'Your cart is empty.')
-            return redirect('view_cart')
+            return do_not_store(redirect('view_cart'))
 
         addresses = Address.objects.filter(user_id=request.user, is_deleted=False).order_by('-default_address', '-created_at')
         coupon = request.session.get('coupon', {})
@@ -61,26 +91,28 @@ def checkout(request):
 
             if not address_id or not payment_method:
                 messages.error(request, "Please select both address and payment method.")
-                return redirect('checkout')
+                return do_not_store(redirect('checkout'))
             
             try:
                 address = Address.objects.get(id=address_id, user_id=request.user)
             except Address.DoesNotExist:
                 messages.error(request, "Selected address not found.")
-                return redirect('checkout')
+                return do_not_store(redirect('checkout'))
             
             with transaction.atomic():
                 # Validate cart items - check for out of stock and unavailable products
+                # Stock held by other shoppers' pending Razorpay payments is not available
                 out_of_stock_items = []
-                for item in cart.items.all():
+                available = get_available_quantities(item.variant for item in cart_items)
+                for item in cart_items:
                     if item.variant.is_deleted == True:
                         messages.error(request, f"{item.variant.product.name} - {item.variant} is unavailable right now")
-                        return redirect('view_cart')
-                    elif item.variant.quantity == 0:
+                        return do_not_store(redirect('view_cart'))
+                    elif available[item.variant.id] == 0:
                         out_of_stock_items.append(f"{item.variant.product.name} (Size: {item.variant.size})")
-                    elif item.quantity > item.variant.quantity:
-                        messages.error(request, f"Not enough stock for {item.variant.product.name} - {item.variant}. Only {item.variant.quantity} available.")
-                        return redirect('view_cart')
+                    elif item.quantity > available[item.variant.id]:
+                        messages.error(request, f"Not enough stock for {item.variant.product.name} - {item.variant}. Only {available[item.variant.id]} available.")
+                        return do_not_store(redirect('view_cart'))
                 
                 # If there are out of stock items, show error and redirect to cart
                 if out_of_stock_items:
@@ -89,14 +121,14 @@ def checkout(request):
                     else:
                         items_str = ", ".join(out_of_stock_items)
                         messages.error(request, f"The following items are out of stock: {items_str}. Please remove them from your cart to proceed.")
-                    return redirect('view_cart')
+                    return do_not_store(redirect('view_cart'))
                 
-                subtotal = sum(item.price * item.quantity for item in cart.items.all())
+                subtotal = get_snapshot_subtotal(cart_items)
                 
                 # COD limit check (based on total payable amount after discounts)
                 if payment_method == 'COD' and total_amount > 1000:
                     messages.error(request, 'Cash on Delivery is not available for orders above ₹1,000. Please choose an online payment method.')
-                    return redirect('checkout')
+                    return do_not_store(redirect('checkout'))
                 
                 # Wallet payment validation
                 if payment_method == 'WP':
@@ -105,10 +137,10 @@ def checkout(request):
                         
                         if not wallet.is_active:
                             messages.error(request, 'Your wallet is inactive. Please contact customer care.')
-                            return redirect('checkout')
+                            return do_not_store(redirect('checkout'))
                         if wallet.balance < total_amount:
                             messages.error(request, 'Insufficient balance in your wallet. Please choose a different payment method.')
-                            return redirect('checkout')
+                            return do_not_store(redirect('checkout'))
                         
                 # Razorpay validation (static for now)
                 if payment_method == 'RP':
@@ -128,28 +160,32 @@ def checkout(request):
                     shipping_cost=cart.delivery_charge or 0,
                 )
                 
-                # Create order items
-                # Compute total_sale for weighting (order.subtotal = sum of item.price * qty)
-                total_sale_all = sum(i.price * i.quantity for i in cart.items.all()) or 1
-                items_total_after_offers = total_amount + discount_amount - (cart.delivery_charge or 0)
-                for item in cart.items.all():
-                    item_sale_val = item.price * item.quantity
-                    # Effective (after-offer) unit price for this item
-                    eff_subtotal = (item_sale_val / total_sale_all) * items_total_after_offers
-                    eff_unit_price = round(eff_subtotal / item.quantity, 2) if item.quantity else item.price
-                    OrderItem.objects.create(
-                        order=order,
-                        product_variant=item.variant,
-                        quantity=item.quantity,
-                        price=item.price,
-                        item_payment_status='Unpaid' if payment_method == 'COD' else 'Paid',
-                        original_price=item.variant.actual_price,
-                        effective_price=eff_unit_price,
-                    )
-                    # Reduce stock
-                    item.variant.quantity -= item.quantity
-                    item.variant.save()
-                    
+                # Create order items in one INSERT and reduce stock in one UPDATE
+                materialize_order_items(
+                    order, cart_items, total_amount, discount_amount, cart.delivery_charge,
+                    item_payment_status='Unpaid' if payment_method == 'COD' else 'Paid',
+                )
+                try:
+                    # the check above is advisory; this one holds the variants' locks
+                    sell_stock(get_snapshot_quantities(cart_items))
+                except InsufficientStock:
+                    transaction.set_rollback(True)
+                    messages.error(request, 'Some items in your cart just sold out. Please review your cart.')
+                    return do_not_store(redirect('view_cart'))
+
+                if payment_method == 'WP':
+                    # The balance check above is advisory; the debit itself
+                    # refuses to overdraw, e.g. when two checkouts race
+                    try:
+                        debit_wallet(
+                            wallet, Decimal(str(total_amount)), f"Payment for Order #{order.order_number}",
+                            order=order,
+                            transaction_id="TXN-" + str(int(time.time())) + uuid.uuid4().hex[:4].upper(),
+                        )
+                    except InsufficientWalletBalance:
+                        transaction.set_rollback(True)
+                        messages.error(request, 'Insufficient balance in your wallet. Please choose a different payment method.')
+                        return do_not_store(redirect('checkout'))
                     
                 if coupon_code:
                         UserCoupon.objects.create(
@@ -168,23 +204,10 @@ def checkout(request):
                 if payment_method == 'WP':
 
                     with transaction.atomic():
-                        # Get wallet (should exist due to validation above)
-                        wallet, created = Wallet.objects.get_or_create(user=request.user)
-                        wallet.refresh_from_db()
-                        wallet.balance = wallet.balance - Decimal(str(total_amount))
-                        wallet.save()
-                        WalletTransaction.objects.create(
-                                wallet=wallet,
-                                transaction_type="Dr",
-                                amount=Decimal(str(total_amount)),
-                                status="Completed",
-                                description=f"Payment for Order #{order.order_number}",
-                                order=order,
-                                transaction_id="TXN-" + str(int(time.time())) + uuid.uuid4().hex[:4].upper(),
-                            )
                         order.items.update(status='Processing', item_payment_status='Paid')
+                        refresh_overall_statuses([order.id])
                         order.payment_status = True
-                        order.save()
+                        order.save(update_fields=['payment_status', 'updated_at'])
                         
 
                 # Check if this is the user's first order and give referral rewards
@@ -223,19 +246,25 @@ def checkout(request):
 
                 if payment_method == 'WP':
                     messages.success(request, f"Order placed successfully. Your order number is {order.order_number}")
-                    return render(request, 'wallet_processing.html', {'order': order})
+                    response = render(request, 'wallet_processing.html', {'order': order})
+                    # A replay goes straight to the page this one forwards to
+                    response.idempotency_summary = {
+                        'kind': 'redirect',
+                        'url': reverse('order_success', kwargs={'order_id': order.id}),
+                    }
+                    return response
                 
                 messages.success(request, f"Order placed successfully. Your order number is {order.order_number}")
                 return redirect('order_success', order_id=order.id)
 
         # Calculate detailed totals for display (similar to cart view)
-        total_actual_price = sum(item.variant.actual_price * item.quantity for item in cart.items.all())
-        total_sale_price_before_offer = sum(item.variant.sale_price * item.quantity for item in cart.items.all())
+        total_actual_price = sum(item.variant.actual_price * item.quantity for item in cart_items)
+        total_sale_price_before_offer = sum(item.variant.sale_price * item.quantity for item in cart_items)
         total_normal_discount = total_actual_price - total_sale_price_before_offer
-        total_offer_discount = sum(item.get_offer_discount() for item in cart.items.all())
+        total_offer_discount = sum(item.get_offer_discount() for item in cart_items)
         
         # Subtotal = sale price minus offer discounts (mirrors cart "Subtotal" row)
-        subtotal_after_offers = sum(item.get_final_price() for item in cart.items.all())
+        subtotal_after_offers = sum(item.get_final_price() for item in cart_items)
         
         # Calculate total discount for display (Normal + Offer + Coupon)
         total_discount = total_normal_discount + total_offer_discount + discount_amount
@@ -254,6 +283,7 @@ def checkout(request):
             'coupon_code': coupon_code,
             'discount_amount': discount_amount,
             'total_price_after_coupon_discount': total_price_after_coupon_discount,
+            'idempotency_key': uuid.uuid4().hex,
         }
         
         return render(request, 'checkout.html', data)
@@ -261,11 +291,11 @@ def checkout(request):
     except Wallet.DoesNotExist:
         logger.error(f"Wallet not found for user: {request.user.user_id}")
         messages.error(request, 'Wallet not found. Please contact customer support.')
-        return redirect('checkout')
+        return do_not_store(redirect('checkout'))
     except ValueError as e:
         logger.error(f"ValueError in wallet payment processing: {e}")
         messages.error(request, f"An error occurred while processing your wallet payment.")
-        return redirect('checkout')
+        return do_not_store(redirect('checkout'))
     # except Exception as e:
     #     logger.error(f"Error in checkout view: {e}")
     #     messages.error(request, "An unexpected error occurred during checkout. Please try again or contact support.")
@@ -310,8 +340,18 @@ def retry_payment(request, order_id):
     
     # Render a retry payment page that initiates payment
     from django.conf import settings
-    from wallet.utils import razorpay_client
     
+    # Hold the stock again for the new payment window
+    items = list(order.items.select_related('product_variant__product'))
+    available = get_available_quantities(
+        [item.product_variant for item in items if item.product_variant],
+        exclude_order=order,
+    )
+    for item in items:
+        if not item.product_variant or item.quantity > available[item.product_variant.id]:
+            messages.error(request, 'Some items in this order are no longer in stock.')
+            return redirect('order_failure', order_id=order.id)
+
     try:
         # Create a new Razorpay order for retry
         razorpay_order_data = {
@@ -321,12 +361,14 @@ def retry_payment(request, order_id):
             'payment_capture': 1
         }
         print(f"Creating Razorpay order with data: {razorpay_order_data}")
-        razorpay_order = razorpay_client.order.create(razorpay_order_data)
+        razorpay_order = create_gateway_order(razorpay_order_data)
         print(f"Razorpay order created: {razorpay_order['id']}")
         
         # Update the order with new razorpay_order_id
-        order.razorpay_order_id = razorpay_order['id']
-        order.save()
+        with transaction.atomic():
+            order.razorpay_order_id = razorpay_order['id']
+            order.save(update_fields=['razorpay_order_id', 'updated_at'])
+            reserve_stock(order, [(item.product_variant, item.quantity) for item in items])
         
         context = {
             'order': order,
@@ -340,6 +382,12 @@ def retry_payment(request, order_id):
         print(f"Rendering retry_payment.html with context")
         print(f"========================")
         return render(request, 'retry_payment.html', context)
+    except GatewayUnavailable:
+        messages.error(request, 'The payment gateway is not responding right now. Please try again in a minute.')
+        return redirect('order_failure', order_id=order.id)
+    except InsufficientStock:
+        messages.error(request, 'Some items in this order are no longer in stock.')
+        return redirect('order_failure', order_id=order.id)
     except Exception as e:
         print(f"ERROR in retry_payment: {e}")
         import traceback
@@ -465,15 +513,67 @@ def order_detail(request, order_id):
         user=request.user
     )
     cancellation_reasons = OrderItem.CANCELLATION_REASON_CHOICES
+
+    # Every item's refund credit in one query (newest wins, like get_actual_refund_credited)
+    refunds = {}
+    for item_id, amount in (
+        WalletTransaction.objects
+        .filter(order=order, transaction_type='Cr', status='Completed', order_item__isnull=False)
+        .order_by('created_at')
+        .values_list('order_item_id', 'amount')
+    ):
+        refunds[item_id] = amount
+    for item in order.items.all():
+        if item.id in refunds:
+            item.refund_credited = refunds[item.id]
+
     # Subtotal = items total after offers, before coupon and delivery
     order_subtotal = order.total_amount + order.discount - (order.shipping_cost or Decimal('0'))
     return render(request, 'order_detail.html', {
         'order': order,
         'cancellation_reasons': cancellation_reasons,
         'order_subtotal': order_subtotal,
+        'cancellable_count': sum(1 for item in order.items.all() if item.status in CANCELLABLE_ITEM_STATUSES),
     })
 
 
+def _was_paid(item):
+    """Whether a cancelled item's refund should go to the wallet"""
+    return item.item_payment_status == 'Paid'
+
+
+@login_required
+@require_POST
+def cancel_order(request, order_id):
+    """Cancel every still-cancellable item of an order at once"""
+    order = get_object_or_404(Order, id=order_id, user=request.user)
+    items = list(order.items.filter(status__in=CANCELLABLE_ITEM_STATUSES))
+    if not items:
+        messages.error(request, 'This order has no items that can be cancelled.')
+        return redirect('order_detail', order_id=order.id)
+
+    reason = request.POST.get('cancellation_reason')
+    item_fields = {'is_cancelled': True}
+    if reason == 'custom':
+        item_fields['custom_cancellation_reason'] = request.POST.get('custom_reason')
+    else:
+        item_fields['cancellation_reason'] = reason
+
+    credited = refund_items(
+        order, items, 'Cancelled',
+        description="Refund for cancelled product - Order #{order_number} - Item #{item_id}",
+        txn_prefix='RF',
+        is_paid=_was_paid,
+        item_fields=item_fields,
+    )
+    refund_total = sum(credited.values(), Decimal('0'))
+    if refund_total > 0:
+        messages.success(request, f'Order cancelled successfully. ₹{refund_total:.2f} has been credited to your wallet.')
+    else:
+        messages.success(request, 'Order has been cancelled successfully.')
+    return redirect('order_detail', order_id=order.id)
+
+
 @login_required
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 @transaction.atomic
@@ -487,104 +587,39 @@ def cancel_product(request, item_id):
         return redirect('my_orders')
     
     # Check if item can be cancelled
-    if order_item.status in ['Delivered', 'Cancelled', 'Returned']:
+    if order_item.status not in CANCELLABLE_ITEM_STATUSES:
         messages.error(request, 'This item cannot be cancelled.')
         return redirect('order_detail', order_id=order.id)
     
     if request.method == 'POST':
         reason = request.POST.get('cancellation_reason')
         custom_reason = request.POST.get('custom_reason')
-        
-        if reason == 'custom':
-            order_item.custom_cancellation_reason = custom_reason
-        else:
-            order_item.cancellation_reason = reason
 
-        # Update order status
-        order_item.is_cancelled = True
-        order_item.status = 'Cancelled'
-        order_item.save()
-        
-        # Restore stock
-        product_variant = order_item.product_variant
-        product_variant.quantity += order_item.quantity
-        product_variant.save()
-
-        # Use the exact refund calculation that correctly handles the snapshotted item price
-        # and proportional coupon allocation.
-        db_item = OrderItem.objects.get(id=order_item.id)
-        effective_item_price = db_item.price * db_item.quantity
-        
-        refund_amount = order_item.get_refund_amount()
-        
-        # After updating subtotal
-        # Note: order.subtotal stores the sum of item.price * quantity.
-        # We should deduct the effective value from subtotal.
-        order.subtotal -= effective_item_price
-        
-        # Recalculate delivery charge handling:
-        if order.subtotal <= 0:  
-            order.shipping_cost = 0  
-            order.total_amount = 0  
+        item_fields = {'is_cancelled': True}
+        if reason == 'custom':
+            item_fields['custom_cancellation_reason'] = custom_reason
         else:
-            # If subtotal is still positive, we just reduce the total_amount by the refunded CASH amount
-            order.total_amount -= refund_amount
-            
-            # Recalculate shipping if needed (e.g. if it drops below free shipping threshold)
-            # For now, let's keep shipping simple or valid as per user business logic.
-            # If the user wants to adjust shipping on partial cancellation, that's complex.
-            # Assuming shipping cost remains unless order is fully cancelled (which subtotal<=0 covers).
-            if order.total_amount < 0:
-                order.total_amount = 0
-
-        order.save()
-
-        # Handle wallet refund for paid orders
-        # Check if item/order was paid BEFORE changing status
-        # We check both item status and overall order payment status to be safe
-        # ALSO: If it's an online payment and status is Processing/Shipped/etc, we assume it's paid.
-        is_online_payment = order.payment_method in ['RP', 'WP', 'PP']
-        
-        # Taking a safer approach: If it's Online Payment, assume Paid unless explicitly Failed/Pending.
-        # Since we are cancelling a VALID order item (not a failed one), it must be paid.
-        was_paid = (
-            order_item.item_payment_status == 'Paid' or 
-            order.payment_status or 
-            (is_online_payment)
+            item_fields['cancellation_reason'] = reason
+
+        # Refund, restock and order totals in one pass (refund_utils).
+        # Only items actually paid for are refunded to the wallet.
+        credited = refund_items(
+            order, [order_item], 'Cancelled',
+            description="Refund for cancelled product - Order #{order_number} - Item #{item_id}",
+            txn_prefix='RF',
+            is_paid=_was_paid,
+            item_fields=item_fields,
         )
-        
-        print(f"DEBUG REFUND: Item {order_item.id}, Was Paid: {was_paid}, Refund Amount: {refund_amount}")
 
-        # Credit wallet for all paid orders (RP, WP, PP, or COD if delivered/paid)
-        if was_paid:
+        if order_item.id in credited:
+            refund_amount = credited[order_item.id]
             if refund_amount > 0:
-                wallet, _ = Wallet.objects.get_or_create(user=order.user)
-                wallet.refresh_from_db()
-                refund_decimal = Decimal(str(refund_amount))
-                wallet.balance = wallet.balance + refund_decimal
-                wallet.save()
-                WalletTransaction.objects.create(
-                    wallet=wallet,
-                    transaction_type="Cr",
-                    amount=refund_decimal,
-                    status="Completed",
-                    description=f"Refund for cancelled product - Order #{order.order_number} - Item #{order_item.id}",
-                    order=order,
-                    transaction_id="RF" + str(int(time.time()))[-5:] + uuid.uuid4().hex[:4].upper(),
-                )
-                order_item.item_payment_status = 'Refunded'
                 messages.success(request, f'Product cancelled successfully. ₹{refund_amount:.2f} has been credited to your wallet.')
             else:
-                order_item.item_payment_status = 'Refunded'
                 messages.warning(request, f'Product cancelled. Refund amount calculated as ₹0.00.')
-        elif order.payment_method == 'COD':
-            order_item.item_payment_status = 'Cancelled'
-            messages.success(request, 'Product has been cancelled successfully.')
         else:
-            order_item.item_payment_status = 'Cancelled' 
             messages.success(request, 'Product has been cancelled successfully.')
-        
-        order_item.save()
+        order_item.refresh_from_db()
        
     
     cancellation_reasons = OrderItem.CANCELLATION_REASON_CHOICES
@@ -616,6 +651,7 @@ def return_product(request, item_id):
         
         order_item.status = 'Return_Requested'
         order_item.save()
+        refresh_overall_statuses([order_item.order_id])
         
         # Create a return request
         ReturnRequest.objects.create(order=order_item)
@@ -632,21 +668,33 @@ def return_product(request, item_id):
 
 @login_required
 def download_invoice(request, item_id):
-    """Generate and download invoice PDF"""
-    order_item = get_object_or_404(OrderItem, id=item_id, order__user=request.user)
-    
-    
+    """Serve the stored invoice PDF, rendering it only when missing or out of date"""
+    order_item = get_object_or_404(
+        OrderItem.objects.select_related('order__user', 'product_variant__product'),
+        id=item_id, order__user=request.user,
+    )
     
     if not order_item.invoice_number:
         order_item.save()  # This will trigger invoice number generation
+        order_item.refresh_from_db(fields=['invoice_file', 'invoice_fingerprint'])
     address =Address.objects.get(id=order_item.order.shipping_address_id)
     try:
-        pdf = generate_invoice_pdf(order_item, address)
-        inv_label = order_item.invoice_number or f"ORD-{order_item.order.order_number}-{order_item.id}"
-        response = HttpResponse(pdf, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="invoice_{inv_label}.pdf"'
+        name, fingerprint = store_invoice(order_item, address)
+        etag = quote_etag(fingerprint)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(
+                get_invoice_storage().open(name, 'rb'),
+                content_type='application/pdf',
+                as_attachment=True,
+                filename=f"invoice_{get_invoice_label(order_item)}.pdf",
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
         return response
     except Exception as e:
+        logger.error(f"Error serving invoice for item {item_id}: {e}")
         messages.error(request, "Error generating invoice. Please try again.")
         return redirect('order_detail', order_id=order_item.order.id)
     
@@ -656,6 +704,21 @@ def download_invoice(request, item_id):
 @login_required
 @csrf_exempt
 def create_razorpay_order(request):
+    """Create the Razorpay order once per checkout-page token; retries get the same order back"""
+    key = None
+    if request.method == 'POST':
+        try:
+            key = json.loads(request.body).get('idempotency_key')
+        except (ValueError, AttributeError):
+            key = None
+    return run_idempotent(
+        request.user, 'create_razorpay_order', key,
+        lambda: _create_razorpay_order(request),
+        lambda: JsonResponse({'error': 'This payment is already being set up. Please wait.'}, status=409),
+    )
+
+
+def _create_razorpay_order(request):
     """Create a Razorpay order and return order details to frontend"""
     if request.method == 'POST':
         try:
@@ -663,7 +726,8 @@ def create_razorpay_order(request):
             address_id = data.get('address_id')
             
             cart = Cart.objects.filter(user=request.user).first()
-            if not cart or not cart.items.exists():
+            cart_items = load_cart_snapshot(cart)
+            if not cart_items:
                 return JsonResponse({'error': 'Cart is empty'}, status=400)
             
             try:
@@ -673,13 +737,14 @@ def create_razorpay_order(request):
             
             # Validate cart items - check for out of stock and unavailable products
             out_of_stock_items = []
-            for item in cart.items.all():
+            available = get_available_quantities(item.variant for item in cart_items)
+            for item in cart_items:
                 if item.variant.is_deleted:
                     return JsonResponse({'error': f'{item.variant.product.name} is unavailable'}, status=400)
-                if item.variant.quantity == 0:
+                if available[item.variant.id] == 0:
                     out_of_stock_items.append(f"{item.variant.product.name} (Size: {item.variant.size})")
-                elif item.quantity > item.variant.quantity:
-                    return JsonResponse({'error': f'Not enough stock for {item.variant.product.name}. Only {item.variant.quantity} available.'}, status=400)
+                elif item.quantity > available[item.variant.id]:
+                    return JsonResponse({'error': f'Not enough stock for {item.variant.product.name}. Only {available[item.variant.id]} available.'}, status=400)
             
             # If there are out of stock items, return error
             if out_of_stock_items:
@@ -697,20 +762,17 @@ def create_razorpay_order(request):
             if coupon_id:
                 coupon_code = Coupon.objects.get(id=coupon_id)
             
-            subtotal = sum(item.price * item.quantity for item in cart.items.all())
+            subtotal = get_snapshot_subtotal(cart_items)
             total_amount = cart.total_price - discount_amount if discount_amount > 0 else cart.total_price
             
-            # Import razorpay client
-            from wallet.utils import razorpay_client
-            
-            # Create Razorpay order
+            # Create Razorpay order (before the transaction, so no locks are held while waiting on the gateway)
             razorpay_order_data = {
                 'amount': int(total_amount * 100),  # Razorpay expects amount in paise
                 'currency': 'INR',
                 'payment_capture': 1  # Auto capture
             }
             
-            razorpay_order = razorpay_client.order.create(razorpay_order_data)
+            razorpay_order = create_gateway_order(razorpay_order_data)
             
             with transaction.atomic():
                 # Create the order
@@ -728,24 +790,14 @@ def create_razorpay_order(request):
                     razorpay_order_id=razorpay_order['id'],
                 )
                 
-                # Create order items and reduce stock
-                total_sale_all = sum(i.price * i.quantity for i in cart.items.all()) or 1
-                items_total_after_offers = total_amount + discount_amount - (cart.delivery_charge or 0)
-                for item in cart.items.all():
-                    item_sale_val = item.price * item.quantity
-                    eff_subtotal = (item_sale_val / total_sale_all) * items_total_after_offers
-                    eff_unit_price = round(eff_subtotal / item.quantity, 2) if item.quantity else item.price
-                    OrderItem.objects.create(
-                        order=order,
-                        product_variant=item.variant,
-                        quantity=item.quantity,
-                        price=item.price,
-                        item_payment_status='Pending',
-                        original_price=item.variant.actual_price,
-                        effective_price=eff_unit_price,
-                    )
-                    item.variant.quantity -= item.quantity
-                    item.variant.save()
+                # Create order items. Stock is only reserved here, with the
+                # availability check repeated under the variants' locks; it is
+                # decremented when verify_razorpay_payment confirms payment.
+                reserve_stock(order, [(item.variant, item.quantity) for item in cart_items])
+                materialize_order_items(
+                    order, cart_items, total_amount, discount_amount, cart.delivery_charge,
+                    item_payment_status='Pending',
+                )
                 
                 # Handle coupon usage
                 if coupon_code:
@@ -769,6 +821,11 @@ def create_razorpay_order(request):
                 'order_id': order.id,
             })
             
+        except GatewayUnavailable:
+            return JsonResponse({'error': 'Payment gateway is not responding. Please try again in a minute.'}, status=503)
+        except InsufficientStock:
+            # another shopper took the last units while the gateway order was created
+            return JsonResponse({'error': 'Some items in your cart just sold out. Please review your cart.'}, status=409)
         except Exception as e:
             logger.error(f"Error creating Razorpay order: {e}")
             return JsonResponse({'error': str(e)}, status=500)
@@ -777,6 +834,27 @@ def create_razorpay_order(request):
 
 @csrf_exempt
 def verify_razorpay_payment(request):
+    """
+    Verify each Razorpay payment id at most once. The gateway callback is a
+    cross-site POST without our session, so the key is scoped to the order's
+    owner rather than request.user.
+    """
+    razorpay_order_id = request.POST.get('razorpay_order_id') or request.GET.get('razorpay_order_id')
+    razorpay_payment_id = request.POST.get('razorpay_payment_id') or request.GET.get('razorpay_payment_id')
+    order = None
+    if razorpay_order_id and razorpay_payment_id:
+        order = Order.objects.filter(razorpay_order_id=razorpay_order_id).select_related('user').first()
+    if order is None:
+        return _verify_razorpay_payment(request)
+    return run_idempotent(
+        order.user, 'verify_razorpay_payment', razorpay_payment_id,
+        lambda: _verify_razorpay_payment(request),
+        # the first request is still verifying; don't claim success yet
+        lambda: render(request, 'wallet_processing.html', {'order': order, 'verifying': True}, status=202),
+    )
+
+
+def _verify_razorpay_payment(request):
     """Verify Razorpay payment signature and update order status"""
     if request.method in ['POST', 'GET']:
         try:
@@ -828,9 +906,9 @@ def verify_razorpay_payment(request):
                         pass
                 
                 if order:
-                    order.items.update(status='Payment_Failed', item_payment_status='Failed')
-                    return redirect('order_failure', order_id=order.id)
-                return redirect('my_orders')
+                    mark_order_payment_failed(order)
+                    return do_not_store(redirect('order_failure', order_id=order.id))
+                return do_not_store(redirect('my_orders'))
             
             # Check if this is a failed payment callback (missing payment_id or signature)
             if not razorpay_payment_id or not razorpay_signature:
@@ -849,9 +927,9 @@ def verify_razorpay_payment(request):
                         pass
                 
                 if order:
-                    order.items.update(status='Payment_Failed', item_payment_status='Failed')
-                    return redirect('order_failure', order_id=order.id)
-                return redirect('my_orders')
+                    mark_order_payment_failed(order)
+                    return do_not_store(redirect('order_failure', order_id=order.id))
+                return do_not_store(redirect('my_orders'))
             
             # Find the order by razorpay_order_id
             order = get_object_or_404(Order, razorpay_order_id=razorpay_order_id)
@@ -868,17 +946,11 @@ def verify_razorpay_payment(request):
                 logger.info(f"Signature verified successfully for order {order.order_number}")
             except razorpay.errors.SignatureVerificationError as sig_error:
                 logger.error(f"Signature verification failed: {sig_error}")
-                order.items.update(status='Payment_Failed', item_payment_status='Failed')
-                return redirect('order_failure', order_id=order.id)
+                mark_order_payment_failed(order)
+                return do_not_store(redirect('order_failure', order_id=order.id))
             
-            # Payment verified successfully
-            with transaction.atomic():
-                order.payment_status = True
-                order.razorpay_payment_id = razorpay_payment_id
-                order.razorpay_signature = razorpay_signature
-                order.save()
-                
-                order.items.update(status='Processing', item_payment_status='Paid')
+            # Payment verified successfully (the webhook may have applied it already)
+            mark_order_paid(order, razorpay_payment_id, razorpay_signature)
             
             logger.info(f"Order {order.order_number} payment verified and updated successfully")
             
@@ -892,10 +964,10 @@ def verify_razorpay_payment(request):
             try:
                 if razorpay_order_id:
                     order = Order.objects.get(razorpay_order_id=razorpay_order_id)
-                    return redirect('order_failure', order_id=order.id)
+                    return do_not_store(redirect('order_failure', order_id=order.id))
                 else:
-                    return redirect('my_orders')
+                    return do_not_store(redirect('my_orders'))
             except Order.DoesNotExist:
-                return redirect('my_orders')
+                return do_not_store(redirect('my_orders'))
     
     return redirect('checkout')
\ No newline at end of file
@@ -5,6 +5,8 @@ from django.utils import timezone
 from django.http import JsonResponse
 from django.db.models import Q
 from .models import Referral, ReferralOffer
+from django.db import transaction
+from wallet.ledger_utils import record_wallet_transactions
 from wallet.models import Wallet, WalletTransaction
 
 
@@ -126,49 +128,37 @@ def give_referral_rewards(referral, offer):
     """Give wallet rewards to both referrer and referred user"""
     from decimal import Decimal
     import time
-    
-    # Reward to the person who was referred (new user)
-    if not referral.reward_given_to_referred and referral.referred_user:
-        wallet, created = Wallet.objects.get_or_create(user=referral.referred_user)
-        # Refresh from DB to ensure balance is Decimal
-        wallet.refresh_from_db()
-        wallet.balance = wallet.balance + Decimal(str(offer.referred_reward))
-        wallet.save()
-        
-        # Generate transaction ID
-        txn_id = f"REF{int(time.time())}{referral.referred_user.id}"
-        
-        WalletTransaction.objects.create(
-            wallet=wallet,
-            transaction_type='Cr',
-            amount=Decimal(str(offer.referred_reward)),
-            status='Completed',
-            description='Referral reward - New user bonus',
-            transaction_id=txn_id
-        )
-        
-        referral.reward_given_to_referred = True
-    
-    # Reward to the person who referred (existing user)
-    if not referral.reward_given_to_referrer:
-        wallet, created = Wallet.objects.get_or_create(user=referral.referrer)
-        # Refresh from DB to ensure balance is Decimal
-        wallet.refresh_from_db()
-        wallet.balance = wallet.balance + Decimal(str(offer.referrer_reward))
-        wallet.save()
-        
-        # Generate transaction ID
-        txn_id = f"REF{int(time.time())}{referral.referrer.id}"
-        
-        WalletTransaction.objects.create(
-            wallet=wallet,
-            transaction_type='Cr',
-            amount=Decimal(str(offer.referrer_reward)),
-            status='Completed',
-            description='Referral reward - Referrer bonus',
-            transaction_id=txn_id
-        )
-        
-        referral.reward_given_to_referrer = True
-    
-    referral.save()
+
+    with transaction.atomic():
+        # Lock the referral so two deliveries at once cannot both pay out
+        referral = Referral.objects.select_for_update().get(pk=referral.pk)
+        rewards = []
+
+        # Reward to the person who was referred (new user)
+        if not referral.reward_given_to_referred and referral.referred_user:
+            wallet, created = Wallet.objects.get_or_create(user=referral.referred_user)
+            rewards.append(WalletTransaction(
+                wallet=wallet,
+                transaction_type='Cr',
+                amount=Decimal(str(offer.referred_reward)),
+                status='Completed',
+                description='Referral reward - New user bonus',
+                transaction_id=f"REF{int(time.time())}{referral.referred_user.id}",
+            ))
+            referral.reward_given_to_referred = True
+
+        # Reward to the person who referred (existing user)
+        if not referral.reward_given_to_referrer:
+            wallet, created = Wallet.objects.get_or_create(user=referral.referrer)
+            rewards.append(WalletTransaction(
+                wallet=wallet,
+                transaction_type='Cr',
+                amount=Decimal(str(offer.referrer_reward)),
+                status='Completed',
+                description='Referral reward - Referrer bonus',
+                transaction_id=f"REF{int(time.time())}{referral.referrer.id}",
+            ))
+            referral.reward_given_to_referrer = True
+
+        record_wallet_transactions(rewards)
+        referral.save()
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-19 19:00
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0026_alter_otpverification_expiry_time'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='otpverification',
+            name='expiry_time',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 19, 19, 1, 45, 921665, tzinfo=datetime.timezone.utc)),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['name'], name='user_name_idx'),
+        ),
+    ]
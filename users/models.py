@@ -21,6 +21,10 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    class Meta(AbstractUser.Meta):
+        # email and mobile_no are already indexed by their unique constraints
+        indexes = [models.Index(fields=['name'], name='user_name_idx')]
+
 class OTPVerification(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     otp = models.CharField(max_length=6)
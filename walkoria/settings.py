@@ -180,6 +180,48 @@ DATABASES = {
 
 RAZORPAY_KEY_ID = config("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = config("RAZORPAY_KEY_SECRET")
+RAZORPAY_WEBHOOK_SECRET = config("RAZORPAY_WEBHOOK_SECRET", default="")
+# Use the offline stand-in in wallet/mock_gateway.py instead of the live API
+RAZORPAY_MOCK = config("RAZORPAY_MOCK", default=False, cast=bool)
+
+# Gateway adapter (wallet/gateway_utils.py): timeouts in seconds, connect
+# retries, and how many failures open the circuit breaker and for how long
+RAZORPAY_CONNECT_TIMEOUT = config("RAZORPAY_CONNECT_TIMEOUT", default=3, cast=float)
+RAZORPAY_READ_TIMEOUT = config("RAZORPAY_READ_TIMEOUT", default=10, cast=float)
+RAZORPAY_MAX_RETRIES = config("RAZORPAY_MAX_RETRIES", default=2, cast=int)
+RAZORPAY_BREAKER_THRESHOLD = config("RAZORPAY_BREAKER_THRESHOLD", default=5, cast=int)
+RAZORPAY_BREAKER_COOLDOWN = config("RAZORPAY_BREAKER_COOLDOWN", default=30, cast=int)
+
+# How long stock stays held for an unpaid Razorpay order
+STOCK_RESERVATION_TTL_MINUTES = config("STOCK_RESERVATION_TTL_MINUTES", default=15, cast=int)
+
+# Unpaid Razorpay orders untouched for this long are expired by expire_abandoned_orders
+ABANDONED_ORDER_MINUTES = config("ABANDONED_ORDER_MINUTES", default=30, cast=int)
+
+# How long a checkout/payment idempotency key replays its first response
+IDEMPOTENCY_KEY_TTL_MINUTES = config("IDEMPOTENCY_KEY_TTL_MINUTES", default=15, cast=int)
+
+# Admin dashboard KPI/top-N cache: seconds an entry stays fresh, and how long
+# one request may hold the recompute lock while others wait for it
+DASHBOARD_CACHE_SECONDS = config("DASHBOARD_CACHE_SECONDS", default=60, cast=int)
+DASHBOARD_CACHE_LOCK_SECONDS = config("DASHBOARD_CACHE_LOCK_SECONDS", default=10, cast=int)
+
+# Background report jobs (admin/job_utils.py): a Running job older than this is
+# assumed to have lost its worker and is picked up again, up to the attempt limit
+REPORT_JOB_TIMEOUT_MINUTES = config("REPORT_JOB_TIMEOUT_MINUTES", default=30, cast=int)
+REPORT_JOB_MAX_ATTEMPTS = config("REPORT_JOB_MAX_ATTEMPTS", default=3, cast=int)
+
+# Rendered invoice PDFs (orders/invoice_utils.py). Any Django storage class
+# works; the default keeps them on local disk outside the static/media trees.
+INVOICE_STORAGE_BACKEND = config(
+    "INVOICE_STORAGE_BACKEND", default="django.core.files.storage.FileSystemStorage"
+)
+INVOICE_STORAGE_OPTIONS = {
+    "location": config("INVOICE_STORAGE_ROOT", default=os.path.join(BASE_DIR, "private_media")),
+}
+# Invoice ZIP exports up to this many items are rendered inside the request;
+# longer ranges are queued for the report worker
+INVOICE_EXPORT_INLINE_LIMIT = config("INVOICE_EXPORT_INLINE_LIMIT", default=50, cast=int)
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,53 @@
+"""
+Settings for `python manage.py test`.
+
+settings.py reads its secrets and database from the environment with no
+defaults; tests only need placeholders for those, an in-memory SQLite
+database and a throwaway directory for rendered invoices. Values already
+in the environment still win, except for the database and storage.
+"""
+import os
+import tempfile
+
+TEST_ENVIRONMENT = {
+    'SECRET_KEY': 'walkoria-test-secret-key',
+    'DB_ENGINE': 'django.db.backends.sqlite3',
+    'DB_NAME': ':memory:',
+    'DB_USER': '',
+    'DB_PASSWORD': '',
+    'DB_HOST': '',
+    'DB_PORT': '',
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'EMAIL_HOST': 'localhost',
+    'EMAIL_PORT': '25',
+    'EMAIL_USE_TLS': 'False',
+    'EMAIL_HOST_USER': 'test@example.com',
+    'EMAIL_HOST_PASSWORD': '',
+    'SOCIAL_AUTH_GOOGLE_OAUTH2_KEY': 'test',
+    'SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET': 'test',
+    'CLOUDINARY_NAME': '',
+    'CLOUDINARY_KEY': 'test',
+    'CLOUDINARY_SECRET': 'test',
+    'RAZORPAY_KEY_ID': 'rzp_test_key',
+    'RAZORPAY_KEY_SECRET': 'rzp_test_secret',
+    'RAZORPAY_WEBHOOK_SECRET': 'rzp_test_webhook_secret',
+    # no test may reach api.razorpay.com
+    'RAZORPAY_MOCK': 'True',
+}
+for name, value in TEST_ENVIRONMENT.items():
+    os.environ.setdefault(name, value)
+
+from .settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+INVOICE_STORAGE_OPTIONS = {
+    'location': tempfile.mkdtemp(prefix='walkoria-test-invoices-'),
+}
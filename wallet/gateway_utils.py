@@ -0,0 +1,128 @@
+"""
+Razorpay gateway adapter.
+
+Every order.create goes through create_gateway_order so that a slow or
+failing gateway costs a request a few seconds at most instead of a whole
+gunicorn worker: the HTTP session is pooled, every call carries a
+(connect, read) timeout, connect failures are retried a bounded number of
+times, and after repeated failures a circuit breaker rejects calls outright
+until the cool-down has passed. Call it outside transaction.atomic().
+"""
+import time, logging
+
+import requests
+import razorpay
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURES_KEY = 'razorpay:breaker:failures'
+BREAKER_OPEN_UNTIL_KEY = 'razorpay:breaker:open_until'
+
+# Errors that mean the gateway itself is unhealthy; a BadRequestError is ours
+GATEWAY_FAILURES = (
+    requests.exceptions.RequestException,
+    razorpay.errors.ServerError,
+    razorpay.errors.GatewayError,
+)
+
+
+class GatewayUnavailable(Exception):
+    """Raised when the gateway is timing out, erroring or the circuit is open"""
+
+
+class TimeoutSession(requests.Session):
+    """requests.Session that applies a default timeout to every request"""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def build_gateway_session():
+    """Pooled session with strict timeouts; only connect failures are retried"""
+    session = TimeoutSession(
+        timeout=(settings.RAZORPAY_CONNECT_TIMEOUT, settings.RAZORPAY_READ_TIMEOUT)
+    )
+    # Order creation is a POST, so a request that reached Razorpay is never
+    # replayed (read=0, status=0); a refused or unreachable connect is safe to retry.
+    retry = Retry(
+        total=settings.RAZORPAY_MAX_RETRIES,
+        connect=settings.RAZORPAY_MAX_RETRIES,
+        read=0,
+        status=0,
+        backoff_factor=0.2,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retry)
+    session.mount('https://', adapter)
+    return session
+
+
+def _breaker_is_open():
+    open_until = cache.get(BREAKER_OPEN_UNTIL_KEY)
+    return open_until is not None and open_until > time.time()
+
+
+def _record_failure():
+    try:
+        failures = cache.incr(BREAKER_FAILURES_KEY)
+    except ValueError:
+        cache.set(BREAKER_FAILURES_KEY, 1, settings.RAZORPAY_BREAKER_COOLDOWN * 10)
+        failures = 1
+    if failures >= settings.RAZORPAY_BREAKER_THRESHOLD:
+        cache.set(
+            BREAKER_OPEN_UNTIL_KEY,
+            time.time() + settings.RAZORPAY_BREAKER_COOLDOWN,
+            settings.RAZORPAY_BREAKER_COOLDOWN,
+        )
+        cache.delete(BREAKER_FAILURES_KEY)
+        logger.error(
+            f"Razorpay circuit opened after {failures} failures; "
+            f"failing fast for {settings.RAZORPAY_BREAKER_COOLDOWN}s"
+        )
+
+
+def _record_success():
+    cache.delete_many([BREAKER_FAILURES_KEY, BREAKER_OPEN_UNTIL_KEY])
+
+
+def call_gateway(operation, func, *args, **kwargs):
+    """
+    Run one gateway call behind the circuit breaker and log its latency.
+    Raises GatewayUnavailable instead of the underlying transport error.
+    """
+    if _breaker_is_open():
+        logger.warning(f"razorpay {operation} rejected: circuit open")
+        raise GatewayUnavailable('Payment gateway is temporarily unavailable')
+
+    start = time.monotonic()
+    try:
+        result = func(*args, **kwargs)
+    except GATEWAY_FAILURES as e:
+        elapsed_ms = (time.monotonic() - start) * 1000
+        logger.warning(f"razorpay {operation} failed in {elapsed_ms:.0f}ms: {e}")
+        _record_failure()
+        raise GatewayUnavailable('Payment gateway is temporarily unavailable') from e
+    except Exception as e:
+        elapsed_ms = (time.monotonic() - start) * 1000
+        logger.warning(f"razorpay {operation} rejected in {elapsed_ms:.0f}ms: {e}")
+        raise
+
+    elapsed_ms = (time.monotonic() - start) * 1000
+    logger.info(f"razorpay {operation} ok in {elapsed_ms:.0f}ms")
+    _record_success()
+    return result
+
+
+def create_gateway_order(data):
+    """Create a Razorpay order through the adapter"""
+    from .utils import razorpay_client
+    return call_gateway('order.create', razorpay_client.order.create, data)
@@ -0,0 +1,152 @@
+"""
+Wallet ledger service: every balance change and WalletTransaction insert.
+
+record_wallet_transactions applies a batch of transactions in one database
+transaction:
+- the Completed ones move their wallets' balances with conditional F()
+  UPDATEs, taken in wallet-pk order so concurrent batches cannot deadlock;
+- a debit that would take a balance below zero matches no row and raises
+  InsufficientWalletBalance, rolling the whole batch back;
+- the transactions are inserted;
+- the matching WalletLedgerTotals rows are bumped.
+
+No code reads a balance, changes it in Python and saves it back, so
+concurrent requests cannot lose each other's updates.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import Wallet, WalletTransaction, WalletLedgerTotals
+
+logger = logging.getLogger(__name__)
+
+LEDGER_BUCKETS = [
+    (txn_type, status)
+    for txn_type, _ in WalletTransaction.TRANSACTION_TYPES
+    for status, _ in WalletTransaction.TRANSACTION_STATUS
+]
+
+
+class InsufficientWalletBalance(Exception):
+    """A debit would take a wallet's balance below zero"""
+
+    def __init__(self, wallet_id, amount):
+        self.wallet_id = wallet_id
+        self.amount = amount
+        super().__init__(f"Wallet {wallet_id} cannot cover a debit of ₹{amount}")
+
+
+def _apply_balances(txns):
+    deltas = defaultdict(lambda: Decimal('0'))
+    for txn in txns:
+        if txn.status == 'Completed':
+            deltas[txn.wallet_id] += txn.amount if txn.transaction_type == 'Cr' else -txn.amount
+    for wallet_id, delta in sorted(deltas.items()):
+        wallets = Wallet.objects.filter(pk=wallet_id)
+        if delta < 0:
+            # the balance check is part of the UPDATE, so it sees concurrent debits
+            wallets = wallets.filter(balance__gte=-delta)
+        if not wallets.update(balance=F('balance') + delta):
+            raise InsufficientWalletBalance(wallet_id, -delta)
+
+
+def _bump_totals(txns):
+    buckets = defaultdict(lambda: [0, Decimal('0')])
+    for txn in txns:
+        entry = buckets[(txn.transaction_type, txn.status)]
+        entry[0] += 1
+        entry[1] += txn.amount
+    # sorted, so concurrent writers lock the rows in the same order
+    for (txn_type, status), (count, amount) in sorted(buckets.items()):
+        updated = WalletLedgerTotals.objects.filter(transaction_type=txn_type, status=status).update(
+            count=F('count') + count, amount=F('amount') + amount
+        )
+        if not updated:
+            WalletLedgerTotals.objects.get_or_create(transaction_type=txn_type, status=status)
+            WalletLedgerTotals.objects.filter(transaction_type=txn_type, status=status).update(
+                count=F('count') + count, amount=F('amount') + amount
+            )
+
+
+def record_wallet_transactions(txns):
+    """
+    Apply unsaved WalletTransactions atomically: balances, inserts and
+    ledger totals. Raises InsufficientWalletBalance, having changed
+    nothing, when a wallet cannot cover its debits.
+    """
+    txns = list(txns)
+    if not txns:
+        return []
+    with transaction.atomic():
+        _apply_balances(txns)
+        if len(txns) == 1:
+            txns[0].save()  # bulk_create leaves the pk unset on MySQL
+        else:
+            WalletTransaction.objects.bulk_create(txns)
+        _bump_totals(txns)
+    return txns
+
+
+def credit_wallet(wallet, amount, description, **fields):
+    """Add a Completed credit of `amount` to `wallet`; returns the transaction"""
+    return record_wallet_transactions([WalletTransaction(
+        wallet=wallet, transaction_type='Cr', amount=amount, status='Completed', description=description, **fields
+    )])[0]
+
+
+def debit_wallet(wallet, amount, description, **fields):
+    """Take a Completed debit of `amount` from `wallet`, or raise InsufficientWalletBalance"""
+    return record_wallet_transactions([WalletTransaction(
+        wallet=wallet, transaction_type='Dr', amount=amount, status='Completed', description=description, **fields
+    )])[0]
+
+
+def get_ledger_totals():
+    """{'credits', 'debits', 'count'}: completed credit and debit amounts and all transactions"""
+    totals = {'credits': Decimal('0'), 'debits': Decimal('0'), 'count': 0}
+    for row in WalletLedgerTotals.objects.all():
+        totals['count'] += row.count
+        if row.status == 'Completed':
+            totals['credits' if row.transaction_type == 'Cr' else 'debits'] += row.amount
+    return totals
+
+
+def reconcile_ledger_totals(fix=True):
+    """
+    Compare WalletLedgerTotals with sums over the ledger and, when `fix`,
+    overwrite the rows that drifted. The totals rows are locked first, so
+    inserts wait rather than land between the recount and the write.
+    Returns [(type, status, stored (count, amount), actual (count, amount))]
+    for every bucket that differed.
+    """
+    with transaction.atomic():
+        for txn_type, status in LEDGER_BUCKETS:
+            WalletLedgerTotals.objects.get_or_create(transaction_type=txn_type, status=status)
+        stored = {
+            (row.transaction_type, row.status): row
+            for row in WalletLedgerTotals.objects.select_for_update().order_by('transaction_type', 'status')
+        }
+        actual = {
+            (row['transaction_type'], row['status']): (row['count'], row['amount'] or Decimal('0'))
+            for row in WalletTransaction.objects.values('transaction_type', 'status')
+            .annotate(count=Count('id'), amount=Sum('amount')).order_by()
+        }
+
+        drift = []
+        for key, row in sorted(stored.items()):
+            count, amount = actual.get(key, (0, Decimal('0')))
+            if (row.count, row.amount) != (count, amount):
+                drift.append((*key, (row.count, row.amount), (count, amount)))
+                if fix:
+                    row.count, row.amount = count, amount
+                    row.save(update_fields=['count', 'amount', 'updated_at'])
+        for key in set(actual) - set(stored):
+            # a status outside TRANSACTION_STATUS; report it, there is no row to fix
+            drift.append((*key, (0, Decimal('0')), actual[key]))
+    if drift:
+        logger.warning(f"Wallet ledger totals drifted in {len(drift)} bucket(s){' (fixed)' if fix else ''}")
+    return drift
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from wallet.webhook_utils import process_pending_webhook_events
+
+
+class Command(BaseCommand):
+    help = "Apply pending Razorpay webhook events from the inbox to orders and wallet top-ups"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help="Events to process per pass")
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting after one pass")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait between passes when idle")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_webhook_events(
+                limit=options['limit'], max_attempts=options['max_attempts']
+            )
+            if processed:
+                self.stdout.write(f"Processed {processed} webhook event(s)")
+            if not options['loop']:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.ledger_utils import reconcile_ledger_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the wallet ledger totals shown on the admin wallet page and "
+        "correct any bucket that drifted. Run nightly, or with --check to only report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report drift without fixing it; exits non-zero on drift")
+
+    def handle(self, *args, **options):
+        drift = reconcile_ledger_totals(fix=not options['check'])
+        for txn_type, status, (stored_count, stored_amount), (count, amount) in drift:
+            self.stdout.write(
+                f"  {txn_type} {status}: stored {stored_count} / ₹{stored_amount}, ledger {count} / ₹{amount}"
+            )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Wallet ledger totals match the ledger"))
+        elif options['check']:
+            raise CommandError(f"Wallet ledger totals drifted in {len(drift)} bucket(s)")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Corrected {len(drift)} bucket(s)"))
@@ -0,0 +1,27 @@
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.mock_gateway import build_webhook
+
+
+class Command(BaseCommand):
+    help = "Send a signed fake Razorpay webhook to a locally running server"
+
+    def add_arguments(self, parser):
+        parser.add_argument('event', choices=['payment.captured', 'payment.failed', 'order.paid'])
+        parser.add_argument('razorpay_order_id')
+        parser.add_argument('--payment-id', default=None)
+        parser.add_argument('--amount', type=int, default=0, help="Amount in paise")
+        parser.add_argument('--url', default='http://127.0.0.1:8000/wallet/razorpay/webhook/')
+
+    def handle(self, *args, **options):
+        body, headers = build_webhook(
+            options['event'], options['razorpay_order_id'],
+            razorpay_payment_id=options['payment_id'], amount=options['amount'],
+        )
+        headers['Content-Type'] = 'application/json'
+        try:
+            response = requests.post(options['url'], data=body, headers=headers, timeout=5)
+        except requests.RequestException as e:
+            raise CommandError(f"Could not reach {options['url']}: {e}")
+        self.stdout.write(f"{response.status_code} {response.text}")
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.statement_utils import build_balance_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the monthly wallet balance checkpoints that statements start "
+        "from. Run daily; it only writes months that are missing. The first "
+        "run backfills every month since the first wallet transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', help="Last checkpoint month (YYYY-MM), default this month")
+        parser.add_argument('--rebuild', action='store_true', help="Drop all checkpoints and rebuild them")
+
+    def handle(self, *args, **options):
+        through = None
+        if options['through']:
+            try:
+                through = datetime.strptime(options['through'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--through must be YYYY-MM")
+        months, written = build_balance_snapshots(through=through, rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f"Checked {months} month(s), wrote {written} checkpoint(s)"))
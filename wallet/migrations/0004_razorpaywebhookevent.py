@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0003_wallettransaction_description_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RazorpayWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=100, unique=True)),
+                ('event_type', models.CharField(max_length=50)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Processed', 'Processed'), ('Ignored', 'Ignored'), ('Failed', 'Failed')], default='Pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'received_at'], name='webhook_event_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-19 16:35
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+ITEM_REF = re.compile(r'Item #(\d+)')
+
+
+def link_refunds_to_items(apps, schema_editor):
+    """Fill order_item from the '- Item #<id>' suffix the refund paths wrote"""
+    WalletTransaction = apps.get_model('wallet', 'WalletTransaction')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    txns = (
+        WalletTransaction.objects
+        .filter(order_item__isnull=True, description__contains='Item #')
+        .only('id', 'order_id', 'description')
+        .iterator(chunk_size=1000)
+    )
+    for txn in txns:
+        match = ITEM_REF.search(txn.description or '')
+        if not match:
+            continue
+        item_id = int(match.group(1))
+        # only link items that belong to the transaction's order
+        if OrderItem.objects.filter(id=item_id, order_id=txn.order_id).exists():
+            WalletTransaction.objects.filter(id=txn.id).update(order_item_id=item_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_order_overall_status'),
+        ('wallet', '0004_razorpaywebhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='order_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wallet_transactions', to='orders.orderitem'),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['order', 'transaction_type', 'status'], name='wallet_txn_order_type_idx'),
+        ),
+        migrations.RunPython(link_refunds_to_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-19 19:04
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def seed_ledger_totals(apps, schema_editor):
+    """One row per type and status, totalled from the existing ledger"""
+    WalletTransaction = apps.get_model('wallet', 'WalletTransaction')
+    WalletLedgerTotals = apps.get_model('wallet', 'WalletLedgerTotals')
+    totals = {
+        (row['transaction_type'], row['status']): row
+        for row in WalletTransaction.objects.values('transaction_type', 'status')
+        .annotate(count=Count('id'), amount=Sum('amount')).order_by()
+    }
+    WalletLedgerTotals.objects.bulk_create([
+        WalletLedgerTotals(
+            transaction_type=txn_type, status=status,
+            count=totals.get((txn_type, status), {}).get('count') or 0,
+            amount=totals.get((txn_type, status), {}).get('amount') or 0,
+        )
+        for txn_type in ('Cr', 'Dr') for status in ('Pending', 'Completed', 'Failed')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0005_wallettransaction_order_item'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletLedgerTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(choices=[('Cr', 'Credit'), ('Dr', 'Debit')], max_length=10)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Completed', 'Completed'), ('Failed', 'Failed')], max_length=10)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('transaction_type', 'status'), name='wallet_totals_type_status_uniq')],
+            },
+        ),
+        migrations.RunPython(seed_ledger_totals, migrations.RunPython.noop),
+    ]
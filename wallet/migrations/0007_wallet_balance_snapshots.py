@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 19:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_order_item_search'),
+        ('wallet', '0006_wallet_ledger_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['wallet', 'created_at'], name='wallet_txn_wallet_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['created_at'], name='wallet_txn_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='walletbalancesnapshot',
+            name='wallet',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='wallet.wallet'),
+        ),
+        migrations.AddIndex(
+            model_name='walletbalancesnapshot',
+            index=models.Index(fields=['period_start'], name='wallet_snapshot_period_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='walletbalancesnapshot',
+            constraint=models.UniqueConstraint(fields=('wallet', 'period_start'), name='wallet_snapshot_period_uniq'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+"""
+Offline stand-in for the Razorpay gateway.
+
+Set RAZORPAY_MOCK=True to make wallet.utils.razorpay_client create orders
+locally instead of calling api.razorpay.com. Signature checks still use the
+real razorpay utility, and the helpers below produce correctly signed
+checkout callbacks and webhook deliveries for local testing.
+"""
+import hmac, hashlib, json, time, uuid
+
+import razorpay
+from django.conf import settings
+
+
+class MockOrderResource:
+    def create(self, data=None, **kwargs):
+        data = data or {}
+        return {
+            'id': 'order_mock' + uuid.uuid4().hex[:14],
+            'entity': 'order',
+            'amount': data.get('amount'),
+            'amount_paid': 0,
+            'currency': data.get('currency', 'INR'),
+            'receipt': data.get('receipt'),
+            'status': 'created',
+            'created_at': int(time.time()),
+        }
+
+
+class MockRazorpayClient:
+    """Same surface as razorpay.Client for the calls this project makes"""
+
+    def __init__(self, auth):
+        self._client = razorpay.Client(auth=auth)
+        self.order = MockOrderResource()
+        self.utility = self._client.utility
+
+
+def _hmac_hex(secret, message):
+    return hmac.new(secret.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def sign_payment(razorpay_order_id, razorpay_payment_id, secret=None):
+    """Signature Razorpay Checkout posts back to the callback_url"""
+    return _hmac_hex(secret or settings.RAZORPAY_KEY_SECRET, f"{razorpay_order_id}|{razorpay_payment_id}")
+
+
+def build_webhook(event_type, razorpay_order_id, razorpay_payment_id=None, amount=0, secret=None):
+    """
+    Return (body, headers) for a signed webhook delivery shaped like
+    Razorpay's payment.captured / payment.failed / order.paid events.
+    """
+    razorpay_payment_id = razorpay_payment_id or 'pay_mock' + uuid.uuid4().hex[:14]
+    payload = {
+        'entity': 'event',
+        'event': event_type,
+        'contains': ['payment'],
+        'payload': {
+            'payment': {
+                'entity': {
+                    'id': razorpay_payment_id,
+                    'entity': 'payment',
+                    'amount': amount,
+                    'currency': 'INR',
+                    'status': 'failed' if event_type == 'payment.failed' else 'captured',
+                    'order_id': razorpay_order_id,
+                },
+            },
+        },
+        'created_at': int(time.time()),
+    }
+    body = json.dumps(payload)
+    headers = {
+        'X-Razorpay-Signature': _hmac_hex(secret or settings.RAZORPAY_WEBHOOK_SECRET, body),
+        'X-Razorpay-Event-Id': 'evt_mock' + uuid.uuid4().hex[:14],
+    }
+    return body, headers
@@ -33,14 +33,68 @@ class WalletTransaction(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.CharField(max_length=255, blank=True, null=True)
     order = models.ForeignKey('orders.Order', on_delete=models.SET_NULL, null=True, blank=True, related_name='wallet_transactions')
+    # Set on per-item refunds so an item's credit is found without scanning descriptions
+    order_item = models.ForeignKey('orders.OrderItem', on_delete=models.SET_NULL, null=True, blank=True, related_name='wallet_transactions')
     status = models.CharField(max_length=10, choices=TRANSACTION_STATUS, default="Pending")
     transaction_id = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'transaction_type', 'status'], name='wallet_txn_order_type_idx'),
+            models.Index(fields=['wallet', 'created_at'], name='wallet_txn_wallet_date_idx'),
+            models.Index(fields=['created_at'], name='wallet_txn_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.transaction_type.capitalize()} - {self.amount}"
 
 
+class WalletLedgerTotals(models.Model):
+    """
+    Running count and amount of wallet transactions per type and status.
+
+    Bumped in the same database transaction as every WalletTransaction
+    insert (see wallet.ledger_utils), so the admin summary reads six rows
+    instead of summing the whole ledger. reconcile_wallet_totals rebuilds it.
+    """
+    transaction_type = models.CharField(max_length=10, choices=WalletTransaction.TRANSACTION_TYPES)
+    status = models.CharField(max_length=10, choices=WalletTransaction.TRANSACTION_STATUS)
+    count = models.PositiveBigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['transaction_type', 'status'], name='wallet_totals_type_status_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} {self.status}: {self.count} / {self.amount}"
+
+
+class WalletBalanceSnapshot(models.Model):
+    """
+    A wallet's balance at local midnight on the first of a month, from its
+    Completed transactions. Written by snapshot_wallet_balances for wallets
+    that moved in the month before; a statement starts from the latest
+    snapshot and scans only the transactions after it.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='balance_snapshots')
+    period_start = models.DateField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'period_start'], name='wallet_snapshot_period_uniq'),
+        ]
+        indexes = [models.Index(fields=['period_start'], name='wallet_snapshot_period_idx')]
+
+    def __str__(self):
+        return f"Wallet {self.wallet_id} on {self.period_start}: {self.balance}"
+
+
 class WalletTopup(models.Model):
     """Store pending wallet top-up requests for Razorpay verification"""
     STATUS_CHOICES = [
@@ -62,6 +116,33 @@ class WalletTopup(models.Model):
         return f"Topup {self.razorpay_order_id} - ₹{self.amount} - {self.status}"
 
 
+class RazorpayWebhookEvent(models.Model):
+    """Durable inbox of verified Razorpay webhook deliveries, applied by process_webhook_events"""
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Processed', 'Processed'),
+        ('Ignored', 'Ignored'),
+        ('Failed', 'Failed'),
+    ]
+
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'received_at'], name='webhook_event_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} - {self.status}"
+
+
 class Offer(models.Model):
     OFFER_TYPES = [
         ('Product', 'Product'),
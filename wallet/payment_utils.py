@@ -0,0 +1,41 @@
+import time, uuid, logging
+
+from django.db import transaction
+
+from .ledger_utils import credit_wallet
+from .models import Wallet, WalletTopup
+
+logger = logging.getLogger(__name__)
+
+
+def complete_wallet_topup(topup, razorpay_payment_id, razorpay_signature=None):
+    """
+    Credit a verified top-up to the user's wallet exactly once.
+
+    Shared by verify_wallet_payment and the webhook worker; the top-up row is
+    locked so whichever arrives second sees it Completed and does nothing.
+    Returns True when this call credited the wallet.
+    """
+    with transaction.atomic():
+        topup = WalletTopup.objects.select_for_update().get(pk=topup.pk)
+        if topup.status == 'Completed':
+            return False
+
+        wallet, _ = Wallet.objects.get_or_create(user=topup.user)
+        credit_wallet(
+            wallet, topup.amount, 'Wallet Topup via Razorpay',
+            transaction_id="TXN-" + str(int(time.time())) + uuid.uuid4().hex[:4].upper(),
+        )
+
+        topup.status = 'Completed'
+        topup.razorpay_payment_id = razorpay_payment_id
+        if razorpay_signature:
+            topup.razorpay_signature = razorpay_signature
+        topup.save()
+    logger.info(f"Wallet topup {topup.razorpay_order_id} credited ₹{topup.amount}")
+    return True
+
+
+def fail_wallet_topup(topup):
+    """Mark a pending top-up as failed; completed top-ups are left alone"""
+    return WalletTopup.objects.filter(pk=topup.pk, status='Pending').update(status='Failed')
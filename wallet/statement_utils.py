@@ -0,0 +1,179 @@
+"""
+Wallet statements from monthly balance checkpoints.
+
+snapshot_wallet_balances writes, on the first of each month, the opening
+balance of every wallet that moved in the month before:
+    opening(M) = opening(previous checkpoint) + net of month M-1
+A wallet with no checkpoint for a month had no Completed transaction in
+the month before it, so the latest checkpoint at or before a date plus
+the transactions after that checkpoint give the balance at the date. A
+statement for any period therefore reads one checkpoint and scans at most
+a month of transactions before the period, plus the period itself.
+"""
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, When
+from django.utils import timezone
+
+from .models import Wallet, WalletTransaction, WalletBalanceSnapshot
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+MAX_STATEMENT_DAYS = 366
+
+NET_AMOUNT = Sum(
+    Case(
+        When(transaction_type='Cr', then=F('amount')),
+        default=-F('amount'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def local_midnight(day):
+    """Aware datetime of local midnight starting `day`"""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _completed(wallet_id=None):
+    txns = WalletTransaction.objects.filter(status='Completed')
+    return txns.filter(wallet_id=wallet_id) if wallet_id is not None else txns
+
+
+def snapshot_month(period_start, batch_size=1000):
+    """
+    Write the checkpoints for `period_start` (a first of month) for every
+    wallet with Completed transactions in the month before. Needs the
+    previous months' checkpoints; build_balance_snapshots runs months in
+    order. Returns the number of checkpoints written.
+    """
+    prev_start = month_start(period_start - timedelta(days=1))
+    moved = dict(
+        _completed()
+        .filter(created_at__gte=local_midnight(prev_start), created_at__lt=local_midnight(period_start))
+        .values('wallet_id').annotate(net=NET_AMOUNT).order_by()
+        .values_list('wallet_id', 'net')
+    )
+    wallet_ids = sorted(moved)
+    with transaction.atomic():
+        WalletBalanceSnapshot.objects.filter(period_start=period_start).delete()
+        for offset in range(0, len(wallet_ids), batch_size):
+            batch = wallet_ids[offset:offset + batch_size]
+            previous = (
+                WalletBalanceSnapshot.objects
+                .filter(wallet=OuterRef('pk'), period_start__lte=prev_start)
+                .order_by('-period_start').values('balance')[:1]
+            )
+            openings = Wallet.objects.filter(id__in=batch).annotate(base=Subquery(previous)).values_list('id', 'base')
+            WalletBalanceSnapshot.objects.bulk_create([
+                WalletBalanceSnapshot(wallet_id=wallet_id, period_start=period_start, balance=(base or ZERO) + moved[wallet_id])
+                for wallet_id, base in openings
+            ])
+    return len(wallet_ids)
+
+
+def build_balance_snapshots(through=None, rebuild=False):
+    """
+    Write every missing monthly checkpoint up to the first of `through`'s
+    month (default today), oldest first. `rebuild` starts again from the
+    first transaction. Returns (months processed, checkpoints written).
+    """
+    through = month_start(through or timezone.localdate())
+    first = WalletTransaction.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    if first is None:
+        return 0, 0
+    start = next_month(month_start(timezone.localtime(first).date()))
+    if rebuild:
+        WalletBalanceSnapshot.objects.all().delete()
+    else:
+        last = WalletBalanceSnapshot.objects.order_by('-period_start').values_list('period_start', flat=True).first()
+        if last:
+            # months after the last checkpoint may have written nothing; redoing them is cheap
+            start = max(start, next_month(last))
+
+    months = written = 0
+    period = start
+    while period <= through:
+        written += snapshot_month(period)
+        months += 1
+        period = next_month(period)
+    if months:
+        logger.info(f"Wallet balance checkpoints: {months} month(s), {written} row(s), through {through}")
+    return months, written
+
+
+def balance_at(wallet, day):
+    """Balance of `wallet` at local midnight starting `day`, from Completed transactions"""
+    snapshot = (
+        WalletBalanceSnapshot.objects.filter(wallet=wallet, period_start__lte=day)
+        .order_by('-period_start').values_list('period_start', 'balance').first()
+    )
+    txns = _completed(wallet.pk).filter(created_at__lt=local_midnight(day))
+    base = ZERO
+    if snapshot:
+        txns = txns.filter(created_at__gte=local_midnight(snapshot[0]))
+        base = snapshot[1]
+    return base + (txns.aggregate(net=NET_AMOUNT)['net'] or ZERO)
+
+
+def wallet_statement(wallet, start, end):
+    """Opening and closing balance, credits, debits and transaction count for start..end (inclusive)"""
+    opening = balance_at(wallet, start)
+    totals = WalletTransaction.objects.filter(
+        wallet=wallet, created_at__gte=local_midnight(start), created_at__lt=local_midnight(end + timedelta(days=1)),
+    ).aggregate(
+        credits=Sum('amount', filter=Q(status='Completed', transaction_type='Cr')),
+        debits=Sum('amount', filter=Q(status='Completed', transaction_type='Dr')),
+        count=Count('id'),
+    )
+    opening = opening.quantize(CENT)
+    credits, debits = (totals['credits'] or ZERO).quantize(CENT), (totals['debits'] or ZERO).quantize(CENT)
+    return {
+        'start': start,
+        'end': end,
+        'opening': opening,
+        'credits': credits,
+        'debits': debits,
+        'closing': opening + credits - debits,
+        'count': totals['count'],
+    }
+
+
+def statement_rows(wallet, statement):
+    """
+    (date, transaction id, description, type, amount, status, balance after)
+    for each transaction of the statement, oldest first. Only Completed
+    transactions move the running balance.
+    """
+    balance = statement['opening']
+    rows = (
+        WalletTransaction.objects.filter(
+            wallet=wallet,
+            created_at__gte=local_midnight(statement['start']),
+            created_at__lt=local_midnight(statement['end'] + timedelta(days=1)),
+        )
+        .order_by('created_at', 'id')
+        .values_list('created_at', 'transaction_id', 'description', 'transaction_type', 'amount', 'status')
+        .iterator(chunk_size=500)
+    )
+    for created_at, txn_id, description, txn_type, amount, status in rows:
+        if status == 'Completed':
+            balance += amount if txn_type == 'Cr' else -amount
+        yield (
+            timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M'), txn_id or '', description or '',
+            'Credit' if txn_type == 'Cr' else 'Debit', amount, status, balance,
+        )
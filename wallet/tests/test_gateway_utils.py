@@ -0,0 +1,99 @@
+import time
+from unittest import mock
+
+import razorpay
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from wallet.gateway_utils import (
+    BREAKER_FAILURES_KEY, BREAKER_OPEN_UNTIL_KEY, GatewayUnavailable, build_gateway_session, call_gateway,
+)
+
+
+@override_settings(RAZORPAY_BREAKER_THRESHOLD=3, RAZORPAY_BREAKER_COOLDOWN=30)
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.gateway = mock.Mock(side_effect=requests.exceptions.ConnectTimeout('connect timed out'))
+
+    def call(self):
+        return call_gateway('order.create', self.gateway, {'amount': 100})
+
+    def fail(self, times):
+        for _ in range(times):
+            with self.assertRaises(GatewayUnavailable):
+                self.call()
+
+    def after_cooldown(self):
+        return mock.patch('time.time', return_value=time.time() + 31)
+
+    def test_opens_after_threshold_failures(self):
+        with self.assertLogs('wallet.gateway_utils', 'WARNING'):
+            self.fail(2)
+        self.assertIsNone(cache.get(BREAKER_OPEN_UNTIL_KEY))
+        self.assertEqual(cache.get(BREAKER_FAILURES_KEY), 2)
+
+        with self.assertLogs('wallet.gateway_utils', 'ERROR') as logs:
+            self.fail(1)
+        self.assertIn('circuit opened after 3 failures', logs.output[-1])
+        self.assertIsNotNone(cache.get(BREAKER_OPEN_UNTIL_KEY))
+        self.assertIsNone(cache.get(BREAKER_FAILURES_KEY))
+
+    def test_calls_are_rejected_without_reaching_the_gateway_while_open(self):
+        with self.assertLogs('wallet.gateway_utils', 'WARNING'):
+            self.fail(3)
+            self.gateway.reset_mock()
+            self.gateway.side_effect = None
+            self.fail(2)
+        self.gateway.assert_not_called()
+
+    def test_success_resets_the_failure_count(self):
+        with self.assertLogs('wallet.gateway_utils', 'WARNING'):
+            self.fail(2)
+            self.gateway.side_effect = None
+            self.call()
+            self.gateway.side_effect = razorpay.errors.ServerError('502')
+            self.fail(2)
+        self.assertIsNone(cache.get(BREAKER_OPEN_UNTIL_KEY))
+
+    def test_bad_request_does_not_count_as_a_gateway_failure(self):
+        self.gateway.side_effect = razorpay.errors.BadRequestError('amount missing')
+        with self.assertLogs('wallet.gateway_utils', 'WARNING'):
+            for _ in range(3):
+                with self.assertRaises(razorpay.errors.BadRequestError):
+                    self.call()
+        self.assertIsNone(cache.get(BREAKER_OPEN_UNTIL_KEY))
+
+    def test_half_open_after_cooldown_closes_on_success(self):
+        with self.assertLogs('wallet.gateway_utils', 'WARNING'):
+            self.fail(3)
+        self.gateway.side_effect = None
+        self.gateway.return_value = {'id': 'order_1'}
+        with self.after_cooldown():
+            self.assertEqual(self.call(), {'id': 'order_1'})
+        self.assertEqual(self.gateway.call_count, 4)
+        self.assertIsNone(cache.get(BREAKER_OPEN_UNTIL_KEY))
+        self.assertEqual(self.call(), {'id': 'order_1'})
+
+    def test_half_open_trial_failure_counts_towards_reopening(self):
+        with self.assertLogs('wallet.gateway_utils', 'WARNING'):
+            self.fail(3)
+        with self.after_cooldown(), self.assertLogs('wallet.gateway_utils', 'WARNING'):
+            self.fail(1)
+            self.assertEqual(self.gateway.call_count, 4)
+            self.assertEqual(cache.get(BREAKER_FAILURES_KEY), 1)
+            self.fail(2)
+            self.assertIsNotNone(cache.get(BREAKER_OPEN_UNTIL_KEY))
+
+
+@override_settings(RAZORPAY_CONNECT_TIMEOUT=2, RAZORPAY_READ_TIMEOUT=8, RAZORPAY_MAX_RETRIES=2)
+class GatewaySessionTests(SimpleTestCase):
+
+    def test_only_connect_failures_are_retried(self):
+        session = build_gateway_session()
+        self.assertEqual(session.timeout, (2, 8))
+        retry = session.get_adapter('https://api.razorpay.com').max_retries
+        self.assertEqual((retry.total, retry.connect, retry.read, retry.status), (2, 2, 0, 0))
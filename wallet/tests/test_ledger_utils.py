@@ -0,0 +1,146 @@
+import threading
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from users.models import CustomUser
+from wallet.ledger_utils import (
+    InsufficientWalletBalance, credit_wallet, debit_wallet, get_ledger_totals,
+    reconcile_ledger_totals, record_wallet_transactions,
+)
+from wallet.models import Wallet, WalletTransaction
+
+
+def make_wallet(email, balance='0'):
+    user = CustomUser.objects.create_user(username=email, email=email, password=None, name='Ledger Test')
+    return Wallet.objects.create(user=user, balance=Decimal(balance))
+
+
+class WalletLedgerTests(TestCase):
+
+    def setUp(self):
+        self.wallet = make_wallet('ledger@example.com', '100.00')
+
+    def balance(self, wallet=None):
+        return Wallet.objects.get(pk=(wallet or self.wallet).pk).balance
+
+    def test_credit_and_debit_move_the_balance_with_the_transaction(self):
+        credit_wallet(self.wallet, Decimal('25.50'), 'Refund')
+        txn = debit_wallet(self.wallet, Decimal('40.00'), 'Payment')
+        self.assertEqual(self.balance(), Decimal('85.50'))
+        self.assertIsNotNone(txn.pk)
+        self.assertEqual(WalletTransaction.objects.filter(wallet=self.wallet, status='Completed').count(), 2)
+
+    def test_debit_beyond_balance_is_rejected_and_changes_nothing(self):
+        with self.assertRaises(InsufficientWalletBalance):
+            debit_wallet(self.wallet, Decimal('100.01'), 'Payment')
+        self.assertEqual(self.balance(), Decimal('100.00'))
+        self.assertFalse(WalletTransaction.objects.filter(wallet=self.wallet).exists())
+
+    def test_debit_of_exact_balance_leaves_zero(self):
+        debit_wallet(self.wallet, Decimal('100.00'), 'Payment')
+        self.assertEqual(self.balance(), Decimal('0.00'))
+
+    def test_batch_is_all_or_nothing(self):
+        other = make_wallet('other@example.com', '10.00')
+        with self.assertRaises(InsufficientWalletBalance):
+            record_wallet_transactions([
+                WalletTransaction(wallet=self.wallet, transaction_type='Cr', amount=Decimal('5'), status='Completed'),
+                WalletTransaction(wallet=other, transaction_type='Dr', amount=Decimal('20'), status='Completed'),
+            ])
+        self.assertEqual(self.balance(), Decimal('100.00'))
+        self.assertEqual(self.balance(other), Decimal('10.00'))
+        self.assertFalse(WalletTransaction.objects.exists())
+
+    def test_pending_and_failed_transactions_leave_the_balance_alone(self):
+        record_wallet_transactions([
+            WalletTransaction(wallet=self.wallet, transaction_type='Cr', amount=Decimal('5'), status='Pending'),
+            WalletTransaction(wallet=self.wallet, transaction_type='Dr', amount=Decimal('500'), status='Failed'),
+        ])
+        self.assertEqual(self.balance(), Decimal('100.00'))
+
+    def test_outer_rollback_undoes_balance_and_totals(self):
+        before = get_ledger_totals()
+        with transaction.atomic():
+            credit_wallet(self.wallet, Decimal('30'), 'Refund')
+            transaction.set_rollback(True)
+        self.assertEqual(self.balance(), Decimal('100.00'))
+        self.assertEqual(get_ledger_totals(), before)
+
+    def test_totals_follow_every_insert(self):
+        before = get_ledger_totals()
+        credit_wallet(self.wallet, Decimal('30'), 'Refund')
+        debit_wallet(self.wallet, Decimal('12.25'), 'Payment')
+        after = get_ledger_totals()
+        self.assertEqual(after['credits'] - before['credits'], Decimal('30'))
+        self.assertEqual(after['debits'] - before['debits'], Decimal('12.25'))
+        self.assertEqual(after['count'] - before['count'], 2)
+        self.assertEqual(reconcile_ledger_totals(fix=False), [])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class WalletLedgerConcurrencyTests(TransactionTestCase):
+    """
+    Many threads, each on its own connection, hammering one wallet. Needs a
+    database with row locking (MySQL in production); SQLite locks the whole
+    file and is skipped.
+    """
+    THREADS = 8
+    ROUNDS = 25
+
+    def run_threads(self, work):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def worker(n):
+            try:
+                barrier.wait()
+                for i in range(self.ROUNDS):
+                    work(n, i)
+            except Exception as e:  # surfaced by the assertion below
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_debits_never_overdraw(self):
+        wallet = make_wallet('race@example.com', '50.00')
+        succeeded = []
+
+        def work(n, i):
+            try:
+                debit_wallet(wallet, Decimal('1.00'), f'Payment {n}-{i}')
+                succeeded.append(1)
+            except InsufficientWalletBalance:
+                pass
+
+        self.run_threads(work)
+        self.assertEqual(len(succeeded), 50)
+        self.assertEqual(Wallet.objects.get(pk=wallet.pk).balance, Decimal('0.00'))
+        self.assertEqual(WalletTransaction.objects.filter(wallet=wallet).count(), 50)
+
+    def test_concurrent_credits_and_debits_lose_no_update(self):
+        wallet = make_wallet('mixed@example.com', '1000.00')
+        other = make_wallet('mixed-other@example.com', '1000.00')
+
+        def work(n, i):
+            # alternate the pair so batches touch the two wallets in both orders
+            first, second = (wallet, other) if (n + i) % 2 else (other, wallet)
+            record_wallet_transactions([
+                WalletTransaction(wallet=first, transaction_type='Cr', amount=Decimal('3.00'), status='Completed'),
+                WalletTransaction(wallet=second, transaction_type='Dr', amount=Decimal('2.00'), status='Completed'),
+            ])
+
+        self.run_threads(work)
+        runs = self.THREADS * self.ROUNDS
+        total = Wallet.objects.filter(pk__in=[wallet.pk, other.pk]).values_list('balance', flat=True)
+        self.assertEqual(sum(total), Decimal('2000.00') + runs * Decimal('1.00'))
+        self.assertEqual(WalletTransaction.objects.count(), runs * 2)
+        self.assertEqual(reconcile_ledger_totals(fix=False), [])
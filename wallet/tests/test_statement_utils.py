@@ -0,0 +1,100 @@
+import csv
+import io
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import CustomUser
+from wallet.ledger_utils import credit_wallet, debit_wallet, record_wallet_transactions
+from wallet.models import Wallet, WalletBalanceSnapshot, WalletTransaction
+from wallet.statement_utils import balance_at, build_balance_snapshots, wallet_statement
+
+
+def at(day, hour=12):
+    return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+class WalletStatementTests(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='statement@example.com', email='statement@example.com', password=None, name='Statement Test',
+        )
+        self.wallet = Wallet.objects.create(user=self.user)
+        self.post(credit_wallet, '500.00', date(2025, 8, 10))
+        self.post(debit_wallet, '120.00', date(2025, 8, 20))
+        failed = record_wallet_transactions([WalletTransaction(
+            wallet=self.wallet, transaction_type='Cr', amount=Decimal('999.00'), status='Failed', description='Top-up',
+        )])[0]
+        WalletTransaction.objects.filter(pk=failed.pk).update(created_at=at(date(2025, 8, 25)))
+        self.post(credit_wallet, '200.00', date(2025, 9, 5))
+        # the last second of September still belongs to September
+        self.post(debit_wallet, '50.00', date(2025, 9, 30), hour=23)
+        self.post(credit_wallet, '30.00', date(2025, 10, 3))
+
+    def post(self, apply, amount, day, hour=12):
+        txn = apply(self.wallet, Decimal(amount), 'Statement test')
+        WalletTransaction.objects.filter(pk=txn.pk).update(created_at=at(day, hour))
+
+    def ledger_balance(self, day):
+        """Balance at local midnight starting `day`, summed from every Completed transaction"""
+        balance = Decimal('0')
+        for txn in WalletTransaction.objects.filter(wallet=self.wallet, status='Completed', created_at__lt=at(day, 0)):
+            balance += txn.amount if txn.transaction_type == 'Cr' else -txn.amount
+        return balance
+
+    def assert_matches_ledger(self, start, end):
+        statement = wallet_statement(self.wallet, start, end)
+        self.assertEqual(statement['opening'], self.ledger_balance(start))
+        self.assertEqual(statement['closing'], self.ledger_balance(date.fromordinal(end.toordinal() + 1)))
+        return statement
+
+    def test_statement_without_checkpoints(self):
+        self.assertFalse(WalletBalanceSnapshot.objects.exists())
+        statement = self.assert_matches_ledger(date(2025, 9, 1), date(2025, 9, 30))
+        self.assertEqual(
+            (statement['opening'], statement['credits'], statement['debits'], statement['closing']),
+            (Decimal('380.00'), Decimal('200.00'), Decimal('50.00'), Decimal('530.00')),
+        )
+        self.assert_matches_ledger(date(2025, 9, 10), date(2025, 10, 5))
+
+    def test_statement_with_monthly_checkpoints(self):
+        self.assertEqual(build_balance_snapshots(through=date(2025, 11, 1)), (3, 3))
+        self.assertEqual(
+            dict(WalletBalanceSnapshot.objects.values_list('period_start', 'balance')),
+            {date(2025, 9, 1): Decimal('380.00'), date(2025, 10, 1): Decimal('530.00'), date(2025, 11, 1): Decimal('560.00')},
+        )
+        for start, end in [
+            (date(2025, 9, 1), date(2025, 9, 30)),
+            (date(2025, 9, 10), date(2025, 10, 5)),
+            (date(2025, 10, 1), date(2025, 11, 20)),
+            (date(2025, 8, 1), date(2025, 8, 31)),
+        ]:
+            self.assert_matches_ledger(start, end)
+        self.assertEqual(balance_at(self.wallet, date(2025, 12, 1)), Wallet.objects.get(pk=self.wallet.pk).balance)
+
+    def test_checkpoint_is_read_instead_of_older_transactions(self):
+        build_balance_snapshots(through=date(2025, 10, 1))
+        # an adjusted checkpoint shows up in the opening balance, so it is the starting point
+        WalletBalanceSnapshot.objects.filter(period_start=date(2025, 10, 1)).update(balance=Decimal('1000.00'))
+        self.assertEqual(balance_at(self.wallet, date(2025, 10, 10)), Decimal('1030.00'))
+
+    def test_rerun_writes_only_missing_months(self):
+        build_balance_snapshots(through=date(2025, 10, 1))
+        self.assertEqual(build_balance_snapshots(through=date(2025, 10, 1)), (0, 0))
+        self.assertEqual(build_balance_snapshots(through=date(2025, 11, 1)), (1, 1))
+        self.assertEqual(WalletBalanceSnapshot.objects.count(), 3)
+
+    def test_csv_download_opens_and_closes_with_the_ledger(self):
+        build_balance_snapshots(through=date(2025, 10, 1))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('download_wallet_statement'), {'month': '2025-09', 'format': 'csv'})
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[1][2], 'Opening balance')
+        self.assertEqual(Decimal(rows[1][6]), self.ledger_balance(date(2025, 9, 1)))
+        self.assertEqual(rows[-1][2], 'Closing balance')
+        self.assertEqual(Decimal(rows[-1][6]), self.ledger_balance(date(2025, 10, 1)))
+        self.assertEqual(Decimal(rows[-2][6]), Decimal(rows[-1][6]))
@@ -0,0 +1,116 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+
+from orders.models import Order
+from orders.payment_utils import mark_order_paid, mark_order_payment_failed
+from orders.stock_utils import reserve_stock
+from orders.tests.helpers import make_order, make_user, make_variant
+from product.models import ProductVariant
+from wallet.mock_gateway import build_webhook
+from wallet.models import RazorpayWebhookEvent, Wallet, WalletTopup
+from wallet.webhook_utils import process_pending_webhook_events
+
+
+class WebhookTestCase(TestCase):
+
+    def deliver(self, event_type, razorpay_order_id, signature=None, event_id=None, **kwargs):
+        body, headers = build_webhook(event_type, razorpay_order_id, **kwargs)
+        return self.client.post(
+            reverse('razorpay_webhook'), body, content_type='application/json',
+            HTTP_X_RAZORPAY_SIGNATURE=headers['X-Razorpay-Signature'] if signature is None else signature,
+            HTTP_X_RAZORPAY_EVENT_ID=event_id or headers['X-Razorpay-Event-Id'],
+        )
+
+
+class WebhookInboxTests(WebhookTestCase):
+
+    def test_invalid_signature_is_rejected_and_not_stored(self):
+        with self.assertLogs('wallet.views', 'WARNING'):
+            response = self.deliver('payment.captured', 'order_x', signature='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(RazorpayWebhookEvent.objects.exists())
+
+    def test_missing_signature_is_rejected(self):
+        with self.assertLogs('wallet.views', 'WARNING'):
+            response = self.deliver('payment.captured', 'order_x', signature='')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(RazorpayWebhookEvent.objects.exists())
+
+    def test_body_signed_with_another_secret_is_rejected(self):
+        body, headers = build_webhook('payment.captured', 'order_x', secret='not-our-secret')
+        with self.assertLogs('wallet.views', 'WARNING'):
+            response = self.client.post(
+                reverse('razorpay_webhook'), body, content_type='application/json',
+                HTTP_X_RAZORPAY_SIGNATURE=headers['X-Razorpay-Signature'],
+            )
+        self.assertEqual(response.status_code, 400)
+
+    def test_redelivered_event_id_is_stored_once(self):
+        first = self.deliver('payment.captured', 'order_x', event_id='evt_1', razorpay_payment_id='pay_1')
+        second = self.deliver('payment.captured', 'order_x', event_id='evt_1', razorpay_payment_id='pay_1')
+        self.assertEqual(first.json()['status'], 'received')
+        self.assertEqual(second.json()['status'], 'duplicate')
+        self.assertEqual(RazorpayWebhookEvent.objects.count(), 1)
+
+
+class WebhookWorkerTests(WebhookTestCase):
+
+    def setUp(self):
+        self.user = make_user()
+        self.variant = make_variant(quantity=3)
+        self.order = make_order(self.user, [(self.variant, 2)], 'RP', item_payment_status='Pending')
+        Order.objects.filter(pk=self.order.pk).update(razorpay_order_id='order_rp1')
+        reserve_stock(self.order, [(self.variant, 2)])
+
+    def on_hand(self):
+        return ProductVariant.objects.get(pk=self.variant.pk).quantity
+
+    def test_captured_payment_is_applied_once(self):
+        self.deliver('payment.captured', 'order_rp1', razorpay_payment_id='pay_1')
+        self.deliver('order.paid', 'order_rp1', razorpay_payment_id='pay_1')
+        with mock.patch('wallet.webhook_utils.mark_order_paid', wraps=mark_order_paid) as paid:
+            self.assertEqual(process_pending_webhook_events(), 2)
+            self.assertEqual(process_pending_webhook_events(), 0)
+        self.assertEqual(paid.call_count, 2)
+
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertTrue(order.payment_status)
+        self.assertEqual(order.razorpay_payment_id, 'pay_1')
+        self.assertEqual(list(order.items.values_list('status', 'item_payment_status')), [('Processing', 'Paid')])
+        self.assertEqual(self.on_hand(), 1)
+        self.assertEqual(set(RazorpayWebhookEvent.objects.values_list('status', flat=True)), {'Processed'})
+
+    def test_failed_payment_releases_the_hold(self):
+        self.deliver('payment.failed', 'order_rp1')
+        with mock.patch('wallet.webhook_utils.mark_order_payment_failed', wraps=mark_order_payment_failed) as failed:
+            process_pending_webhook_events()
+            process_pending_webhook_events()
+        failed.assert_called_once()
+        self.assertEqual(list(self.order.items.values_list('status', flat=True)), ['Payment_Failed'])
+        self.assertEqual(self.order.reservations.get().status, 'Released')
+        self.assertEqual(self.on_hand(), 3)
+
+    def test_late_failure_after_capture_is_ignored(self):
+        self.deliver('payment.captured', 'order_rp1', razorpay_payment_id='pay_1')
+        self.deliver('payment.failed', 'order_rp1', razorpay_payment_id='pay_0')
+        process_pending_webhook_events()
+        self.assertEqual(list(self.order.items.values_list('status', flat=True)), ['Processing'])
+        self.assertEqual(self.on_hand(), 1)
+
+    def test_captured_topup_credits_the_wallet_once(self):
+        topup = WalletTopup.objects.create(user=self.user, razorpay_order_id='order_top1', amount=Decimal('250.00'))
+        self.deliver('payment.captured', 'order_top1', razorpay_payment_id='pay_t1')
+        self.deliver('order.paid', 'order_top1', razorpay_payment_id='pay_t1')
+        process_pending_webhook_events()
+        topup.refresh_from_db()
+        self.assertEqual(topup.status, 'Completed')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('250.00'))
+
+    def test_unknown_order_is_ignored(self):
+        self.deliver('payment.captured', 'order_unknown')
+        with self.assertLogs('wallet.webhook_utils', 'WARNING'):
+            process_pending_webhook_events()
+        self.assertEqual(RazorpayWebhookEvent.objects.get().status, 'Ignored')
@@ -4,6 +4,7 @@ from . import views
 
 urlpatterns = [
     path('', views.wallet_view, name='wallet'),
+    path('statement/', views.download_wallet_statement, name='download_wallet_statement'),
     path('offer-management/', views.offer_management, name='offer_management'),
     path('edit-offer/<int:offer_id>/', views.edit_offer, name='edit_offer'),
     path('add-offer/', views.add_offer, name='add_offer'),
@@ -11,4 +12,5 @@ urlpatterns = [
     path('delete-offer/<int:offer_id>/', views.delete_offer, name='delete_offer'),
     path('add-money/', views.add_money, name='add_money'),
     path('verify-wallet-payment/', views.verify_wallet_payment, name='verify_wallet_payment'),
+    path('razorpay/webhook/', views.razorpay_webhook, name='razorpay_webhook'),
 ]
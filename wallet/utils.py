@@ -1,6 +1,15 @@
 import razorpay
 from django.conf import settings
 
-razorpay_client = razorpay.Client(
-    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-)
+from .gateway_utils import build_gateway_session
+
+if settings.RAZORPAY_MOCK:
+    from .mock_gateway import MockRazorpayClient
+    razorpay_client = MockRazorpayClient(
+        auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+    )
+else:
+    razorpay_client = razorpay.Client(
+        session=build_gateway_session(),
+        auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+    )
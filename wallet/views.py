@@ -10,18 +10,28 @@ from django.core.mail import send_mail
 from django.utils.html import strip_tags
 from django.utils import timezone
 from django.urls import reverse
-from datetime import timedelta
+from datetime import datetime, timedelta
+from itertools import chain
 import random, uuid, time, json, logging
 from product.models import Product
 from category.models import Category
 from django.conf import settings
 from utils.decorators import admin_required
-from .models import Wallet, WalletTransaction, Offer, WalletTopup
+from .models import Wallet, WalletTransaction, Offer, WalletTopup, RazorpayWebhookEvent
+from .payment_utils import complete_wallet_topup, fail_wallet_topup
+from .gateway_utils import create_gateway_order, GatewayUnavailable
+from .statement_utils import (
+    MAX_STATEMENT_DAYS, month_start, next_month, statement_rows, wallet_statement,
+)
+from admin.export_utils import export_response
+from admin.report_utils import render_wallet_statement_pdf
 from django.views.decorators.csrf import csrf_exempt
 
 
 logger = logging.getLogger(__name__)
 
+STATEMENT_COLUMNS = ['date', 'transaction_id', 'description', 'type', 'amount', 'status', 'balance']
+
 @login_required
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
 def wallet_view(request):
@@ -44,10 +54,16 @@ def wallet_view(request):
         except EmptyPage:
             transactions = paginator.page(paginator.num_pages)
 
+        # This month so far, from the month's checkpoint
+        today = timezone.localdate()
+        statement = wallet_statement(wallet, month_start(today), today)
+
         data = {
             'wallet': wallet,
             'transactions': transactions,
             'search_query': search_query,
+            'statement': statement,
+            'statement_months': _statement_months(today),
         }
     except Exception as e:
         logger.error(f"Error in wallet_view for user {request.user.id}: {e}")
@@ -60,13 +76,63 @@ def wallet_view(request):
     return render(request, 'wallet.html', data)
 
 
+def _statement_months(today, count=12):
+    """[(YYYY-MM, 'Mon YYYY')] for this month and the ones before it, newest first"""
+    months = []
+    month = month_start(today)
+    for _ in range(count):
+        months.append((month.strftime('%Y-%m'), month.strftime('%b %Y')))
+        month = month_start(month - timedelta(days=1))
+    return months
+
+
+def _statement_period(request, today):
+    """(start, end) from ?month=YYYY-MM or ?start=&end=YYYY-MM-DD, or None if invalid"""
+    try:
+        if request.GET.get('start') or request.GET.get('end'):
+            start = datetime.strptime(request.GET.get('start', ''), '%Y-%m-%d').date()
+            end = datetime.strptime(request.GET.get('end', ''), '%Y-%m-%d').date()
+        else:
+            start = datetime.strptime(request.GET.get('month', today.strftime('%Y-%m')), '%Y-%m').date()
+            end = next_month(start) - timedelta(days=1)
+    except ValueError:
+        return None
+    end = min(end, today)
+    if start > end or (end - start).days >= MAX_STATEMENT_DAYS:
+        return None
+    return start, end
+
+
+@login_required
+def download_wallet_statement(request):
+    """The user's wallet statement for a month or date range, as PDF or CSV"""
+    period = _statement_period(request, timezone.localdate())
+    if period is None:
+        messages.error(request, f"Choose a statement period of up to {MAX_STATEMENT_DAYS} days that has started.")
+        return redirect('wallet')
+
+    wallet, _ = Wallet.objects.get_or_create(user=request.user)
+    statement = wallet_statement(wallet, *period)
+    rows = statement_rows(wallet, statement)
+    filename = f"Walkoria_Wallet_Statement_{period[0]:%Y%m%d}_{period[1]:%Y%m%d}"
+
+    if request.GET.get('format') == 'csv':
+        opening = ('', '', 'Opening balance', '', '', '', statement['opening'])
+        closing = ('', '', 'Closing balance', '', '', '', statement['closing'])
+        return export_response('csv', filename, STATEMENT_COLUMNS, chain([opening], rows, [closing]))
+
+    response = HttpResponse(content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
+    render_wallet_statement_pdf(response, request.user, statement, rows)
+    return response
+
+
 
 @login_required
 def add_money(request):
     """Create Razorpay order for adding money to wallet"""
     if request.method == 'POST':
         try:
-            from .utils import razorpay_client
             data = json.loads(request.body)
             amount = int(data.get('amount', 0))
             
@@ -76,7 +142,7 @@ def add_money(request):
                 return JsonResponse({'error': 'Amount cannot exceed ₹20,000'}, status=400)
             
             # Create Razorpay order
-            razorpay_order = razorpay_client.order.create({
+            razorpay_order = create_gateway_order({
                 'amount': amount * 100,  # Razorpay expects paise
                 'currency': 'INR',
                 'payment_capture': 1
@@ -96,6 +162,8 @@ def add_money(request):
                 'amount': amount * 100,
                 'currency': 'INR'
             })
+        except GatewayUnavailable:
+            return JsonResponse({'error': 'Payment gateway is not responding. Please try again in a minute.'}, status=503)
         except Exception as e:
             logger.error(f"Error creating Razorpay order for wallet: {e}")
             return JsonResponse({'error': 'Failed to create payment order'}, status=500)
@@ -109,7 +177,6 @@ def verify_wallet_payment(request):
         try:
             import razorpay
             from .utils import razorpay_client
-            from django.db import transaction
             
             # Get data from POST (Razorpay callback sends form data)
             razorpay_order_id = request.POST.get('razorpay_order_id')
@@ -146,8 +213,7 @@ def verify_wallet_payment(request):
             try:
                 razorpay_client.utility.verify_payment_signature(params)
             except razorpay.errors.SignatureVerificationError:
-                topup.status = 'Failed'
-                topup.save()
+                fail_wallet_topup(topup)
                 redirect_url = reverse('wallet')
                 return HttpResponse(f'''
                     <html><body>
@@ -164,26 +230,8 @@ def verify_wallet_payment(request):
                 ''')
             
             # Payment verified successfully - add money to wallet
-            with transaction.atomic():
-                wallet, _ = Wallet.objects.get_or_create(user=topup.user)
-                
-                WalletTransaction.objects.create(
-                    wallet=wallet,
-                    amount=topup.amount,
-                    transaction_type='Cr',
-                    status='Completed',
-                    description='Wallet Topup via Razorpay',
-                    transaction_id="TXN-" + str(int(time.time())) + uuid.uuid4().hex[:4].upper()
-                )
-                
-                wallet.balance += topup.amount
-                wallet.save()
-                
-                # Update topup status
-                topup.status = 'Completed'
-                topup.razorpay_payment_id = razorpay_payment_id
-                topup.razorpay_signature = razorpay_signature
-                topup.save()
+            # (no-op if the webhook already credited this top-up)
+            complete_wallet_topup(topup, razorpay_payment_id, razorpay_signature)
             
             # Add success message
             messages.success(request, f'₹{topup.amount} has been added to your wallet successfully!')
@@ -228,6 +276,31 @@ def verify_wallet_payment(request):
 
 
 
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """
+    Receive a Razorpay webhook: verify the signature, store the event in the
+    inbox and return at once. process_webhook_events applies it afterwards.
+    """
+    import razorpay
+    from .webhook_utils import record_webhook_event
+
+    try:
+        event, created = record_webhook_event(
+            request.body,
+            request.headers.get('X-Razorpay-Signature', ''),
+            request.headers.get('X-Razorpay-Event-Id', ''),
+        )
+    except razorpay.errors.SignatureVerificationError:
+        logger.warning("Rejected Razorpay webhook with an invalid signature")
+        return JsonResponse({'error': 'Invalid signature'}, status=400)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+
+    return JsonResponse({'status': 'received' if created else 'duplicate', 'event_id': event.event_id})
+
+
 @login_required
 @admin_required
 @cache_control(no_cache=True, must_revalidate=True, no_store=True)
@@ -0,0 +1,120 @@
+import json, hashlib, logging
+
+import razorpay
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import Order
+from orders.payment_utils import mark_order_paid, mark_order_payment_failed
+from .models import WalletTopup, RazorpayWebhookEvent
+from .payment_utils import complete_wallet_topup, fail_wallet_topup
+
+logger = logging.getLogger(__name__)
+
+PAID_EVENTS = ('payment.captured', 'order.paid')
+FAILED_EVENTS = ('payment.failed',)
+
+
+def record_webhook_event(body, signature, event_id=None):
+    """
+    Verify a webhook delivery and append it to the inbox.
+
+    Razorpay retries deliveries, so the event id (or a hash of the body when
+    the header is missing) is unique and repeats are dropped here.
+    Returns (event, created).
+    """
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    if not secret or not signature:
+        raise razorpay.errors.SignatureVerificationError('Webhook secret or signature missing')
+
+    body_text = body.decode('utf-8') if isinstance(body, bytes) else body
+    from .utils import razorpay_client
+    razorpay_client.utility.verify_webhook_signature(body_text, signature, secret)
+
+    data = json.loads(body_text)
+    event_id = event_id or hashlib.sha256(body_text.encode('utf-8')).hexdigest()
+    return RazorpayWebhookEvent.objects.get_or_create(
+        event_id=event_id[:100],
+        defaults={'event_type': data.get('event', ''), 'payload': data},
+    )
+
+
+def _entity(payload, name):
+    return (payload.get('payload') or {}).get(name, {}).get('entity') or {}
+
+
+def apply_webhook_event(event):
+    """
+    Apply one inbox event to Order/OrderItem or WalletTopup.
+
+    The state changes are the same ones the browser callbacks use, and they
+    are no-ops when the callback got there first. Returns the new status.
+    """
+    if event.event_type not in PAID_EVENTS + FAILED_EVENTS:
+        return 'Ignored'
+
+    payment = _entity(event.payload, 'payment')
+    razorpay_order_id = payment.get('order_id') or _entity(event.payload, 'order').get('id')
+    payment_id = payment.get('id')
+    if not razorpay_order_id:
+        return 'Ignored'
+
+    order = Order.objects.filter(razorpay_order_id=razorpay_order_id).first()
+    topup = None if order else WalletTopup.objects.filter(razorpay_order_id=razorpay_order_id).first()
+    if not order and not topup:
+        logger.warning(f"Webhook {event.event_id}: no order or topup for {razorpay_order_id}")
+        return 'Ignored'
+
+    if event.event_type in PAID_EVENTS:
+        if order:
+            mark_order_paid(order, payment_id)
+        else:
+            complete_wallet_topup(topup, payment_id)
+    else:
+        if order:
+            mark_order_payment_failed(order)
+        else:
+            fail_wallet_topup(topup)
+    return 'Processed'
+
+
+def _claim_next_event(max_attempts, skip_ids):
+    qs = (
+        RazorpayWebhookEvent.objects.filter(status='Pending', attempts__lt=max_attempts)
+        .exclude(id__in=skip_ids)
+        .order_by('received_at')
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        qs = qs.select_for_update(skip_locked=True)
+    elif connection.features.has_select_for_update:
+        qs = qs.select_for_update()
+    return qs.first()
+
+
+def process_pending_webhook_events(limit=100, max_attempts=5):
+    """
+    Drain up to `limit` pending events, one short transaction each.
+    Several workers can run at once; locked rows are skipped.
+    """
+    processed = 0
+    attempted = []  # an event that just failed waits for the next run
+    while processed < limit:
+        with transaction.atomic():
+            event = _claim_next_event(max_attempts, attempted)
+            if event is None:
+                break
+            attempted.append(event.id)
+            event.attempts += 1
+            try:
+                with transaction.atomic():
+                    event.status = apply_webhook_event(event)
+                event.last_error = None
+                event.processed_at = timezone.now()
+            except Exception as e:
+                logger.error(f"Webhook {event.event_id} failed (attempt {event.attempts}): {e}")
+                event.last_error = str(e)
+                event.status = 'Failed' if event.attempts >= max_attempts else 'Pending'
+            event.save()
+        processed += 1
+    return processed